@@ -126,12 +126,11 @@ def create_snapservice_client(server, vc, username, password, session,
         if hasattr(ssl, '_create_unverified_context'):
             context = ssl._create_unverified_context()
 
-    # The token lifetime is 30 minutes.
+    # The token lifetime is 30 minutes. Tokens are cached and renewed in the
+    # background, so repeated clients do not go back to the STS.
     print("\n\nAcquire SAML token from PSC.\n")
-    saml_token = authenticator.get_bearer_saml_assertion(username,
-                                                         password,
-                                                         token_duration=30 * 60,
-                                                         delegatable=True,
-                                                         ssl_context=context)
+    saml_token = sso.token_cache.get_bearer_saml_assertion(
+        authenticator, username, password, token_duration=30 * 60,
+        delegatable=True, ssl_context=context)
 
     return SnapserviceClient(session=session, server=server, bearer_token=saml_token)
@@ -16,54 +16,365 @@
 __author__ = 'Broadcom, Inc.'
 __copyright__ = 'Copyright 2013, 2024 Broadcom, Inc. All rights reserved.'
 
+import hashlib
+import json
 import os
+import stat
+import time
+import requests
 from deprecated import deprecated
+from lxml import etree
+from six.moves.urllib.request import urlopen
+from suds.cache import ObjectCache
 from suds.client import Client
 
+# Seconds a persisted registration index is used before List() is called again
+DEFAULT_CACHE_TTL = 300
+
+
+class ServiceRegistrationIndex(object):
+    """
+    In-memory index of all lookup service registrations, built from a single
+    List() call and keyed by (product, service type, endpoint type, protocol).
+    The registrations can be persisted to a local JSON file and reused by
+    later processes until the file is older than its TTL.
+    """
+
+    def __init__(self, registrations, created=None):
+        self.registrations = registrations
+        self.created = created or time.time()
+        self._index = {}
+        for registration in registrations:
+            seen = set()
+            for endpoint in registration['endpoints']:
+                key = (registration['product'], registration['type'],
+                       endpoint['type'], endpoint['protocol'])
+                # Only the first matching endpoint of a registration is used
+                if key not in seen:
+                    seen.add(key)
+                    self._index.setdefault(key, []).append(
+                        (registration['nodeId'], endpoint['url'],
+                         registration['attributes']))
+
+    @classmethod
+    def from_service(cls, registration_infos):
+        """
+        Builds the index from the result of LookupServiceRegistration.List
+        """
+        registrations = []
+        for info in registration_infos:
+            service_type = getattr(info, 'serviceType', None)
+            registrations.append({
+                'product': getattr(service_type, 'product', None),
+                'type': getattr(service_type, 'type', None),
+                'nodeId': getattr(info, 'nodeId', None),
+                'attributes': dict(
+                    (a.key, a.value)
+                    for a in getattr(info, 'serviceAttributes', None) or []),
+                'endpoints': [{
+                    'type': getattr(getattr(e, 'endpointType', None), 'type',
+                                    None),
+                    'protocol': getattr(getattr(e, 'endpointType', None),
+                                        'protocol', None),
+                    'url': getattr(e, 'url', None)}
+                    for e in getattr(info, 'serviceEndpoints', None) or []]})
+        return cls(registrations)
+
+    @classmethod
+    def load(cls, path, ttl):
+        """
+        Loads a persisted index, or returns None if it is missing, unreadable,
+        writable by other users or older than ttl seconds.
+        """
+        if not is_private(path):
+            return None
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if time.time() - data.get('created', 0) > ttl:
+            return None
+        return cls(data['registrations'], data['created'])
+
+    def save(self, path):
+        """
+        Persists the registrations, replacing the file atomically.
+        """
+        tmp_path = '{0}.{1}'.format(path, os.getpid())
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'created': self.created,
+                       'registrations': self.registrations}, f)
+        os.replace(tmp_path, path)
+
+    def lookup(self, product, service, endpoint, protocol, node_id=None):
+        """
+        Returns (node id, url, service attributes) of the matching
+        registrations, in the order returned by the lookup service.
+        """
+        entries = self._index.get((product, service, endpoint, protocol), [])
+        if node_id is not None:
+            entries = [e for e in entries if e[0] == node_id]
+        return entries
+
+
+LOOKUP_NS = 'urn:lookup'
+SOAP_ENVELOPE = """\
+<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" \
+xmlns:lookup="urn:lookup"><soapenv:Body>{0}</soapenv:Body></soapenv:Envelope>"""
+
+
+class LookupSoapClient(object):
+    """
+    Minimal SOAP client for the RetrieveServiceContent and List calls of the
+    lookup service. It posts hand-written requests and reads the responses
+    with lxml, so no WSDL has to be loaded or parsed.
+    """
+
+    def __init__(self, soap_url, skip_verification):
+        self.soap_url = soap_url
+        self.session = requests.Session()
+        if skip_verification:
+            self.session.verify = False
+            requests.packages.urllib3.disable_warnings()
+
+    def retrieve_service_registration(self):
+        """
+        Returns the (type, value) of the service registration object.
+        """
+        response = self._call(
+            '<lookup:RetrieveServiceContent><lookup:_this '
+            'type="LookupServiceInstance">ServiceInstance</lookup:_this>'
+            '</lookup:RetrieveServiceContent>')
+        reference = response.find('.//{urn:lookup}serviceRegistration')
+        return reference.get('type'), reference.text
+
+    def list_registrations(self, service_registration):
+        """
+        Lists all service registrations as plain dictionaries in the format of
+        ServiceRegistrationIndex.
+        """
+        response = self._call(
+            '<lookup:List><lookup:_this type="{0}">{1}</lookup:_this>'
+            '</lookup:List>'.format(*service_registration))
+        registrations = []
+        for info in response.iter('{urn:lookup}returnval'):
+            registrations.append({
+                'product': info.findtext('{urn:lookup}serviceType/'
+                                         '{urn:lookup}product'),
+                'type': info.findtext('{urn:lookup}serviceType/'
+                                      '{urn:lookup}type'),
+                'nodeId': info.findtext('{urn:lookup}nodeId'),
+                'attributes': dict(
+                    (a.findtext('{urn:lookup}key'),
+                     a.findtext('{urn:lookup}value'))
+                    for a in info.findall('{urn:lookup}serviceAttributes')),
+                'endpoints': [{
+                    'type': e.findtext('{urn:lookup}endpointType/'
+                                       '{urn:lookup}type'),
+                    'protocol': e.findtext('{urn:lookup}endpointType/'
+                                           '{urn:lookup}protocol'),
+                    'url': e.findtext('{urn:lookup}url')}
+                    for e in info.findall('{urn:lookup}serviceEndpoints')]})
+        return registrations
+
+    def _call(self, body):
+        response = self.session.post(
+            self.soap_url, data=SOAP_ENVELOPE.format(body).encode('utf-8'),
+            headers={'Content-Type': 'text/xml; charset=utf-8',
+                     'SOAPAction': 'urn:lookup/2.0'})
+        if response.status_code != 200:
+            try:
+                fault = etree.fromstring(response.content).findtext(
+                    './/faultstring')
+            except etree.XMLSyntaxError:
+                fault = response.text[:200]
+            raise Exception('Lookup service call failed with status {0}: {1}'
+                            .format(response.status_code, fault))
+        return etree.fromstring(response.content)
+
+
+def is_private(path):
+    """
+    Whether path is owned by the current user and not writable by others,
+    so its content cannot have been planted by another local user.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    if hasattr(os, 'getuid') and st.st_uid != os.getuid():
+        return False
+    return not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def private_cache_dir():
+    """
+    Per user cache directory of the samples, only accessible by its owner.
+    """
+    path = os.path.join(os.environ.get('XDG_CACHE_HOME') or
+                        os.path.join(os.path.expanduser('~'), '.cache'),
+                        'vsphere-automation-samples')
+    if not os.path.isdir(path):
+        os.makedirs(path, 0o700)
+    if not is_private(path):
+        raise IOError('Cache directory {0} is accessible by other users'
+                      .format(path))
+    return path
+
+
+def wsdl_cache_dir(wsdl_url):
+    """
+    Directory for the parsed WSDL cache of suds, keyed by the WSDL URL and
+    the hash of its content so a changed WSDL is never read from the cache.
+    """
+    digest = hashlib.sha1(wsdl_url.encode('utf-8'))
+    digest.update(urlopen(wsdl_url).read())
+    # Suds unpickles the cached objects, so they must not come from a
+    # directory other users can write to
+    return os.path.join(private_cache_dir(),
+                        'lookupservice-wsdl-{0}'.format(digest.hexdigest()[:16]))
+
+
+def default_cache_file(soap_url):
+    """
+    Per lookup service index file in the private cache directory.
+    """
+    digest = hashlib.sha1(soap_url.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(private_cache_dir(),
+                        'lookupservice-{0}.json'.format(digest))
+
+
 @deprecated(version='8.0U3', reason='Use well-known endpoint URLs instead of looking them up.')
 class LookupServiceHelper(object):
-    def __init__(self, wsdl_url, soap_url, skip_verification):
+    def __init__(self, wsdl_url, soap_url, skip_verification,
+                 cache_file=None, cache_ttl=DEFAULT_CACHE_TTL,
+                 lightweight=False):
+        """
+        :type  cache_file: :class:`str`
+        :param cache_file: File the registration index is persisted to,
+            defaults to a file per lookup service in the private cache
+            directory of the user
+        :type  cache_ttl: :class:`int`
+        :param cache_ttl: Seconds a persisted index is reused; 0 disables
+            persistence
+        :type  lightweight: :class:`bool`
+        :param lightweight: List the registrations with LookupSoapClient
+            instead of a suds client built from the WSDL
+        """
         self.wsdl_url = wsdl_url
         self.soap_url = soap_url
         self.skip_verification = skip_verification
+        self.cache_file = cache_file
+        if cache_file is None and cache_ttl > 0:
+            self.cache_file = default_cache_file(soap_url)
+        self.cache_ttl = cache_ttl
+        self.lightweight = lightweight
         self.client = None
         self.managedObjectReference = None
         self.serviceRegistration = None
+        self.index = None
 
     def connect(self):
+        """
+        Loads the persisted registration index, or lists the registrations if
+        there is none. The suds client is only built when the lookup service
+        has to be called.
+        """
+        # Done here and not only with the suds client, as the callers rely
+        # on it for the endpoints found in the index
+        self.configure_ssl()
+        if self.cache_ttl > 0:
+            self.index = ServiceRegistrationIndex.load(self.cache_file,
+                                                       self.cache_ttl)
+        if self.index is None:
+            self.refresh()
+
+    def configure_ssl(self):
+        """
+        Disables server certificate verification globally when
+        skip_verification is set.
+        """
+        # Suds library doesn't support passing unverified context to disable
+        # server certificate verification. Thus disable checking globally in
+        # order to skip verification. This is not recommended in production
+        # code. see https://www.python.org/dev/peps/pep-0476/
+        if self.skip_verification:
+            import ssl
+            try:
+                _create_unverified_https_context = \
+                    ssl._create_unverified_context
+            except AttributeError:
+                # Legacy Python that doesn't verify HTTPS certificates by
+                # default
+                pass
+            else:
+                # Handle target environment that doesn't support HTTPS
+                # verification
+                ssl._create_default_https_context = \
+                    _create_unverified_https_context
+
+    def create_client(self):
+        """
+        Builds the suds client. The parsed WSDL is cached on disk, so only the
+        first process after a WSDL change pays for parsing it.
+        """
         if self.client is None:
-            # Suds library doesn't support passing unverified context to disable
-            # server certificate verification. Thus disable checking globally in
-            # order to skip verification. This is not recommended in production
-            # code. see https://www.python.org/dev/peps/pep-0476/
-            if self.skip_verification:
-                import ssl
-                try:
-                    _create_unverified_https_context = \
-                        ssl._create_unverified_context
-                except AttributeError:
-                    # Legacy Python that doesn't verify HTTPS certificates by
-                    # default
-                    pass
-                else:
-                    # Handle target environment that doesn't support HTTPS
-                    # verification
-                    ssl._create_default_https_context = \
-                        _create_unverified_https_context
-
-            self.client = Client(url=self.wsdl_url, location=self.soap_url)
+            self.configure_ssl()
+
+            # cachingpolicy 1 caches the processed WSDL object rather than
+            # the raw XML documents
+            cache = ObjectCache(location=wsdl_cache_dir(self.wsdl_url),
+                                days=30)
+            self.client = Client(url=self.wsdl_url, location=self.soap_url,
+                                 cache=cache, cachingpolicy=1)
             assert self.client is not None
             self.client.set_options(service='LsService', port='LsPort')
+        return self.client
 
-        self.managedObjectReference = self.client.factory.create(
-            'ns0:ManagedObjectReference')
-        self.managedObjectReference._type = 'LookupServiceInstance'
-        self.managedObjectReference.value = 'ServiceInstance'
-
-        lookupServiceContent = self.client.service.RetrieveServiceContent(
-            self.managedObjectReference)
-
-        self.serviceRegistration = lookupServiceContent.serviceRegistration
+    def refresh(self):
+        """
+        Lists all service registrations with a single call and rebuilds the
+        index, persisting it unless the cache is disabled.
+        """
+        if self.lightweight:
+            client = LookupSoapClient(self.soap_url, self.skip_verification)
+            if self.serviceRegistration is None:
+                self.serviceRegistration = \
+                    client.retrieve_service_registration()
+            self.__update_index(ServiceRegistrationIndex(
+                client.list_registrations(self.serviceRegistration)))
+            return
+
+        self.create_client()
+        if self.serviceRegistration is None:
+            self.managedObjectReference = self.client.factory.create(
+                'ns0:ManagedObjectReference')
+            self.managedObjectReference._type = 'LookupServiceInstance'
+            self.managedObjectReference.value = 'ServiceInstance'
+
+            lookupServiceContent = self.client.service.RetrieveServiceContent(
+                self.managedObjectReference)
+
+            self.serviceRegistration = lookupServiceContent.serviceRegistration
+
+        # An empty filter matches every registration
+        result = self.client.service.List(
+            self.serviceRegistration,
+            self.client.factory.create('ns0:LookupServiceRegistrationFilter'))
+        self.__update_index(ServiceRegistrationIndex.from_service(result))
+
+    def __update_index(self, index):
+        self.index = index
+        if self.cache_ttl > 0:
+            try:
+                self.index.save(self.cache_file)
+            except (IOError, OSError) as e:
+                print('Could not save lookup service index to {0}: {1}'.format(
+                    self.cache_file, e))
 
     def find_sso_urls(self):
         """
@@ -188,27 +499,13 @@ class LookupServiceHelper(object):
         Finds the endpoint URLs of a service running on management nodes.
         Returns a dictionary where the key is the management node id.
         """
-        assert self.client is not None
-        assert self.serviceRegistration is not None
-
-        lookupServiceRegistrationFilter = self.__create_filter_spec(product,
-                                                                    service,
-                                                                    endpoint,
-                                                                    protocol)
+        assert self.index is not None
 
-        result = self.client.service.List(self.serviceRegistration,
-                                          lookupServiceRegistrationFilter)
+        result = self.index.lookup(product, service, endpoint, protocol)
         assert len(result) > 0
         # Support for MxN
         # return the results in a dictionary where key is NodeId and Value is Service URL
-        results_dict = {}
-        for lookupServiceRegistrationInfo in result:
-            lookupServiceRegistrationEndpoint = \
-                lookupServiceRegistrationInfo.serviceEndpoints[0]
-            assert lookupServiceRegistrationEndpoint is not None
-            results_dict[
-                lookupServiceRegistrationInfo.nodeId] = lookupServiceRegistrationEndpoint.url
-        return results_dict
+        return dict((node_id, url) for node_id, url, _ in result)
 
     def __find_platform_service_urls(self, product, service, endpoint,
                                      protocol):
@@ -216,44 +513,11 @@ class LookupServiceHelper(object):
         Finds the endpoint URLs of a service running on PSCs (Platform Service Controller).
         Returns a list of service URLs since there is no node id associated with the PSC.
         """
-        assert self.client is not None
-        assert self.serviceRegistration is not None
+        assert self.index is not None
 
-        lookupServiceRegistrationFilter = self.__create_filter_spec(product,
-                                                                    service,
-                                                                    endpoint,
-                                                                    protocol)
-
-        result = self.client.service.List(self.serviceRegistration,
-                                          lookupServiceRegistrationFilter)
+        result = self.index.lookup(product, service, endpoint, protocol)
         assert len(result) > 0
-
-        urls = []
-        for lookupServiceRegistrationInfo in result:
-            lookupServiceRegistrationEndpoint = \
-                lookupServiceRegistrationInfo.serviceEndpoints[0]
-            assert lookupServiceRegistrationEndpoint is not None
-            urls.append(lookupServiceRegistrationEndpoint.url)
-        return urls
-
-    def __create_filter_spec(self, product, service, endpoint, protocol):
-        assert self.client is not None
-
-        lookupServiceRegistrationServiceType = self.client.factory.create(
-            'ns0:LookupServiceRegistrationServiceType')
-        lookupServiceRegistrationServiceType.product = product
-        lookupServiceRegistrationServiceType.type = service
-
-        lookupServiceRegistrationEndpointType = self.client.factory.create(
-            'ns0:LookupServiceRegistrationEndpointType')
-        lookupServiceRegistrationEndpointType.type = endpoint
-        lookupServiceRegistrationEndpointType.protocol = protocol
-
-        lookupServiceRegistrationFilter = self.client.factory.create(
-            'ns0:LookupServiceRegistrationFilter')
-        lookupServiceRegistrationFilter.serviceType = lookupServiceRegistrationServiceType
-        lookupServiceRegistrationFilter.endpointType = lookupServiceRegistrationEndpointType
-        return lookupServiceRegistrationFilter
+        return [url for _, url, _ in result]
 
     def find_mgmt_nodes(self):
         """
@@ -262,34 +526,17 @@ class LookupServiceHelper(object):
         :rtype: dictionary
         :return: management node instance name and node id (UUID) in a dictionary
         """
-        assert self.client is not None
-        assert self.serviceRegistration is not None
-
-        lookupServiceRegistrationServiceType = self.client.factory.create(
-            'ns0:LookupServiceRegistrationServiceType')
-        lookupServiceRegistrationServiceType.product = 'com.vmware.cis'
-        lookupServiceRegistrationServiceType.type = 'vcenterserver'
-
-        lookupServiceRegistrationEndpointType = self.client.factory.create(
-            'ns0:LookupServiceRegistrationEndpointType')
-        lookupServiceRegistrationEndpointType.type = 'com.vmware.vim'
-        lookupServiceRegistrationEndpointType.protocol = 'vmomi'
-
-        lookupServiceRegistrationFilter = self.client.factory.create(
-            'ns0:LookupServiceRegistrationFilter')
-        lookupServiceRegistrationFilter.serviceType = lookupServiceRegistrationServiceType
-        lookupServiceRegistrationFilter.endpointType = lookupServiceRegistrationEndpointType
+        assert self.index is not None
 
-        result = self.client.service.List(self.serviceRegistration,
-                                          lookupServiceRegistrationFilter)
+        result = self.index.lookup('com.vmware.cis', 'vcenterserver',
+                                   'com.vmware.vim', 'vmomi')
         assert len(result) > 0
 
         results_dict = {}
-        for lookupServiceRegistrationInfo in result:
-            for lookupServiceRegistrationAttribute in lookupServiceRegistrationInfo.serviceAttributes:
-                if lookupServiceRegistrationAttribute.key == 'com.vmware.vim.vcenter.instanceName':
-                    results_dict[
-                        lookupServiceRegistrationAttribute.value] = lookupServiceRegistrationInfo.nodeId
+        for node_id, _, attributes in result:
+            instance_name = attributes.get('com.vmware.vim.vcenter.instanceName')
+            if instance_name is not None:
+                results_dict[instance_name] = node_id
         return results_dict
 
     def get_mgmt_node_id(self, instance_name):
@@ -61,7 +61,7 @@ class PlatformServiceController(object):
         context = None
         if self.skip_verification:
             context = get_unverified_context()
-        self.bearer_token = au.get_bearer_saml_assertion(
-            self.ssousername, self.ssopassword, delegatable=True,
+        self.bearer_token = sso.token_cache.get_bearer_saml_assertion(
+            au, self.ssousername, self.ssopassword, delegatable=True,
             ssl_context=context)
         self.sec_ctx = create_saml_bearer_security_context(self.bearer_token)
@@ -16,6 +16,7 @@ __copyright__ = 'Copyright 2013, 2016 VMware, Inc. All rights reserved.'
 
 from pyVim.connect import SmartConnect, Disconnect
 from samples.vsphere.common import vapiconnect
+from samples.vsphere.common.session_pool import get_session_pool
 
 from samples.vsphere.common.ssl_helper import get_unverified_context
 
@@ -23,8 +24,18 @@ from samples.vsphere.common.ssl_helper import get_unverified_context
 class ServiceManager(object):
     """
     Manages Vim and vAPI services on a management node.
+
+    With pooled set, both stacks are taken from the process-wide session pool
+    so repeated connects reuse the existing logins, and disconnect leaves the
+    sessions to be logged out at process exit.
+
+    With single_session set, connect logs in once through vAPI and the
+    pyVmomi service instance is only created on first access of si, content
+    or vim_uuid, reusing the vAPI session identifier instead of logging in
+    a second time.
     """
-    def __init__(self, server, username, password, skip_verification):
+    def __init__(self, server, username, password, skip_verification,
+                 pooled=False, single_session=False):
 
         self.server_url = server
         self.username = username
@@ -35,11 +46,64 @@ class ServiceManager(object):
         self.session = None
         self.session_id = None
         self.stub_config = None
-        self.si = None
-        self.content = None
-        self.vim_uuid = None
+        self.pooled = pooled
+        self.single_session = single_session
+        self._si = None
+        self._content = None
+
+    @property
+    def si(self):
+        if self._si is None and self.stub_config is not None:
+            if self.pooled:
+                self._si = get_session_pool().get_service_instance(
+                    self.server_url, self.username, self.password,
+                    self.skip_verification)
+            elif self.session_id is not None:
+                # Attach to the vAPI session; SmartConnect does not log in
+                # when a session id is given
+                self._si = SmartConnect(
+                    host=self.server_url,
+                    disableSslCertValidation=self.skip_verification,
+                    sessionId=self.session_id)
+        return self._si
+
+    @si.setter
+    def si(self, value):
+        self._si = value
+        self._content = None
+
+    @property
+    def content(self):
+        if self._content is None and self.si is not None:
+            self._content = self.si.RetrieveContent()
+        return self._content
+
+    @content.setter
+    def content(self, value):
+        self._content = value
+
+    @property
+    def vim_uuid(self):
+        content = self.content
+        return content.about.instanceUuid if content is not None else None
 
     def connect(self):
+        if self.pooled:
+            self.stub_config = get_session_pool().get_stub_config(
+                self.server_url, self.username, self.password,
+                self.skip_verification)
+            return
+
+        if self.single_session:
+            # Log in once through vAPI; the Vim stub is created lazily
+            self.stub_config = vapiconnect.create_stub_config(
+                self.server_url, self.skip_verification)
+            self.session_id = vapiconnect.create_session(self.stub_config,
+                                                         self.username,
+                                                         self.password)
+            vapiconnect.use_session(self.stub_config, self.session_id)
+            return
+
         # Connect to vAPI Endpoint on vCenter Server system
         self.stub_config = vapiconnect.connect(host=self.server_url,
                                                user=self.username,
@@ -57,11 +121,16 @@ class ServiceManager(object):
         assert self.si is not None
 
         # Retrieve the service content
-        self.content = self.si.RetrieveContent()
         assert self.content is not None
-        self.vim_uuid = self.content.about.instanceUuid
 
     def disconnect(self):
+        if self.pooled:
+            return
         print('disconnecting the session')
         vapiconnect.logout(self.stub_config)
-        Disconnect(self.si)
+        if self.single_session:
+            # The shared session is already gone, only drop the connections
+            if self._si is not None:
+                self._si._stub.DropConnections()
+        else:
+            Disconnect(self._si)
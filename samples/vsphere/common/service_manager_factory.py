@@ -24,11 +24,14 @@ class ServiceManagerFactory(object):
     service_manager = None
 
     @classmethod
-    def get_service_manager(cls, server, username, password, skip_verification):
+    def get_service_manager(cls, server, username, password, skip_verification,
+                            pooled=False, single_session=False):
         cls.service_manager = ServiceManager(server,
                                              username,
                                              password,
-                                             skip_verification)
+                                             skip_verification,
+                                             pooled,
+                                             single_session)
         cls.service_manager.connect()
         return cls.service_manager
 
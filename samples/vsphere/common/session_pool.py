@@ -0,0 +1,288 @@
+"""
+* *******************************************************
+* Copyright (c) 2024 Broadcom. All Rights Reserved.
+* SPDX-License-Identifier: MIT
+* *******************************************************
+*
+* DISCLAIMER. THIS PROGRAM IS PROVIDED TO YOU "AS IS" WITHOUT
+* WARRANTIES OR CONDITIONS OF ANY KIND, WHETHER ORAL OR WRITTEN,
+* EXPRESS OR IMPLIED. THE AUTHOR SPECIFICALLY DISCLAIMS ANY IMPLIED
+* WARRANTIES OR CONDITIONS OF MERCHANTABILITY, SATISFACTORY QUALITY,
+* NON-INFRINGEMENT AND FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+__author__ = 'Broadcom, Inc.'
+__copyright__ = 'Copyright (c) 2024 Broadcom. All Rights Reserved.'
+
+import atexit
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from com.vmware.cis_client import Session
+from pyVim.connect import SmartStubAdapter, VimSessionOrientedStub
+from pyVmomi import vim
+
+from vmware.vapi.lib.connect import get_requests_connector
+from vmware.vapi.security.client.security_context_filter import \
+    SecurityContextFilter
+from vmware.vapi.security.session import create_session_security_context
+from vmware.vapi.security.user_password import \
+    create_user_password_security_context
+from vmware.vapi.stdlib.client.factories import StubConfigurationFactory
+
+from samples.vsphere.common.ssl_helper import get_unverified_context
+from samples.vsphere.common.vapiconnect import (create_unverified_session,
+                                                get_jsonrpc_endpoint_url)
+
+UNAUTHENTICATED_ERROR = 'com.vmware.vapi.std.errors.unauthenticated'
+
+
+class SessionRefreshFilter(SecurityContextFilter):
+    """
+    Provider filter that attaches the pooled session identifier to every
+    request and logs in again once if vCenter rejects it as unauthenticated.
+    """
+    def __init__(self, pooled_session, next_provider=None):
+        SecurityContextFilter.__init__(self, next_provider)
+        self._pooled_session = pooled_session
+
+    def get_max_retries(self):
+        return 1
+
+    def get_security_context(self, on_error):
+        session_id = self._pooled_session.get_session_id(refresh=on_error)
+        return create_session_security_context(session_id)
+
+    def should_retry(self, error_value):
+        return error_value.name == UNAUTHENTICATED_ERROR
+
+
+class PooledSession(object):
+    """
+    An authenticated vCenter session shared by every caller that connects
+    with the same host, user and verification mode.
+    """
+    def __init__(self, host, user, pwd, http_session, ssl_context=None):
+        self.host = host
+        self.user = user
+        self.http_session = http_session
+        self.logins = 0
+        self._pwd = pwd
+        self._ssl_context = ssl_context
+        self._url = get_jsonrpc_endpoint_url(host)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._session_id = None
+        self._stub_config = None
+        self._si = None
+
+    def set_password(self, pwd):
+        """
+        Use the given password for subsequent logins of this session.
+        """
+        self._pwd = pwd
+
+    def get_session_id(self, refresh=False, stale=None):
+        """
+        Return the cached session identifier, logging in if there is none yet.
+        A login is also done when the cached identifier equals stale, so that
+        concurrent callers which all observed the same expired session only
+        trigger a single login. With refresh set, stale defaults to the
+        identifier last handed to the calling thread.
+        """
+        if refresh and stale is None:
+            stale = getattr(self._local, 'session_id', None)
+        with self._lock:
+            if self._session_id is None or \
+                    (stale is not None and self._session_id == stale):
+                self._session_id = self._login()
+            session_id = self._session_id
+        self._local.session_id = session_id
+        return session_id
+
+    def get_stub_config(self):
+        """
+        Return a stub configuration bound to this pooled session.
+        """
+        with self._lock:
+            if self._stub_config is None:
+                connector = self._new_connector(
+                    provider_filter_chain=[SessionRefreshFilter(self)])
+                self._stub_config = \
+                    StubConfigurationFactory.new_std_configuration(connector)
+        return self._stub_config
+
+    def get_service_instance(self):
+        """
+        Return a pyVmomi service instance that shares the vAPI session, so
+        both stacks cost a single login. The stub attaches to the session
+        lazily and picks up a renewed one when the server reports it expired.
+        """
+        with self._lock:
+            if self._si is None:
+                soap_stub = SmartStubAdapter(host=self.host,
+                                             sslContext=self._ssl_context)
+                self._si = vim.ServiceInstance(
+                    'ServiceInstance',
+                    VimSessionOrientedStub(soap_stub, self._attach_session))
+        return self._si
+
+    def _attach_session(self, soap_stub):
+        # Login method for VimSessionOrientedStub: reuse the vAPI session
+        # instead of calling SessionManager.Login
+        soap_stub.SetSessionId(
+            self.get_session_id(stale=soap_stub.GetSessionId()))
+
+    def close(self):
+        """
+        Log out of the shared session and drop the pooled connections.
+        """
+        with self._lock:
+            session_id, self._session_id = self._session_id, None
+            si, self._si = self._si, None
+            self._stub_config = None
+        if session_id is not None:
+            connector = self._new_connector()
+            connector.set_security_context(
+                create_session_security_context(session_id))
+            stub_config = \
+                StubConfigurationFactory.new_std_configuration(connector)
+            try:
+                Session(stub_config).delete()
+            except Exception:
+                pass  # session already expired or server unreachable
+        if si is not None:
+            si._stub.soapStub.DropConnections()
+        self.http_session.close()
+
+    def _login(self):
+        connector = self._new_connector()
+        connector.set_security_context(
+            create_user_password_security_context(self.user, self._pwd))
+        stub_config = StubConfigurationFactory.new_std_configuration(connector)
+        session_id = Session(stub_config).create()
+        self.logins += 1
+        return session_id
+
+    def _new_connector(self, provider_filter_chain=None):
+        # pool_size is left unset so the connector does not mount a fresh
+        # adapter over the tuned one and drop the pooled keep-alive sockets.
+        return get_requests_connector(
+            session=self.http_session, url=self._url, pool_size=None,
+            provider_filter_chain=provider_filter_chain)
+
+
+class SessionPool(object):
+    """
+    Process-wide pool of authenticated vCenter sessions keyed by
+    (host, user, verification mode).
+    """
+    def __init__(self, pool_connections=4, pool_maxsize=32, max_retries=3):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    def get(self, host, user, pwd, skip_verification=False, cert_path=None,
+            suppress_warning=True):
+        """
+        Return the pooled session for the given connection parameters,
+        creating it on first use.
+        """
+        if skip_verification:
+            mode = 'unverified'
+        else:
+            mode = cert_path or 'verified'
+        key = (host, user, mode)
+        with self._lock:
+            pooled = self._sessions.get(key)
+            if pooled is None:
+                pooled = PooledSession(
+                    host, user, pwd,
+                    self._new_http_session(skip_verification, cert_path,
+                                           suppress_warning),
+                    get_unverified_context() if skip_verification else None)
+                self._sessions[key] = pooled
+            else:
+                pooled.set_password(pwd)
+        return pooled
+
+    def get_stub_config(self, host, user, pwd, skip_verification=False,
+                        cert_path=None, suppress_warning=True):
+        """
+        Return an authenticated vAPI stub configuration from the pool.
+        """
+        return self.get(host, user, pwd, skip_verification, cert_path,
+                        suppress_warning).get_stub_config()
+
+    def get_service_instance(self, host, user, pwd, skip_verification=False,
+                             cert_path=None, suppress_warning=True):
+        """
+        Return a pyVmomi service instance from the pool.
+        """
+        return self.get(host, user, pwd, skip_verification, cert_path,
+                        suppress_warning).get_service_instance()
+
+    def is_pooled(self, stub_config):
+        """
+        Check whether a stub configuration was handed out by this pool.
+        """
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return any(s._stub_config is stub_config for s in sessions)
+
+    def close(self):
+        """
+        Log out of every pooled session.
+        """
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for pooled in sessions:
+            pooled.close()
+
+    def _new_http_session(self, skip_verification, cert_path,
+                          suppress_warning):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_connections,
+                              pool_maxsize=self.pool_maxsize,
+                              max_retries=self.max_retries)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        if skip_verification:
+            session = create_unverified_session(session, suppress_warning)
+        elif cert_path:
+            session.verify = cert_path
+        return session
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_session_pool():
+    """
+    Return the process-wide session pool.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SessionPool()
+        return _pool
+
+
+def close_session_pool():
+    """
+    Log out of every session in the process-wide pool.
+    """
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
+
+atexit.register(close_session_pool)
@@ -26,15 +26,22 @@ else:
 import sys
 import time
 import base64
+import calendar
+import collections
 import hashlib
+import os
+import socket
+import threading
 
 from pyVmomi.Security import ThumbprintMismatchException
+from concurrent.futures import Future
 from uuid import uuid4
-from io import BytesIO
 from six.moves.urllib.parse import urlparse
 # Third-party imports.
 from lxml import etree
 from OpenSSL import crypto
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
 import ssl
 
 UTF_8 = 'utf-8'
@@ -42,6 +49,40 @@ SHA256 = 'sha256'
 SHA512 = 'sha512'
 
 
+class _LruCache(object):
+    '''
+    A small thread-safe mapping that drops its least recently used entries
+    beyond maxsize.
+    '''
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+# Signing caches: XML parsers per thread, the few last loaded private keys by
+# key text, key file contents by path and canonicalized request templates.
+_parsers = threading.local()
+_private_keys = _LruCache(4)
+_key_files = _LruCache(8)
+_canonical_templates = {}
+
+
 def _extract_certificate(cert):
     '''
     Extract DER certificate/private key from DER/base64-ed DER/PEM string.
@@ -171,6 +212,127 @@ class SSOHTTPSConnection(six.moves.http_client.HTTPSConnection):
         self._check_cert(self.sock.getpeercert(True))
 
 
+class StsConnectionPool(object):
+    '''
+    A bounded, thread-safe pool of keep-alive connections to Security Token
+    Services.
+
+    Idle connections are kept per (host, client certificate, server
+    certificate checks, SSL settings), so a pooled connection is only handed
+    to requests that would have opened an identical one. The server
+    certificate is checked by SSOHTTPSConnection.connect, which runs again
+    whenever a connection has to be re-established. At most max_idle
+    connections are kept in total, the least recently used are closed first.
+    '''
+
+    def __init__(self, maxsize=4, max_idle=16):
+        '''
+        Initializer for StsConnectionPool.
+
+        @type  maxsize: C{int}
+        @param maxsize: Maximum number of idle connections kept per key.
+        @type  max_idle: C{int}
+        @param max_idle: Maximum number of idle connections kept in total.
+        '''
+        self.maxsize = maxsize
+        self.max_idle = max_idle
+        self.hits = 0
+        self.misses = 0
+        self.requests = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self._lock = threading.Lock()
+        # (key, connection) pairs, least recently used first
+        self._idle = []
+
+    def get(self, key, factory):
+        '''
+        Returns an idle connection for the key, or a new one from factory.
+
+        @rtype: C{tuple}
+        @return: The connection and whether it came from the pool.
+        '''
+        with self._lock:
+            for i in range(len(self._idle) - 1, -1, -1):
+                if self._idle[i][0] == key:
+                    self.hits += 1
+                    return self._idle.pop(i)[1], True
+            self.misses += 1
+        return factory(), False
+
+    def put(self, key, connection):
+        '''
+        Returns a connection whose response has been fully read to the pool.
+        Connections beyond maxsize for the key, or beyond max_idle in total,
+        are closed.
+        '''
+        closed = []
+        with self._lock:
+            if sum(1 for k, _ in self._idle if k == key) >= self.maxsize:
+                closed.append(connection)
+            else:
+                self._idle.append((key, connection))
+                while len(self._idle) > self.max_idle:
+                    closed.append(self._idle.pop(0)[1])
+        for c in closed:
+            c.close()
+
+    def record(self, latency):
+        '''
+        Records the latency of one request, in seconds.
+        '''
+        with self._lock:
+            self.requests += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def stats(self):
+        '''
+        @rtype: C{dict}
+        @return: Hit/miss and latency counters of the pool.
+        '''
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'requests': self.requests,
+                    'avg_latency': (self.total_latency / self.requests
+                                    if self.requests else 0.0),
+                    'max_latency': self.max_latency,
+                    'idle': len(self._idle)}
+
+    def close(self):
+        '''
+        Closes all idle connections.
+        '''
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for _, connection in idle:
+            connection.close()
+
+
+def ssl_context_key(ssl_context):
+    '''
+    Hashable summary of the settings of an SSL context that affect the
+    connections it creates, so equivalent contexts share pooled connections.
+    Client certificates loaded into the context itself cannot be read back;
+    pass them as public_key and private_key instead.
+
+    @type  ssl_context: C{ssl.SSLContext}
+    @param ssl_context: The context, or None.
+    '''
+    if ssl_context is None:
+        return None
+    ca_certs = ssl_context.get_ca_certs(binary_form=True)
+    return (type(ssl_context).__name__, ssl_context.protocol,
+            ssl_context.verify_mode, ssl_context.check_hostname,
+            int(ssl_context.options), int(ssl_context.verify_flags),
+            hashlib.sha256(b''.join(sorted(ca_certs))).hexdigest())
+
+
+# Process-wide pool shared by all authenticators
+sts_connection_pool = StsConnectionPool()
+
+
 class SsoAuthenticator(object):
     '''
     A class to handle the transport layer communication between the client and
@@ -180,7 +342,8 @@ class SsoAuthenticator(object):
     def __init__(self,
                  sts_url,
                  sts_cert=None,
-                 thumbprint=None
+                 thumbprint=None,
+                 connection_pool=None
                  ):
         '''
         Initializer for SsoAuthenticator.
@@ -196,10 +359,15 @@ class SsoAuthenticator(object):
         @param       thumbprint: The SHA-1 thumbprint of the certificate used
                                  by the Security Token Service.  It is same
                                  thumbprint you can pass to pyVmomi SoapAdapter.
+        @type   connection_pool: C{StsConnectionPool}
+        @param  connection_pool: Pool of keep-alive connections to the
+                                 Security Token Service.  Defaults to the
+                                 process-wide sts_connection_pool.
         '''
         self._sts_cert = sts_cert
         self._sts_url = sts_url
         self._sts_thumbprint = thumbprint
+        self._connection_pool = connection_pool or sts_connection_pool
 
     def perform_request(self,
                         soap_message,
@@ -227,39 +395,53 @@ class SsoAuthenticator(object):
         parsed = urlparse(self._sts_url)
         host = parsed.netloc  # pylint: disable=E1101
         encoded_message = soap_message.encode(UTF_8)
-        if hasattr(ssl, '_create_unverified_context'):
-            # Python 2.7.9 has stronger SSL certificate validation, so we need
-            # to pass in a context when dealing with self-signed certificates.
-            webservice = SSOHTTPSConnection(host=host,
-                                            key_file=private_key,
-                                            cert_file=public_key,
-                                            server_cert=self._sts_cert,
-                                            thumbprint=self._sts_thumbprint,
-                                            context=ssl_context)
-        else:
+        key = (host, public_key, private_key, self._sts_cert,
+               self._sts_thumbprint, ssl_context_key(ssl_context))
+
+        def connect():
+            if hasattr(ssl, '_create_unverified_context'):
+                # Python 2.7.9 has stronger SSL certificate validation, so we
+                # need to pass in a context when dealing with self-signed
+                # certificates.
+                return SSOHTTPSConnection(host=host,
+                                          key_file=private_key,
+                                          cert_file=public_key,
+                                          server_cert=self._sts_cert,
+                                          thumbprint=self._sts_thumbprint,
+                                          context=ssl_context)
             # Versions of Python before 2.7.9 don't support
             # the context parameter, so don't pass it on.
-            webservice = SSOHTTPSConnection(host=host,
-                                            key_file=private_key,
-                                            cert_file=public_key,
-                                            server_cert=self._sts_cert,
-                                            thumbprint=self._sts_thumbprint)
-
-        webservice.putrequest("POST", parsed.path, skip_host=True)  # pylint: disable=E1101
-        webservice.putheader("Host", host)
-        webservice.putheader("User-Agent", "VMware/pyVmomi")
-        webservice.putheader("Accept", "text/xml, multipart/related")
-        webservice.putheader("Content-type", "text/xml; charset=\"UTF-8\"")
-        webservice.putheader("Content-length", "%d" % len(encoded_message))
-        webservice.putheader("Connection", "keep-alive")
-        webservice.putheader("SOAPAction",
-            "http://docs.oasis-open.org/ws-sx/ws-trust/200512/RST/Issue")
-        webservice.endheaders()
-        webservice.send(encoded_message)
+            return SSOHTTPSConnection(host=host,
+                                      key_file=private_key,
+                                      cert_file=public_key,
+                                      server_cert=self._sts_cert,
+                                      thumbprint=self._sts_thumbprint)
+
+        start = time.time()
+        webservice, pooled = self._connection_pool.get(key, connect)
+        try:
+            try:
+                saml_response = self._send(webservice, parsed.path, host,
+                                           encoded_message)
+            except (six.moves.http_client.HTTPException, socket.error):
+                if not pooled:
+                    raise
+                # The STS closed the idle keep-alive connection, reconnect
+                webservice.close()
+                saml_response = self._send(webservice, parsed.path, host,
+                                           encoded_message)
+            body = saml_response.read()
+        except Exception:
+            webservice.close()
+            raise
+        if saml_response.will_close:
+            webservice.close()
+        else:
+            self._connection_pool.put(key, webservice)
+        self._connection_pool.record(time.time() - start)
 
-        saml_response = webservice.getresponse()
         if saml_response.status != 200:
-            faultraw = saml_response.read()
+            faultraw = body
             # Hopefully it is utf-8 or us-ascii, not Apache error message in Shift-JIS.
             fault = faultraw.decode(UTF_8)
             # Best effort at figuring out a SOAP fault.
@@ -270,7 +452,24 @@ class SsoAuthenticator(object):
                     raise SoapException(fault, *parsed_fault)
             raise Exception("Got response %s: %s\n%s" %
                             (saml_response.status, saml_response.msg, fault))
-        return saml_response.read()
+        return body
+
+    def _send(self, webservice, path, host, encoded_message):
+        '''
+        Sends one SOAP request over the connection and returns the response.
+        '''
+        webservice.putrequest("POST", path, skip_host=True)  # pylint: disable=E1101
+        webservice.putheader("Host", host)
+        webservice.putheader("User-Agent", "VMware/pyVmomi")
+        webservice.putheader("Accept", "text/xml, multipart/related")
+        webservice.putheader("Content-type", "text/xml; charset=\"UTF-8\"")
+        webservice.putheader("Content-length", "%d" % len(encoded_message))
+        webservice.putheader("Connection", "keep-alive")
+        webservice.putheader("SOAPAction",
+            "http://docs.oasis-open.org/ws-sx/ws-trust/200512/RST/Issue")
+        webservice.endheaders()
+        webservice.send(encoded_message)
+        return webservice.getresponse()
 
     def get_bearer_saml_assertion(self,
                                   username,
@@ -607,7 +806,8 @@ class SsoAuthenticator(object):
                            request_duration=60,
                            token_duration=600,
                            renewable=False,
-                           ssl_context=None):
+                           ssl_context=None,
+                           delegatable=False):
         """
         Get Hok token by Hok token.
 
@@ -631,6 +831,9 @@ class SsoAuthenticator(object):
         @type       ssl_context: C{ssl.SSLContext}
         @param      ssl_context: SSL context describing the various SSL options.
                                  It is only supported in Python 2.7.9 or higher.
+        @type       delegatable: C{boolean}
+        @param      delegatable: Whether the generated token is delegatable or not
+                                 The default value is False
         @rtype: C{str}
         @return: The Hok SAML assertion in Unicode.
         """
@@ -638,7 +841,8 @@ class SsoAuthenticator(object):
                                        request_duration=request_duration,
                                        token_duration=token_duration,
                                        hok_token=hok_token)
-        soap_message = request.construct_hok_by_hok_request(renewable=renewable)
+        soap_message = request.construct_hok_by_hok_request(
+            renewable=renewable, delegatable=delegatable)
 
         soap_message = add_saml_context(soap_message, hok_token, private_key)
 
@@ -652,6 +856,185 @@ class SsoAuthenticator(object):
             pretty_print=False).decode(UTF_8)
 
 
+class SamlTokenCache(object):
+    '''
+    Cache of SAML assertions keyed by (STS URL, principal, credentials, token
+    type, delegatable, token duration). Passwords are only kept as a salted
+    digest.
+
+    A cached assertion is handed out while more than min_validity seconds,
+    and more than renew_before of the requested token duration, are left
+    before its NotOnOrAfter time. Assertions that were used since they were
+    last renewed are renewed in the background once renew_before of their
+    lifetime is left, through get_token_by_token for HoK tokens and by
+    issuing a new token for bearer tokens. Concurrent callers asking for the same missing token share
+    a single request to the STS.
+    '''
+
+    def __init__(self, renew_before=0.25, min_validity=30):
+        '''
+        Initializer for SamlTokenCache.
+
+        @type  renew_before: C{float}
+        @param renew_before: Fraction of the token lifetime left at which the
+                             token is renewed in the background.
+        @type  min_validity: C{long}
+        @param min_validity: Tokens with less seconds left than this are never
+                             handed out.
+        '''
+        self.renew_before = renew_before
+        self.min_validity = min_validity
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._pending = {}
+        self._salt = os.urandom(16)
+
+    def get_bearer_saml_assertion(self,
+                                  authenticator,
+                                  username,
+                                  password,
+                                  public_key=None,
+                                  private_key=None,
+                                  token_duration=600,
+                                  delegatable=False,
+                                  ssl_context=None):
+        '''
+        Cached version of SsoAuthenticator.get_bearer_saml_assertion.
+
+        @type  authenticator: C{SsoAuthenticator}
+        @param authenticator: Authenticator for the STS issuing the token.
+        @rtype: C{str}
+        @return: The SAML assertion in Unicode.
+        '''
+        def issue(token=None):
+            return authenticator.get_bearer_saml_assertion(
+                username, password, public_key=public_key,
+                private_key=private_key, token_duration=token_duration,
+                delegatable=delegatable, ssl_context=ssl_context)
+        digest = hashlib.sha256(self._salt + password.encode(UTF_8)).hexdigest()
+        key = (authenticator._sts_url, username, digest, 'bearer',
+               delegatable, token_duration)
+        return self._get(key, issue, token_duration)
+
+    def get_hok_saml_assertion(self,
+                               authenticator,
+                               public_key,
+                               private_key,
+                               token_duration=600,
+                               delegatable=False,
+                               ssl_context=None):
+        '''
+        Cached version of SsoAuthenticator.get_hok_saml_assertion. The
+        principal is identified by its certificate file.
+
+        @type  authenticator: C{SsoAuthenticator}
+        @param authenticator: Authenticator for the STS issuing the token.
+        @rtype: C{str}
+        @return: The SAML assertion in Unicode.
+        '''
+        def issue(token=None):
+            if token is not None:
+                return authenticator.get_token_by_token(
+                    token, private_key, token_duration=token_duration,
+                    ssl_context=ssl_context, delegatable=delegatable)
+            return authenticator.get_hok_saml_assertion(
+                public_key, private_key, token_duration=token_duration,
+                delegatable=delegatable, ssl_context=ssl_context)
+        key = (authenticator._sts_url, public_key, private_key, 'hok',
+               delegatable, token_duration)
+        return self._get(key, issue, token_duration)
+
+    def invalidate(self, key=None):
+        '''
+        Drop one cached token, or all of them, and cancel their renewal.
+        '''
+        with self._lock:
+            if key is None:
+                entries = list(self._entries.values())
+                self._entries.clear()
+            else:
+                entry = self._entries.pop(key, None)
+                entries = [entry] if entry is not None else []
+        for entry in entries:
+            entry['timer'].cancel()
+
+    def _get(self, key, issue, token_duration):
+        # A caller asking for a long lived token is not handed one that is
+        # about to expire
+        min_validity = max(self.min_validity,
+                           token_duration * self.renew_before)
+        with self._lock:
+            entry = self._entries.get(key)
+            now = time.time()
+            if entry is not None and entry['expires'] - now > min_validity:
+                entry['used'] = True
+                if entry['renew_at'] <= now and key not in self._pending:
+                    # The scheduled renewal found the token idle, renew now
+                    # that it is in use again
+                    thread = threading.Thread(target=self._renew,
+                                              args=(key, entry['issue']))
+                    thread.daemon = True
+                    thread.start()
+                return entry['token']
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = self._pending[key] = Future()
+        if owner:
+            self._fetch(key, future, issue, used=True)
+        return future.result()
+
+    def _fetch(self, key, future, issue, token=None, used=False):
+        try:
+            try:
+                new_token = issue(token)
+            except Exception:
+                if token is None:
+                    raise
+                # The old token may have been revoked, start over
+                new_token = issue()
+            self._store(key, new_token, issue, used)
+            future.set_result(new_token)
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def _store(self, key, token, issue, used):
+        now = time.time()
+        expires = get_assertion_expiry(token)
+        lifetime = expires - now
+        delay = max(0, min(lifetime * (1 - self.renew_before),
+                           lifetime - 2 * self.min_validity))
+        timer = threading.Timer(delay, self._renew, (key, issue))
+        timer.daemon = True
+        with self._lock:
+            old = self._entries.get(key)
+            self._entries[key] = {'token': token, 'expires': expires,
+                                  'renew_at': now + delay, 'used': used,
+                                  'issue': issue, 'timer': timer}
+        if old is not None:
+            old['timer'].cancel()
+        timer.start()
+
+    def _renew(self, key, issue):
+        with self._lock:
+            entry = self._entries.get(key)
+            # Idle tokens are left to expire instead of loading the STS
+            if entry is None or not entry['used'] or key in self._pending:
+                return
+            future = self._pending[key] = Future()
+        self._fetch(key, future, issue, entry['token'])
+        if future.exception() is not None:
+            print('Renewal of SAML token for {0} failed: {1}'.format(
+                key[1], future.exception()))
+
+
+# Process-wide token cache
+token_cache = SamlTokenCache()
+
+
 class SecurityTokenRequest(object):
     '''
     SecurityTokenRequest class handles the serialization of request to the STS
@@ -736,12 +1119,10 @@ class SecurityTokenRequest(object):
 
         # These will only be populated if requesting an HoK token.
         if self._private_key_file:
-            with open(self._private_key_file) as fp:
-                self._private_key = fp.read()
+            self._private_key = _read_key_file(self._private_key_file)
 
         if self._public_key_file:
-            with open(self._public_key_file) as fp:
-                self._public_key = fp.read()
+            self._public_key = _read_key_file(self._public_key_file)
 
     def construct_bearer_token_request(self, delegatable=False, renewable=False):
         '''
@@ -804,56 +1185,64 @@ class SecurityTokenRequest(object):
         self._delegatable = str(delegatable).lower()
         self._act_as_token = act_as_token
         if act_as_token is None:
-            self._xml_text = _canonicalize(REQUEST_TEMPLATE % self.__dict__)
+            self._xml = _parse(REQUEST_TEMPLATE % self.__dict__)
         else:
-            self._xml_text = ACTAS_REQUEST_TEMPLATE % self.__dict__
+            self._xml = _parse(ACTAS_REQUEST_TEMPLATE % self.__dict__)
         self.sign_request()
-        return etree.tostring(self._xml, pretty_print=False).decode(UTF_8)
+        return self._xml_text
 
-    def construct_hok_by_hok_request(self, renewable=False):
+    def construct_hok_by_hok_request(self, renewable=False, delegatable=False):
         """
         @type    renewable: C{boolean}
         @param   renewable: Whether the generated token is renewable or not
                             The default value is False
+        @type  delegatable: C{boolean}
+        @param delegatable: Whether the generated token is delegatable or not
         @rtype: C{str}
         @return: HoK token SOAP request in Unicode.
         """
         self._renewable = str(renewable).lower()
+        self._delegatable = str(delegatable).lower()
         self._key_type = "http://docs.oasis-open.org/ws-sx/ws-trust/200512/PublicKey"
-        return _canonicalize(REQUEST_TEMPLATE_TOKEN_BY_TOKEN) % self.__dict__
+        return _canonical_template(REQUEST_TEMPLATE_TOKEN_BY_TOKEN) % self.__dict__
 
     def sign_request(self):
         '''
         Calculates the signature to the header of the SOAP request which can be
         used by the STS to verify that the SOAP message originated from a
         trusted service.
+
+        The digests are calculated on the parsed request, which is then signed
+        in place, so the XML is parsed and serialized only once.
         '''
-        base_xml = etree.fromstring(self._xml_text)
-        request_tree = _extract_element(base_xml,
+        if self._xml is None:
+            self._xml = _parse(self._xml_text)
+        request_tree = _extract_element(self._xml,
                             'Body',
                             {'SOAP-ENV': "http://schemas.xmlsoap.org/soap/envelope/"})
-        request = _canonicalize(etree.tostring(request_tree))
-        request_tree = _extract_element(base_xml,
+        timestamp_tree = _extract_element(self._xml,
                             'Timestamp',
                             {'ns3': "http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-wssecurity-utility-1.0.xsd"})
-        timestamp = _canonicalize(etree.tostring(request_tree))
-        self._request_digest = _make_hash(request.encode(UTF_8)).decode(UTF_8)  # pylint: disable=W0612
-        self._timestamp_digest = _make_hash(timestamp.encode(UTF_8)).decode(UTF_8)  # pylint: disable=W0612
+        self._request_digest = _make_hash(_c14n(request_tree)).decode(UTF_8)  # pylint: disable=W0612
+        self._timestamp_digest = _make_hash(_c14n(timestamp_tree)).decode(UTF_8)  # pylint: disable=W0612
         self._algorithm = SHA256
         self._signed_info = _canonicalize(SIGNED_INFO_TEMPLATE % self.__dict__)
         self._signature_value = _sign(self._private_key, self._signed_info).decode(UTF_8)
-        self._signature_text = _canonicalize(SIGNATURE_TEMPLATE % self.__dict__)
+        self._signature = _parse(SIGNATURE_TEMPLATE % self.__dict__)
+        self._signature_text = None
         self.embed_signature()
 
     def embed_signature(self):
         '''
         Embeds the signature in to the header of the SOAP request.
         '''
-        self._xml = etree.fromstring(self._xml_text)
+        if self._xml is None:
+            self._xml = _parse(self._xml_text)
+        if self._signature is None:
+            self._signature = _parse(self._signature_text)
         security = _extract_element(self._xml,
                                    'Security',
                                    {'ns6': "http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-wssecurity-secext-1.0.xsd"})
-        self._signature = etree.fromstring(self._signature_text)
         security.append(self._signature)
         self._xml_text = etree.tostring(self._xml).decode(UTF_8)
 
@@ -874,9 +1263,8 @@ def add_saml_context(serialized_request, saml_token, private_key_file):
     @rtype: C{str}
     @return: signed SOAP request in Unicode.
     '''
-    with open(private_key_file) as fp:
-        private_key = fp.read()
-    xml = etree.fromstring(serialized_request)
+    private_key = _read_key_file(private_key_file)
+    xml = _parse(serialized_request)
     value_map = {}
     value_map['_request_id'] = _generate_id()
     request_body = _extract_element(xml,
@@ -885,8 +1273,7 @@ def add_saml_context(serialized_request, saml_token, private_key_file):
     request_body.nsmap["wsu"] = "http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-wssecurity-utility-1.0.xsd"
     request_body.set("{http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-wssecurity-utility-1.0.xsd}Id", value_map['_request_id'])
     value_map['_request_digest'] = _make_hash_sha512(
-                                    _canonicalize(etree.tostring(request_body))
-                                        .encode(UTF_8)).decode(UTF_8)
+                                    _c14n(request_body)).decode(UTF_8)
     security = _extract_element(xml,
                                'Security',
                                {'ns6': "http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-wssecurity-secext-1.0.xsd"})
@@ -896,19 +1283,18 @@ def add_saml_context(serialized_request, saml_token, private_key_file):
     value_map['_request_expires'] = time.strftime(TIME_FORMAT,
                                         time.gmtime(current + 600))
     value_map['_timestamp_id'] = _generate_id()
-    timestamp = _canonicalize(TIMESTAMP_TEMPLATE % value_map)
+    timestamp = _parse(TIMESTAMP_TEMPLATE % value_map)
     value_map['_timestamp_digest'] = _make_hash_sha512(
-        timestamp.encode(UTF_8)).decode(UTF_8)
+        _c14n(timestamp)).decode(UTF_8)
 
-    security.append(etree.fromstring(timestamp))
+    security.append(timestamp)
     value_map['_algorithm'] = SHA512
     value_map['_signed_info'] = _canonicalize(SIGNED_INFO_TEMPLATE % value_map)
     value_map['_signature_value'] = _sign(private_key,
                                           value_map['_signed_info'],
                                           SHA512).decode(UTF_8)
     value_map['samlId'] = etree.fromstring(saml_token).get("ID")
-    signature = etree.fromstring(_canonicalize(REQUEST_SIGNATURE_TEMPLATE %
-                                               value_map))
+    signature = _parse(REQUEST_SIGNATURE_TEMPLATE % value_map)
     security.append(signature)
     return etree.tostring(xml, pretty_print=False).decode(UTF_8)
 
@@ -939,7 +1325,7 @@ def _load_private_key(der_key):
 
     # Unencrypted PKCS8, or PKCS1 for OpenSSL 1.0.1, PKCS1 for OpenSSL 0.9.8
     try:
-        return crypto.load_privatekey(crypto.FILETYPE_ASN1, der_key, '')
+        return crypto.load_privatekey(crypto.FILETYPE_ASN1, der_key)
     except (crypto.Error, ValueError):
         pass
     # Unencrypted PKCS8 for OpenSSL 0.9.8, and PKCS1, just in case...
@@ -948,7 +1334,7 @@ def _load_private_key(der_key):
             return crypto.load_privatekey(crypto.FILETYPE_PEM,
                                           '-----BEGIN {}-----\n{}-----END {}-----\n'.format(
                                               key_type,
-                                              base64.encodestring(der_key).decode(UTF_8),
+                                              _encode_base64(der_key).decode(UTF_8),
                                               key_type),
                                           b'')
         except (crypto.Error, ValueError):
@@ -957,6 +1343,12 @@ def _load_private_key(der_key):
     raise
 
 
+_DIGESTS = {SHA256: hashes.SHA256, SHA512: hashes.SHA512}
+
+# base64.encodestring was removed in Python 3.9
+_encode_base64 = getattr(base64, 'encodebytes', None) or base64.encodestring
+
+
 def _sign(private_key, data, digest=SHA256):
     '''
     An internal helper method to sign the 'data' with the 'private_key'.
@@ -973,10 +1365,50 @@ def _sign(private_key, data, digest=SHA256):
     @rtype: C{str}
     @return: Signed string.
     '''
-    # Convert private key in arbitrary format into DER (DER is binary format
-    # so we get rid of \n / \r\n differences, and line breaks in PEM).
-    pkey = _load_private_key(_extract_certificate(private_key))
-    return base64.b64encode(crypto.sign(pkey, data, digest))
+    key = _private_keys.get(private_key)
+    if key is None:
+        # Convert private key in arbitrary format into DER (DER is binary format
+        # so we get rid of \n / \r\n differences, and line breaks in PEM).
+        # crypto.sign is gone from recent pyOpenSSL, sign with cryptography.
+        key = _load_private_key(
+            _extract_certificate(private_key)).to_cryptography_key()
+        _private_keys.put(private_key, key)
+    if isinstance(data, six.text_type):
+        data = data.encode(UTF_8)
+    return base64.b64encode(key.sign(data, padding.PKCS1v15(),
+                                     _DIGESTS[digest]()))
+
+
+def _parse(xml_string):
+    '''
+    An internal helper to parse XML, dropping whitespace between elements, with
+    a parser cached per thread.
+
+    @type  xml_string: C{str}
+    @param xml_string: The XML string that needs to be parsed.
+
+    @rtype: etree element.
+    @return: The root element.
+    '''
+    parser = getattr(_parsers, 'parser', None)
+    if parser is None:
+        parser = _parsers.parser = etree.XMLParser(remove_blank_text=True)
+    return etree.fromstring(xml_string, parser=parser)
+
+
+def _c14n(element):
+    '''
+    Canonicalize an element and its children per
+    U{http://www.w3.org/2001/10/xml-exc-c14n#} without re-parsing it.
+
+    @type  element: etree element.
+    @param element: The element that needs to be canonicalized.
+
+    @rtype: C{bytes}
+    @return: Canonicalized UTF-8 encoded XML.
+    '''
+    return etree.tostring(element, method='c14n', exclusive=True,
+                          with_comments=False)
 
 
 def _canonicalize(xml_string):
@@ -990,11 +1422,57 @@ def _canonicalize(xml_string):
     @rtype: C{str}
     @return: Canonicalized string in Unicode.
     '''
-    parser = etree.XMLParser(remove_blank_text=True)
-    tree = etree.fromstring(xml_string, parser=parser).getroottree()
-    string = BytesIO()
-    tree.write_c14n(string, exclusive=True, with_comments=False)
-    return string.getvalue().decode(UTF_8)
+    return _c14n(_parse(xml_string)).decode(UTF_8)
+
+
+def _canonical_template(template):
+    '''
+    Canonicalized form of a request template, computed once per template.
+    '''
+    canonical = _canonical_templates.get(template)
+    if canonical is None:
+        canonical = _canonical_templates[template] = _canonicalize(template)
+    return canonical
+
+
+def _read_key_file(path):
+    '''
+    Reads a key or certificate file, caching the content until the file
+    changes.
+
+    @type  path: C{str}
+    @param path: The file to read.
+
+    @rtype: C{str}
+    @return: The content of the file.
+    '''
+    mtime = os.path.getmtime(path)
+    entry = _key_files.get(path)
+    if entry is None or entry[0] != mtime:
+        with open(path) as fp:
+            entry = (mtime, fp.read())
+        # Replaces the content read before the file changed
+        _key_files.put(path, entry)
+    return entry[1]
+
+
+def get_assertion_expiry(saml_token):
+    '''
+    Reads the NotOnOrAfter condition of a SAML assertion.
+
+    @type  saml_token: C{str}
+    @param saml_token: The SAML assertion.
+
+    @rtype: C{float}
+    @return: Expiry time in seconds since the epoch.
+    '''
+    conditions = _extract_element(_parse(saml_token),
+                                  'Conditions',
+                                  {'saml2': "urn:oasis:names:tc:SAML:2.0:assertion"})
+    not_on_or_after = conditions.get('NotOnOrAfter')
+    # Fractional seconds and the trailing Z are not needed at this precision
+    return calendar.timegm(time.strptime(not_on_or_after[:19],
+                                         '%Y-%m-%dT%H:%M:%S'))
 
 
 def _extract_element(xml, element_name, namespace):
@@ -31,13 +31,37 @@ def get_jsonrpc_endpoint_url(host):
     return "https://{}/api".format(host)
 
 
-def connect(host, user, pwd, skip_verification=False, cert_path=None, suppress_warning=True):
+def connect(host, user, pwd, skip_verification=False, cert_path=None, suppress_warning=True,
+            pooled=False):
     """
     Create an authenticated stub configuration object that can be used to issue
     requests against vCenter.
 
     Returns a stub_config that stores the session identifier that can be used
     to issue authenticated requests against vCenter.
+
+    When pooled is set, the stub_config comes from the process-wide session
+    pool instead: the HTTP connections and session identifier are shared with
+    every other pooled caller for the same host, user and verification mode,
+    an expired session is renewed transparently, and the session is only
+    logged out when the process exits.
+    """
+    if pooled:
+        from samples.vsphere.common.session_pool import get_session_pool
+        return get_session_pool().get_stub_config(host, user, pwd,
+                                                  skip_verification,
+                                                  cert_path, suppress_warning)
+
+    stub_config = create_stub_config(host, skip_verification, cert_path,
+                                     suppress_warning)
+    return login(stub_config, user, pwd)
+
+
+def create_stub_config(host, skip_verification=False, cert_path=None,
+                       suppress_warning=True):
+    """
+    Create an unauthenticated stub configuration object for the vAPI endpoint
+    of vCenter.
     """
     host_url = get_jsonrpc_endpoint_url(host)
 
@@ -47,9 +71,7 @@ def connect(host, user, pwd, skip_verification=False, cert_path=None, suppress_w
     elif cert_path:
         session.verify = cert_path
     connector = get_requests_connector(session=session, url=host_url)
-    stub_config = StubConfigurationFactory.new_std_configuration(connector)
-
-    return login(stub_config, user, pwd)
+    return StubConfigurationFactory.new_std_configuration(connector)
 
 
 def login(stub_config, user, pwd):
@@ -59,6 +81,17 @@ def login(stub_config, user, pwd):
     Returns a stub_config that stores the session identifier that can be used
     to issue authenticated requests against vCenter.
     """
+    session_id = create_session(stub_config, user, pwd)
+    return use_session(stub_config, session_id)
+
+
+def create_session(stub_config, user, pwd):
+    """
+    Create a session with vCenter and return its identifier.
+
+    The identifier is also accepted by pyVmomi (SmartConnect's sessionId),
+    so the same login can back both stacks.
+    """
     # Pass user credentials (user/password) in the security context to
     # authenticate.
     user_password_security_context = create_user_password_security_context(user,
@@ -67,10 +100,16 @@ def login(stub_config, user, pwd):
 
     # Create the stub for the session service and login by creating a session.
     session_svc = Session(stub_config)
-    session_id = session_svc.create()
+    return session_svc.create()
 
-    # Successful authentication.  Store the session identifier in the security
-    # context of the stub and use that for all subsequent remote requests
+
+def use_session(stub_config, session_id):
+    """
+    Authenticate all subsequent requests of a stub_config with an existing
+    session identifier.
+    """
+    # Store the session identifier in the security context of the stub and
+    # use that for all subsequent remote requests
     session_security_context = create_session_security_context(session_id)
     stub_config.connector.set_security_context(session_security_context)
 
@@ -80,8 +119,12 @@ def login(stub_config, user, pwd):
 def logout(stub_config):
     """
     Delete session with vCenter.
+
+    Pooled stub configurations are left alone; the pool logs them out once
+    at shutdown.
     """
-    if stub_config:
+    from samples.vsphere.common.session_pool import get_session_pool
+    if stub_config and not get_session_pool().is_pooled(stub_config):
         session_svc = Session(stub_config)
         session_svc.delete()
 
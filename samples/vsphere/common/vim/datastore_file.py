@@ -14,10 +14,14 @@
 __author__ = 'VMware, Inc.'
 __copyright__ = 'Copyright 2016 VMware, Inc. All rights reserved.'
 
+import threading
+import time
+
 import pyVim.task
 import requests
 from pyVmomi import vim
 
+from samples.vsphere.common.vim.datastore_transfer import DatastoreTransfer
 from samples.vsphere.common.vim.inventory import get_datacenter_for_datastore
 
 # TODO:
@@ -28,6 +32,83 @@ debug = False
 (FILE, FOLDER) = range(2)
 
 
+def join_datastore_path(folder, name):
+    """Join a datastore folder path such as '[ds] dir' and a file name"""
+    folder = folder.rstrip('/')
+    if folder.endswith(']'):
+        return '{} {}'.format(folder, name)
+    return '{}/{}'.format(folder, name)
+
+
+class TreeCache(object):
+    """
+    Results of recursive datastore searches, kept per datastore path for ttl
+    seconds and indexed by full datastore path, so existence checks below a
+    walked directory do not need another browse task. Helpers changing
+    datastore files outside of File invalidate it too; changes made by
+    anything else show up once the ttl expires.
+    """
+    def __init__(self, ttl=5):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, datastore_mo, root):
+        with self._lock:
+            entry = self._entries.get((datastore_mo._GetMoId(), root))
+            if entry is None or entry[0] < time.time():
+                return None
+            return entry[1]
+
+    def put(self, datastore_mo, root, results):
+        index = {}
+        for result in results:
+            for f in result.file or []:
+                index[join_datastore_path(result.folderPath, f.path)] = f
+        with self._lock:
+            self._entries[(datastore_mo._GetMoId(), root)] = \
+                (time.time() + self.ttl, results, index)
+
+    def lookup(self, datastore_mo, datastore_path):
+        """
+        Return the FileInfo of datastore_path, False if a fresh walk of one
+        of its parent directories did not contain it, or None if no fresh
+        walk covers it.
+        """
+        moid = datastore_mo._GetMoId()
+        now = time.time()
+        found = None
+        with self._lock:
+            for (key_moid, root), entry in self._entries.items():
+                if key_moid != moid or entry[0] < now:
+                    continue
+                root = root.rstrip('/')
+                prefix = root + ' ' if root.endswith(']') else root + '/'
+                if not datastore_path.startswith(prefix):
+                    continue
+                info = entry[2].get(datastore_path)
+                if info is not None:
+                    return info
+                found = False
+        return found
+
+    def invalidate(self, datastore_mo=None):
+        """
+        Drop every cached walk of a datastore after it was modified, or of
+        all datastores when none is given.
+        """
+        with self._lock:
+            if datastore_mo is None:
+                self._entries.clear()
+                return
+            moid = datastore_mo._GetMoId()
+            for key in [k for k in self._entries if k[0] == moid]:
+                del self._entries[key]
+
+
+tree_cache = TreeCache()
+
+
 class FileArray(list):
     def list(self, path=None):
         children = FileArray()
@@ -73,9 +154,9 @@ class FileArray(list):
         self._check_unique()
         return self[0].put(path, src_url, src_file, src_path, content)
 
-    def get(self, path=None):
+    def get(self, path=None, dest_path=None):
         self._check_unique()
-        return self[0].get(path)
+        return self[0].get(path, dest_path)
 
     def exists(self, path=None):
         self._check_unique()
@@ -93,6 +174,14 @@ class FileArray(list):
         self._check_unique()
         return self[0].mkdir(path, parent)
 
+    def walk(self, path=None, refresh=False):
+        self._check_unique()
+        return self[0].walk(path, refresh)
+
+    def stat(self, path=None):
+        self._check_unique()
+        return self[0].stat(path)
+
 
 class File(object):
     """
@@ -101,6 +190,7 @@ class File(object):
     """
     def __init__(self, parent=None, path=None, ftype=None):
         self._file_manager = None
+        self._transfer = None
         if isinstance(parent, vim.Datastore):
             # Iteratively look for the Datacenter parent
             self._datacenter_mo = get_datacenter_for_datastore(parent)
@@ -113,6 +203,7 @@ class File(object):
         elif isinstance(parent, File):
             self._datacenter_mo = parent._datacenter_mo
             self._datastore_mo = parent.datastore_mo
+            self._transfer = parent._transfer
             self._ftype = ftype
             if parent._path == '':
                 self._path = path
@@ -219,125 +310,160 @@ class File(object):
                 children.append(File(self, path=f.path, ftype=ftype))
         return children
 
-    def _make_cookie(self, stub):
-        cookies = {}
-        for c in stub.cookie.split(';'):
-            e = c.strip().split('=')
-            if len(e) > 1:
-                cookies[e[0]] = e[1]
-        return cookies
-
-    def exists(self, path=None):
-        try:
-            return len(self.list(path)) > 0
-        except vim.fault.FileNotFound:
-            return False
-
-    def put(self, path=None, src_url=None, src_file=None, src_path=None,
-            content=None):
-        datacenter_name = self._datacenter_mo.name
-        datastore_name = self._datastore_mo.name
-        stub = self._datastore_mo._stub
-        cookie = self._make_cookie(stub)
-        f = None
-        if src_file is not None:
-            f = src_file
-        elif src_url is not None:
-            f = requests.get(src_url, stream=True)
-        elif src_path is not None:
-            f = open(src_file, 'wb')
-        elif content is None:
-            raise Exception('No input provided for put')
-
-        if f:
-            data = f
+    def walk(self, path=None, refresh=False):
+        """
+        Yield (folder datastore path, FileInfo) for every file and folder
+        below path, including size, modification time and type. The whole
+        tree is fetched by one SearchDatastoreSubFolders task and cached in
+        tree_cache, so repeated walks within its ttl do not go to the server.
+        """
+        if path and path.startswith('['):
+            root = path
         else:
-            data = content
-
-        paths = ['https://{0}/folder'.format(stub.host)]
-        if self._path:
-            paths.append(self._path)
-        if path:
-            paths.append(path)
-        url = '/'.join(paths)
-        if debug:
-            print("put: url is '{}'".format(url))
-
-        r = requests.put(url, params={'dcPath': datacenter_name,
-                                      'dsName': datastore_name},
-                         cookies=cookie, verify=False, data=data)
-
-        if f:
-            f.close()
-            f = None
-
-        if r.status_code < 200 or r.status_code >= 300:
-            raise Exception('Put failed with status {}'.format(r.status_code),
-                            r)
-
-    def get(self, path=None):
-        datacenter_name = self._datacenter_mo.name
-        datastore_name = self._datastore_mo.name
-        stub = self._datastore_mo._stub
-        cookie = self._make_cookie(stub)
-
-        paths = ['https://{0}/folder'.format(stub.host)]
-        if self._path:
-            paths.append(self._path)
-        if path:
-            paths.append(path)
-        url = '/'.join(paths)
-        if debug:
-            print("get: url is '{}'".format(url))
-
-        r = requests.get(url, params={'dcPath': datacenter_name,
-                                      'dsName': datastore_name},
-                         cookies=cookie, verify=False, stream=True)
+            root = self.get_datastore_path(path)
+        results = None if refresh else tree_cache.get(self._datastore_mo, root)
+        if results is None:
+            search_spec = vim.host.DatastoreBrowser.SearchSpec(
+                query=[vim.host.DatastoreBrowser.FolderQuery(),
+                       vim.host.DatastoreBrowser.Query()],
+                details=vim.host.DatastoreBrowser.FileInfo.Details(
+                    fileType=True, fileSize=True, modification=True),
+                sortFoldersFirst=True)
+            if debug:
+                print("walk: root='{}' search_spec='{}'".
+                      format(root, search_spec))
+            task = self._datastore_mo.browser.SearchSubFolders(root,
+                                                               search_spec)
+            pyVim.task.WaitForTask(task)
+            results = task.info.result
+            tree_cache.put(self._datastore_mo, root, results)
+
+        for result in results:
+            for f in result.file or []:
+                yield result.folderPath, f
+
+    def stat(self, path=None):
+        """
+        Return the FileInfo of path or None if it does not exist. The answer
+        comes from a cached walk when one covers path; otherwise only the
+        parent directory is searched for the name of path.
+        """
+        if path and path.startswith('['):
+            datastore_path = path
+        else:
+            datastore_path = self.get_datastore_path(path)
+        info = tree_cache.lookup(self._datastore_mo, datastore_path)
+        if info is None:
+            if datastore_path.endswith(']'):
+                return None
+            if '/' in datastore_path:
+                parent, name = datastore_path.rsplit('/', 1)
+            else:
+                parent, name = datastore_path.split(']', 1)
+                parent, name = parent + ']', name.strip()
+            search_spec = vim.host.DatastoreBrowser.SearchSpec(
+                query=[vim.host.DatastoreBrowser.FolderQuery(),
+                       vim.host.DatastoreBrowser.Query()],
+                details=vim.host.DatastoreBrowser.FileInfo.Details(
+                    fileType=True, fileSize=True, modification=True),
+                matchPattern=[name])
+            if debug:
+                print("stat: parent='{}' search_spec='{}'".
+                      format(parent, search_spec))
+            task = self._datastore_mo.browser.Search(parent, search_spec)
+            try:
+                pyVim.task.WaitForTask(task)
+            except vim.fault.FileNotFound:
+                return None
+            info = next((f for f in task.info.result.file or []
+                         if f.path == name), None)
+        return info or None
 
-        if r.status_code < 200 or r.status_code >= 300:
-            raise Exception('Get failed with status {}'.format(r.status_code),
-                            r)
+    def exists(self, path=None):
+        return self.stat(path) is not None
 
-        return r
+    def mkdir(self, path=None, parent=False):
+        self._get_transfer().mkdir(self._remote_path(path), parent)
+        tree_cache.invalidate(self._datastore_mo)
 
     def delete(self, path=None):
-        datacenter_name = self._datacenter_mo.name
-        datastore_name = self._datastore_mo.name
-        stub = self._datastore_mo._stub
-        cookie = self._make_cookie(stub)
-
-        paths = ['https://{0}/folder'.format(stub.host)]
-        if self._path:
-            paths.append(self._path)
-        if path:
-            paths.append(path)
-        url = '/'.join(paths)
+        """
+        Delete a file through the HTTP endpoint of the datastore.
+        """
+        transfer = self._get_transfer()
+        remote_path = self._remote_path(path)
         if debug:
-            print("delete: url is '{}'".format(url))
-
-        r = requests.delete(url, params={'dcPath': datacenter_name,
-                                         'dsName': datastore_name},
-                            cookies=cookie, verify=False)
-
-        if r.status_code < 200 or r.status_code >= 300:
-            raise Exception(
-                'Delete failed with status {}'.format(r.status_code), r)
+            print("delete: url is '{}'".format(transfer.url(remote_path)))
+        try:
+            transfer.delete(remote_path)
+        finally:
+            tree_cache.invalidate(self._datastore_mo)
 
     def delete2(self, path=None):
-        datacenter_mo = self._datacenter_mo
+        """
+        Delete a file or a directory and its content through the FileManager.
+        """
         file_manager = self._get_file_manager()
         datastore_path = self.get_datastore_path(path)
         if debug:
             print("delete2: datastore_path is '{}'".format(datastore_path))
+        try:
+            task = file_manager.DeleteDatastoreFile_Task(datastore_path,
+                                                         self._datacenter_mo)
+            pyVim.task.WaitForTask(task)
+        finally:
+            tree_cache.invalidate(self._datastore_mo)
 
-            # TODO 'FileType' is not public?
-            # file_manager.Delete(self._datacenter_mo, datastore_path, 'File')
+    def _get_transfer(self):
+        if not self._transfer:
+            self._transfer = DatastoreTransfer(self._datastore_mo,
+                                               self._datacenter_mo)
+        return self._transfer
 
-    def mkdir(self, path=None, parent=False):
-        datacenter_mo = self._datacenter_mo
-        file_manager = self._get_file_manager()
-        datastore_path = self.get_datastore_path(path)
+    def _remote_path(self, path=None):
+        return '/'.join([p for p in [self._path, path] if p])
+
+    def put(self, path=None, src_url=None, src_file=None, src_path=None,
+            content=None):
+        """
+        Upload to the datastore through the shared transfer engine. A local
+        src_path is streamed from a memory map and retried on failure.
+        Returns the TransferStats of the upload.
+        """
+        transfer = self._get_transfer()
+        remote_path = self._remote_path(path)
+        if debug:
+            print("put: url is '{}'".format(transfer.url(remote_path)))
+
+        tree_cache.invalidate(self._datastore_mo)
+        if src_path is not None:
+            return transfer.put(src_path, remote_path)
+
+        f = None
+        if src_file is not None:
+            f = src_file
+        elif src_url is not None:
+            f = requests.get(src_url, stream=True).raw
+        elif content is None:
+            raise Exception('No input provided for put')
+
+        try:
+            return transfer.put_stream(f if f else content, remote_path)
+        finally:
+            if f:
+                f.close()
+
+    def get(self, path=None, dest_path=None):
+        """
+        Download from the datastore. With dest_path the file is fetched with
+        parallel ranged requests, resuming an interrupted download, and the
+        TransferStats are returned; otherwise the streamed response is.
+        """
+        transfer = self._get_transfer()
+        remote_path = self._remote_path(path)
         if debug:
-            print("mkdir: datastore_path is '{}'".format(datastore_path))
+            print("get: url is '{}'".format(transfer.url(remote_path)))
 
-        file_manager.MakeDirectory(datastore_path, self._datacenter_mo, parent)
+        if dest_path is not None:
+            return transfer.get(remote_path, dest_path)
+        return transfer.open(remote_path)
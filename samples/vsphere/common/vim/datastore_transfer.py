@@ -0,0 +1,398 @@
+"""
+* *******************************************************
+* Copyright (c) 2024 Broadcom. All Rights Reserved.
+* SPDX-License-Identifier: MIT
+* *******************************************************
+*
+* DISCLAIMER. THIS PROGRAM IS PROVIDED TO YOU "AS IS" WITHOUT
+* WARRANTIES OR CONDITIONS OF ANY KIND, WHETHER ORAL OR WRITTEN,
+* EXPRESS OR IMPLIED. THE AUTHOR SPECIFICALLY DISCLAIMS ANY IMPLIED
+* WARRANTIES OR CONDITIONS OF MERCHANTABILITY, SATISFACTORY QUALITY,
+* NON-INFRINGEMENT AND FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+__author__ = 'Broadcom, Inc.'
+__copyright__ = 'Copyright (c) 2024 Broadcom. All Rights Reserved.'
+
+import mmap
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from pyVmomi import vim
+
+from samples.vsphere.common.vim.inventory import get_datacenter_for_datastore
+
+CHUNK_SIZE = 1024 * 1024
+PART_SIZE = 64 * 1024 * 1024
+
+
+def run_all(func, items, workers, what='transfers'):
+    """
+    Call func on every item with a pool of workers and return the results in
+    item order. Every call runs to the end, then the failures are raised
+    together in one exception.
+    """
+    items = list(items)
+    with ThreadPoolExecutor(workers) as executor:
+        futures = [executor.submit(func, item) for item in items]
+    errors = [f.exception() for f in futures if f.exception()]
+    if errors:
+        raise Exception('{} of {} {} failed'.format(
+            len(errors), len(items), what), errors)
+    return [f.result() for f in futures]
+
+
+class TransferError(Exception):
+    """
+    Raised when the datastore answers a transfer request with an error status
+    """
+
+    def __init__(self, message, response):
+        Exception.__init__(self, message, response)
+        self.status_code = response.status_code
+
+
+class TransferStats(object):
+    """
+    Size, duration and retries of one datastore file transfer
+    """
+
+    def __init__(self, path, direction, size=None):
+        self.path = path
+        self.direction = direction
+        self.size = size
+        self.bytes = 0
+        self.resumed_bytes = 0
+        self.retries = 0
+        self.started = time.time()
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, count):
+        with self._lock:
+            self.bytes += count
+
+    def finish(self):
+        self.seconds = time.time() - self.started
+        return self
+
+    @property
+    def throughput(self):
+        """Transferred megabytes per second"""
+        seconds = self.seconds or (time.time() - self.started)
+        return self.bytes / (1024.0 * 1024.0) / seconds if seconds else 0.0
+
+    def __repr__(self):
+        return '{} {}: {} bytes in {:.1f}s ({:.2f} MB/s, {} retries)'.format(
+            self.direction, self.path, self.bytes, self.seconds,
+            self.throughput, self.retries)
+
+
+class _MappedBody(object):
+    """
+    Request body that streams a memory-mapped file without copying it into
+    a single buffer.
+    """
+
+    def __init__(self, data, stats, progress, chunk_size):
+        self._data = data
+        self._stats = stats
+        self._progress = progress
+        self._chunk_size = chunk_size
+        self._pos = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self._chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = len(self._data) - self._pos
+        chunk = self._data[self._pos:self._pos + size]
+        self._pos += len(chunk)
+        if chunk:
+            self._stats.add(len(chunk))
+            if self._progress:
+                self._progress(self._stats)
+        return chunk
+
+    def rewind(self):
+        self._stats.add(-self._pos)
+        self._pos = 0
+
+
+class DatastoreTransfer(object):
+    """
+    Transfers files through the /folder HTTP endpoint of a datastore.
+
+    All requests share one keep-alive requests session authenticated with
+    the cookie of the vim stub. Downloads are split into ranged parts that
+    are fetched in parallel and resumed from the local partial file after
+    an interruption; uploads stream from a memory-mapped source. Every
+    transfer returns a TransferStats.
+    """
+
+    def __init__(self, datastore_mo, datacenter_mo=None, workers=4,
+                 part_size=PART_SIZE, chunk_size=CHUNK_SIZE, retries=3,
+                 verify=False, progress=None):
+        self._datastore_mo = datastore_mo
+        self._datacenter_mo = datacenter_mo or \
+            get_datacenter_for_datastore(datastore_mo)
+        self._stub = datastore_mo._stub
+        self._params = {'dcPath': self._datacenter_mo.name,
+                        'dsName': datastore_mo.name}
+        self.workers = workers
+        self.part_size = part_size
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.progress = progress
+
+        self._session = requests.Session()
+        self._session.verify = verify
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers * 2)
+        self._session.mount('https://', adapter)
+        if not verify:
+            requests.packages.urllib3.disable_warnings()
+
+    def close(self):
+        self._session.close()
+
+    def url(self, path):
+        return 'https://{0}/folder/{1}'.format(self._stub.host,
+                                               path.lstrip('/'))
+
+    def _cookies(self):
+        # Read on every request so a renewed vim session is picked up
+        cookies = {}
+        for c in self._stub.cookie.split(';'):
+            e = c.strip().split('=')
+            if len(e) > 1:
+                cookies[e[0]] = e[1]
+        return cookies
+
+    def _request(self, method, path, **kwargs):
+        r = self._session.request(method, self.url(path), params=self._params,
+                                  cookies=self._cookies(), **kwargs)
+        if r.status_code < 200 or r.status_code >= 300:
+            r.close()
+            raise TransferError('{} failed with status {}'.format(
+                method.capitalize(), r.status_code), r)
+        return r
+
+    def _with_retries(self, stats, func, *args):
+        for attempt in range(self.retries + 1):
+            try:
+                return func(*args)
+            except (requests.RequestException, IOError, TransferError) as e:
+                # Client errors will not go away by retrying
+                if attempt == self.retries or \
+                        getattr(e, 'status_code', 500) < 500:
+                    raise
+                stats.retries += 1
+                time.sleep(min(2 ** attempt, 30))
+
+    def mkdir(self, path, parents=True):
+        """
+        Create a directory, and by default its parents, on the datastore.
+        """
+        file_manager = vim.ServiceInstance(
+            'ServiceInstance', self._stub).content.fileManager
+        try:
+            file_manager.MakeDirectory(
+                '[{}] {}'.format(self._datastore_mo.name, path),
+                self._datacenter_mo, createParentDirectories=parents)
+        except vim.fault.FileAlreadyExists:
+            pass
+
+    def delete(self, path):
+        """
+        Delete a file on the datastore.
+        """
+        self._request('DELETE', path).close()
+
+    def put(self, local_path, path):
+        """
+        Upload a local file, streaming it from a memory map.
+        """
+        size = os.path.getsize(local_path)
+        stats = TransferStats(path, 'put', size)
+        with open(local_path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) \
+                if size > 0 else b''
+            try:
+                body = _MappedBody(data, stats, self.progress, self.chunk_size)
+
+                def send():
+                    body.rewind()
+                    self._request('PUT', path, data=body, headers={
+                        'Content-Type': 'application/octet-stream'}).close()
+                self._with_retries(stats, send)
+            finally:
+                if size > 0:
+                    data.close()
+        return stats.finish()
+
+    def put_stream(self, fileobj, path):
+        """
+        Upload from a file-like object or iterable that cannot be rewound,
+        so it is sent once without retries.
+        """
+        stats = TransferStats(path, 'put')
+        if isinstance(fileobj, bytes):
+            stats.add(len(fileobj))
+        self._request('PUT', path, data=fileobj, headers={
+            'Content-Type': 'application/octet-stream'}).close()
+        return stats.finish()
+
+    def open(self, path):
+        """
+        Return the streamed response of a GET of a file on the datastore.
+        The caller reads it with iter_content and closes it.
+        """
+        return self._request('GET', path, stream=True)
+
+    def get(self, path, local_path, workers=None):
+        """
+        Download a file into local_path using up to workers parallel ranged
+        requests. Parts already present in local_path + '.partial' from an
+        interrupted download are not fetched again, unless the size or the
+        modification time of the remote file changed since.
+        """
+        partial = local_path + '.partial'
+        journal = local_path + '.parts'
+        head = self._request('HEAD', path)
+        size = int(head.headers.get('Content-Length', 0))
+        ranged = head.headers.get('Accept-Ranges') == 'bytes'
+        # First line of the journal, the parts are only reused for the same
+        # remote file and part size
+        version = '# {} {} {}'.format(size, self.part_size,
+                                      head.headers.get('Last-Modified', ''))
+        head.close()
+        stats = TransferStats(path, 'get', size)
+
+        if not ranged:
+            self._with_retries(stats, self._get_whole, path, partial, stats)
+        else:
+            done = None
+            if os.path.exists(partial) and os.path.exists(journal):
+                with open(journal) as f:
+                    lines = f.read().splitlines()
+                if lines and lines[0] == version:
+                    done = set(int(line) for line in lines[1:]
+                               if line.strip())
+            if done is None:
+                done = set()
+                with open(partial, 'wb') as f:
+                    f.truncate(size)
+                with open(journal, 'w') as f:
+                    f.write(version + '\n')
+            parts = [(offset, min(self.part_size, size - offset))
+                     for offset in range(0, size, self.part_size)]
+            stats.resumed_bytes = sum(n for o, n in parts if o in done)
+            todo = [(o, n) for o, n in parts if o not in done]
+            journal_lock = threading.Lock()
+
+            def fetch(part):
+                self._with_retries(stats, self._get_part, path, partial,
+                                   part, stats)
+                with journal_lock, open(journal, 'a') as f:
+                    f.write('{}\n'.format(part[0]))
+
+            try:
+                with ThreadPoolExecutor(workers or self.workers) as executor:
+                    for _ in executor.map(fetch, todo):
+                        pass
+            except TransferError as e:
+                if e.status_code != 200:
+                    raise
+                # The server ignored the Range header, nothing was written
+                os.remove(journal)
+                stats.resumed_bytes = 0
+                self._with_retries(stats, self._get_whole, path, partial,
+                                   stats)
+            else:
+                os.remove(journal)
+        os.replace(partial, local_path)
+        return stats.finish()
+
+    def _get_whole(self, path, partial, stats):
+        stats.bytes = 0
+        with self._request('GET', path, stream=True) as r, \
+                open(partial, 'wb') as f:
+            for chunk in r.iter_content(self.chunk_size):
+                f.write(chunk)
+                stats.add(len(chunk))
+                if self.progress:
+                    self.progress(stats)
+
+    def _get_part(self, path, partial, part, stats):
+        offset, length = part
+        headers = {'Range': 'bytes={}-{}'.format(offset, offset + length - 1)}
+        received = 0
+        try:
+            with self._request('GET', path, stream=True, headers=headers) as r, \
+                    open(partial, 'r+b') as f:
+                # Anything but the requested range must not be written over
+                # the parts of other workers
+                content_range = r.headers.get('Content-Range', '')
+                if r.status_code != 206 or \
+                        not content_range.startswith('bytes {}-'.format(offset)):
+                    raise TransferError(
+                        'Range at {} answered with status {} and range {}'.
+                        format(offset, r.status_code, content_range or None),
+                        r)
+                f.seek(offset)
+                for chunk in r.iter_content(self.chunk_size):
+                    if len(chunk) > length - received:
+                        raise IOError('Long read for range at {}: more than '
+                                      '{} bytes'.format(offset, length))
+                    f.write(chunk)
+                    received += len(chunk)
+                    stats.add(len(chunk))
+                    if self.progress:
+                        self.progress(stats)
+            if received != length:
+                raise IOError('Short read for range at {}: {} of {} bytes'.
+                              format(offset, received, length))
+        except Exception:
+            stats.add(-received)
+            raise
+
+    def put_tree(self, local_dir, path):
+        """
+        Upload a local directory tree below path with a bounded pool of
+        workers. Returns the TransferStats of every file.
+        """
+        uploads = []
+        for root, dirs, files in os.walk(local_dir):
+            rel = os.path.relpath(root, local_dir)
+            remote_dir = path if rel == '.' else \
+                '/'.join([path] + rel.split(os.sep))
+            self.mkdir(remote_dir)
+            for name in files:
+                uploads.append((os.path.join(root, name),
+                                '/'.join([remote_dir, name])))
+        return run_all(lambda item: self.put(*item), uploads, self.workers)
+
+    def get_files(self, paths, local_dir):
+        """
+        Download the given datastore paths into local_dir with a bounded
+        pool of workers. Returns the TransferStats of every file.
+        """
+        def download(path):
+            local_path = os.path.join(local_dir, *path.split('/'))
+            parent = os.path.dirname(local_path)
+            if not os.path.isdir(parent):
+                os.makedirs(parent)
+            return self.get(path, local_path, workers=1)
+        return run_all(download, paths, self.workers)
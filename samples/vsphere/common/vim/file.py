@@ -15,6 +15,8 @@ __author__ = 'VMware, Inc.'
 
 import re
 
+from pyVmomi import vim
+
 from samples.vsphere.common.vim.inventory import get_datastore_mo
 
 from samples.vsphere.common.vim import datastore_file
@@ -42,12 +44,12 @@ def detect_directory(context, description, datacenter_name, datastore_path):
         raise Exception("Could not find datastore '{}'".format(datastore_name))
 
     dsfile = datastore_file.File(datastore_mo)
-    f = dsfile.list(datastore_path)
-    if len(f) == 0:
+    f = dsfile.stat(datastore_path)
+    if f is None:
         print("Failed to detect {} directory '{}'".format(description,
                                                           datastore_path))
         return False
-    if f.type != datastore_file.FOLDER:
+    if not isinstance(f, vim.host.DatastoreBrowser.FolderInfo):
         print("Path '{}' is not a directory".format(datastore_path))
         return False
     return True
@@ -99,12 +101,12 @@ def detect_file(context, description, datacenter_name, datastore_path):
         raise Exception("Could not find datastore '{}'".format(datastore_name))
 
     dsfile = datastore_file.File(datastore_mo)
-    f = dsfile.list(datastore_path)
-    if len(f) == 0:
+    f = dsfile.stat(datastore_path)
+    if f is None:
         print("Failed to detect {} file '{}'".
               format(description, datastore_path))
         return False
-    if f.type != datastore_file.FILE:
+    if isinstance(f, vim.host.DatastoreBrowser.FolderInfo):
         print("Path '{}' is not a file".format(datastore_path))
         return False
     return True
@@ -0,0 +1,218 @@
+"""
+* *******************************************************
+* Copyright (c) 2024 Broadcom. All Rights Reserved.
+* SPDX-License-Identifier: MIT
+* *******************************************************
+*
+* DISCLAIMER. THIS PROGRAM IS PROVIDED TO YOU "AS IS" WITHOUT
+* WARRANTIES OR CONDITIONS OF ANY KIND, WHETHER ORAL OR WRITTEN,
+* EXPRESS OR IMPLIED. THE AUTHOR SPECIFICALLY DISCLAIMS ANY IMPLIED
+* WARRANTIES OR CONDITIONS OF MERCHANTABILITY, SATISFACTORY QUALITY,
+* NON-INFRINGEMENT AND FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+__author__ = 'Broadcom, Inc.'
+__copyright__ = 'Copyright (c) 2024 Broadcom. All Rights Reserved.'
+
+import collections
+import threading
+from concurrent import futures
+
+from pyVmomi import vim, vmodl
+
+# Event argument attributes and the attribute holding their managed object
+ENTITY_ARGUMENTS = (
+    ('vm', 'vm'),
+    ('host', 'host'),
+    ('computeResource', 'computeResource'),
+    ('datacenter', 'datacenter'),
+    ('ds', 'datastore'),
+    ('net', 'network'),
+    ('dvs', 'dvs'),
+)
+
+
+def event_entities(event):
+    """
+    Return the moIds of the managed objects an event refers to.
+    """
+    moids = set()
+    for argument, attribute in ENTITY_ARGUMENTS:
+        obj = getattr(getattr(event, argument, None), attribute, None)
+        if obj is not None:
+            moids.add(obj._GetMoId())
+    return moids
+
+
+def _moid(entity):
+    return entity if isinstance(entity, str) else entity._GetMoId()
+
+
+class EventStream(object):
+    """
+    Follows new events below an entity through one EventHistoryCollector.
+
+    The collector is created for the events since the stream started,
+    optionally restricted to some event types (matched by exact type name
+    on the server, so list subtypes explicitly), and a background thread
+    reads only the events added since its last read with ReadNextEvents.
+    It wakes up when the latest page of the collector changes, through
+    WaitForUpdatesEx on a private property collector, instead of querying
+    the whole time window again. Callers wait for an event of some types
+    on a given entity, so a single stream serves any number of vms. Recent
+    events are kept so an event that arrived just before a caller started
+    to wait is not missed.
+    """
+
+    def __init__(self, content, event_types=None, entity=None, page_size=100,
+                 backlog=1000, max_wait_seconds=30):
+        self.content = content
+        self.event_types = tuple(event_types or ())
+        self.entity = entity or content.rootFolder
+        self.page_size = page_size
+        self.max_wait_seconds = max_wait_seconds
+        self._backlog = collections.deque(maxlen=backlog)
+        self._waiters = []
+        self._lock = threading.Lock()
+        self._collector = None
+        self._pc = None
+        self._version = ''
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Create the collector and start reading events from now on.
+        """
+        spec = vim.event.EventFilterSpec(
+            entity=vim.event.EventFilterSpec.ByEntity(
+                entity=self.entity,
+                recursion=vim.event.EventFilterSpec.RecursionOption.all),
+            time=vim.event.EventFilterSpec.ByTime(
+                beginTime=vim.ServiceInstance(
+                    'ServiceInstance', self.content.rootFolder._stub
+                ).CurrentTime()))
+        if self.event_types:
+            spec.eventTypeId = [t._wsdlName for t in self.event_types]
+        self._collector = \
+            self.content.eventManager.CreateCollectorForEvents(spec)
+        # Read from the oldest event of the collector on
+        self._collector.RewindCollector()
+
+        pc = vmodl.query.PropertyCollector
+        self._pc = self.content.propertyCollector.CreatePropertyCollector()
+        self._pc.CreateFilter(pc.FilterSpec(
+            objectSet=[pc.ObjectSpec(obj=self._collector)],
+            propSet=[pc.PropertySpec(type=vim.event.EventHistoryCollector,
+                                     pathSet=['latestPage'])]), True)
+        self._version = ''
+        self._read()
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='event-stream')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop reading events and release the collectors. Callers still
+        waiting get a RuntimeError.
+        """
+        self._stopped.set()
+        if self._pc is not None:
+            try:
+                self._pc.CancelWaitForUpdates()
+            except vmodl.MethodFault:
+                pass
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._pc is not None:
+            self._pc.Destroy()
+            self._pc = None
+        if self._collector is not None:
+            self._collector.DestroyCollector()
+            self._collector = None
+        with self._lock:
+            waiters, self._waiters = self._waiters, []
+        for _, _, future in waiters:
+            future.set_exception(RuntimeError('Event stream stopped'))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def watch(self, entity, event_types):
+        """
+        Return a Future resolved with the first event of one of the types,
+        given as vim.event classes, that refers to the entity.
+        """
+        future = futures.Future()
+        waiter = (_moid(entity), tuple(event_types), future)
+        with self._lock:
+            for event in self._backlog:
+                if self._matches(waiter, event):
+                    future.set_result(event)
+                    return future
+            self._waiters.append(waiter)
+        return future
+
+    def wait_for(self, entity, event_types, timeout=None):
+        """
+        Wait for an event of one of the types on the entity and return it.
+        Raises a concurrent.futures.TimeoutError if none arrived in time.
+        """
+        future = self.watch(entity, event_types)
+        try:
+            return future.result(timeout)
+        except futures.TimeoutError:
+            with self._lock:
+                self._waiters = [w for w in self._waiters
+                                 if w[2] is not future]
+            raise futures.TimeoutError('No {0} event for {1} in {2}s'.format(
+                '/'.join(t.__name__ for t in event_types), _moid(entity),
+                timeout))
+
+    def _matches(self, waiter, event):
+        moid, event_types, _ = waiter
+        return isinstance(event, event_types) and \
+            moid in event_entities(event)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                options = vmodl.query.PropertyCollector.WaitOptions(
+                    maxWaitSeconds=self.max_wait_seconds)
+                update = self._pc.WaitForUpdatesEx(self._version, options)
+                if update is not None:
+                    self._version = update.version
+                    self._read()
+            except vmodl.fault.RequestCanceled:
+                break
+            except Exception as e:
+                if self._stopped.is_set():
+                    break
+                print('Event stream read failed: {0}'.format(e))
+                self._stopped.wait(1)
+
+    def _read(self):
+        while True:
+            events = self._collector.ReadNextEvents(self.page_size)
+            if not events:
+                break
+            for event in events:
+                self._dispatch(event)
+
+    def _dispatch(self, event):
+        with self._lock:
+            self._backlog.append(event)
+            matched = [w for w in self._waiters if self._matches(w, event)]
+            if not matched:
+                return
+            self._waiters = [w for w in self._waiters if w not in matched]
+        for _, _, future in matched:
+            future.set_result(event)
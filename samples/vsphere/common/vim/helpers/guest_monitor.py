@@ -0,0 +1,251 @@
+"""
+* *******************************************************
+* Copyright (c) 2024 Broadcom. All Rights Reserved.
+* SPDX-License-Identifier: MIT
+* *******************************************************
+*
+* DISCLAIMER. THIS PROGRAM IS PROVIDED TO YOU "AS IS" WITHOUT
+* WARRANTIES OR CONDITIONS OF ANY KIND, WHETHER ORAL OR WRITTEN,
+* EXPRESS OR IMPLIED. THE AUTHOR SPECIFICALLY DISCLAIMS ANY IMPLIED
+* WARRANTIES OR CONDITIONS OF MERCHANTABILITY, SATISFACTORY QUALITY,
+* NON-INFRINGEMENT AND FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+__author__ = 'Broadcom, Inc.'
+__copyright__ = 'Copyright (c) 2024 Broadcom. All Rights Reserved.'
+
+import threading
+from concurrent import futures
+
+from pyVmomi import vim, vmodl
+
+# Guest properties collected for every watched vm
+PROPERTIES = ['runtime.powerState', 'guest.toolsRunningStatus',
+              'guest.guestState', 'guest.guestOperationsReady']
+
+
+def tools_running(props):
+    return props.get('guest.toolsRunningStatus') == \
+        vim.vm.GuestInfo.ToolsRunningStatus.guestToolsRunning
+
+
+def guest_operations_ready(props):
+    return bool(props.get('guest.guestOperationsReady'))
+
+
+def guest_state(state):
+    """
+    Return a condition true once the guest state, like 'running' or
+    'notRunning', is reached.
+    """
+    return lambda props: props.get('guest.guestState') == state
+
+
+class GuestStateMonitor(object):
+    """
+    Waits for the guest state of any number of vms from a single thread.
+
+    Watched vms are added to a ListView followed by one filter on a private
+    property collector, so a background thread learns about every change of
+    their tools and guest state through WaitForUpdatesEx instead of polling
+    each vm. A vm leaves the view once nobody waits for it anymore. Every
+    watch returns a Future resolved with the properties of the vm as soon as
+    the condition holds for them.
+    """
+
+    def __init__(self, content, properties=None, max_wait_seconds=30):
+        self.content = content
+        self.properties = properties or PROPERTIES
+        self.max_wait_seconds = max_wait_seconds
+        self._props = {}
+        self._waiters = []
+        self._in_view = {}
+        self._lock = threading.Lock()
+        self._view_lock = threading.Lock()
+        self._collector = None
+        self._view = None
+        self._version = ''
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Create the view and the collector and start following updates.
+        """
+        pc = vmodl.query.PropertyCollector
+        self._collector = self.content.propertyCollector.CreatePropertyCollector()
+        self._view = self.content.viewManager.CreateListView()
+        traversal_spec = pc.TraversalSpec(name='traverseVms', path='view',
+                                          skip=False, type=vim.view.ListView)
+        self._collector.CreateFilter(pc.FilterSpec(
+            objectSet=[pc.ObjectSpec(obj=self._view, skip=True,
+                                     selectSet=[traversal_spec])],
+            propSet=[pc.PropertySpec(type=vim.VirtualMachine,
+                                     pathSet=self.properties)]), True)
+        self._version = ''
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='guest-state-monitor')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop following updates and release the server side objects. Callers
+        still waiting get a RuntimeError.
+        """
+        self._stopped.set()
+        if self._collector is not None:
+            try:
+                self._collector.CancelWaitForUpdates()
+            except vmodl.MethodFault:
+                pass
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._collector is not None:
+            self._collector.Destroy()
+            self._collector = None
+        if self._view is not None:
+            self._view.Destroy()
+            self._view = None
+        with self._lock:
+            waiters, self._waiters = self._waiters, []
+            self._props = {}
+            self._in_view = {}
+        for _, _, future in waiters:
+            future.set_exception(RuntimeError('Guest state monitor stopped'))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def watch(self, vm, condition=tools_running):
+        """
+        Return a Future resolved with the properties of the vm, a
+        vim.VirtualMachine, once condition(properties) is true.
+        """
+        future = futures.Future()
+        waiter = (vm, condition, future)
+        with self._lock:
+            props = self._props.get(vm._GetMoId())
+            if props is not None and condition(props):
+                future.set_result(dict(props))
+                return future
+            self._waiters.append(waiter)
+        self._sync_view()
+        return future
+
+    def wait_for(self, vm, condition=tools_running, timeout=None):
+        """
+        Wait until the condition holds for the vm and return its properties.
+        Raises a concurrent.futures.TimeoutError if it did not in time.
+        """
+        return self.wait_for_all([vm], condition, timeout)[vm._GetMoId()]
+
+    def wait_for_all(self, vms, condition=tools_running, timeout=None):
+        """
+        Wait until the condition holds for all vms and return their
+        properties by moId. Raises a concurrent.futures.TimeoutError naming
+        the vms that are not ready in time.
+        """
+        watched = dict((self.watch(vm, condition), vm) for vm in vms)
+        done, not_done = futures.wait(watched, timeout)
+        if not_done:
+            self._discard(not_done)
+            raise futures.TimeoutError(
+                '{0} of {1} vms not ready after {2}s: {3}'.format(
+                    len(not_done), len(watched), timeout,
+                    ', '.join(sorted(watched[f]._GetMoId()
+                                     for f in not_done))))
+        return dict((watched[f]._GetMoId(), f.result()) for f in done)
+
+    def get(self, vm):
+        """
+        Return a copy of the last properties seen for a watched vm, or None.
+        """
+        with self._lock:
+            props = self._props.get(vm._GetMoId())
+            return dict(props) if props is not None else None
+
+    def _discard(self, discarded):
+        with self._lock:
+            self._waiters = [w for w in self._waiters
+                             if w[2] not in discarded]
+        self._sync_view()
+
+    def _sync_view(self):
+        # Serialized so the view always ends up with exactly the vms that
+        # have waiters, whichever thread changed them last
+        with self._view_lock:
+            with self._lock:
+                wanted = dict((vm._GetMoId(), vm) for vm, _, _ in self._waiters)
+                added = [vm for moid, vm in wanted.items()
+                         if moid not in self._in_view]
+                removed = [vm for moid, vm in self._in_view.items()
+                           if moid not in wanted]
+                self._in_view = wanted
+                for vm in removed:
+                    self._props.pop(vm._GetMoId(), None)
+            if removed and self._view is not None:
+                self._view.ModifyListView(remove=removed)
+            if added and self._view is not None:
+                missing = self._view.ModifyListView(add=added)
+                if missing:
+                    self._fail_missing(missing)
+
+    def _fail_missing(self, missing):
+        moids = set(vm._GetMoId() for vm in missing)
+        with self._lock:
+            failed = [w for w in self._waiters if w[0]._GetMoId() in moids]
+            self._waiters = [w for w in self._waiters if w not in failed]
+            for moid in moids:
+                self._in_view.pop(moid, None)
+        for vm, _, future in failed:
+            future.set_exception(vmodl.fault.ManagedObjectNotFound(obj=vm))
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                options = vmodl.query.PropertyCollector.WaitOptions(
+                    maxWaitSeconds=self.max_wait_seconds)
+                update = self._collector.WaitForUpdatesEx(self._version,
+                                                          options)
+                if update is None:
+                    continue
+                self._version = update.version
+                resolved = []
+                with self._lock:
+                    for filter_set in update.filterSet:
+                        for obj_update in filter_set.objectSet:
+                            resolved += self._apply(obj_update)
+                for future, props in resolved:
+                    future.set_result(props)
+                if resolved:
+                    self._sync_view()
+            except vmodl.fault.RequestCanceled:
+                break
+            except Exception as e:
+                if self._stopped.is_set():
+                    break
+                print('Guest state monitor update failed: {0}'.format(e))
+                self._stopped.wait(1)
+
+    def _apply(self, obj_update):
+        moid = obj_update.obj._GetMoId()
+        if obj_update.kind == 'leave' or moid not in self._in_view:
+            self._props.pop(moid, None)
+            return []
+        props = self._props.setdefault(moid, {})
+        for change in obj_update.changeSet:
+            props[change.name] = change.val
+        matched = [w for w in self._waiters
+                   if w[0]._GetMoId() == moid and w[1](props)]
+        if not matched:
+            return []
+        self._waiters = [w for w in self._waiters if w not in matched]
+        return [(future, dict(props)) for _, _, future in matched]
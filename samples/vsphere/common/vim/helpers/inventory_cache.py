@@ -0,0 +1,233 @@
+"""
+* *******************************************************
+* Copyright (c) 2024 Broadcom. All Rights Reserved.
+* SPDX-License-Identifier: MIT
+* *******************************************************
+*
+* DISCLAIMER. THIS PROGRAM IS PROVIDED TO YOU "AS IS" WITHOUT
+* WARRANTIES OR CONDITIONS OF ANY KIND, WHETHER ORAL OR WRITTEN,
+* EXPRESS OR IMPLIED. THE AUTHOR SPECIFICALLY DISCLAIMS ANY IMPLIED
+* WARRANTIES OR CONDITIONS OF MERCHANTABILITY, SATISFACTORY QUALITY,
+* NON-INFRINGEMENT AND FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+__author__ = 'Broadcom, Inc.'
+__copyright__ = 'Copyright (c) 2024 Broadcom. All Rights Reserved.'
+
+import threading
+
+from pyVmomi import vim, vmodl
+
+# Properties collected per managed object type. The parent chain of every
+# cached object must stay inside the cache so datacenter lookups can be
+# answered from memory.
+DEFAULT_PROPERTIES = {
+    vim.Datacenter: ['name', 'parent'],
+    vim.Folder: ['name', 'parent', 'childType'],
+    vim.ComputeResource: ['name', 'parent'],
+    vim.ResourcePool: ['name', 'parent'],
+    vim.Datastore: ['name', 'parent'],
+    vim.VirtualMachine: ['name', 'parent'],
+}
+
+
+class InventoryCache(object):
+    """
+    In-memory inventory index kept current by a background thread.
+
+    The cache starts from a full property collector snapshot and then applies
+    the deltas returned by WaitForUpdatesEx. Every applied update set bumps
+    version, so a caller that just created or renamed an object can wait for
+    the cache to catch up with wait_for_version before reading from it.
+    """
+
+    def __init__(self, content, properties=None, max_wait_seconds=30):
+        self.content = content
+        self.properties = properties or DEFAULT_PROPERTIES
+        self.max_wait_seconds = max_wait_seconds
+        self.version = 0
+        self._objects = {}
+        self._by_name = {}
+        self._cond = threading.Condition()
+        self._collector = None
+        self._view = None
+        self._pc_version = ''
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Load the initial snapshot and start following updates.
+        """
+        pc = vmodl.query.PropertyCollector
+        # A private collector keeps our filter away from the session's default
+        # collector, which wait_for_tasks and others poll with their own
+        # versions
+        self._collector = self.content.propertyCollector.CreatePropertyCollector()
+        self._view = self.content.viewManager.CreateContainerView(
+            self.content.rootFolder, list(self.properties), True)
+        traversal_spec = pc.TraversalSpec(name='traverseView', path='view',
+                                          skip=False,
+                                          type=vim.view.ContainerView)
+        filter_spec = pc.FilterSpec(
+            objectSet=[pc.ObjectSpec(obj=self._view, skip=True,
+                                     selectSet=[traversal_spec])],
+            propSet=[pc.PropertySpec(type=t, pathSet=paths)
+                     for t, paths in self.properties.items()])
+        self._collector.CreateFilter(filter_spec, True)
+
+        # The first wait returns the full content, possibly in several
+        # truncated batches
+        while True:
+            update = self._wait(0)
+            if update is None or not update.truncated:
+                break
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='inventory-cache')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop following updates and release the server side objects.
+        """
+        self._stopped.set()
+        if self._collector is not None:
+            try:
+                self._collector.CancelWaitForUpdates()
+            except vmodl.MethodFault:
+                pass
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._collector is not None:
+            self._collector.Destroy()
+            self._collector = None
+        if self._view is not None:
+            self._view.Destroy()
+            self._view = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def wait_for_version(self, version, timeout=None):
+        """
+        Block until the cache has applied at least the given version.
+        Returns False if the timeout expired first.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self.version >= version,
+                                       timeout)
+
+    def get(self, moid):
+        """
+        Return a copy of the cached properties of an object, or None.
+        """
+        with self._cond:
+            entry = self._objects.get(moid)
+            return dict(entry) if entry is not None else None
+
+    def find_all(self, vimtype, name=None, datacenter_name=None,
+                 predicate=None):
+        """
+        Return the moIds of the cached objects of the given type, optionally
+        restricted by name, by the name of their datacenter and by a
+        predicate on the cached properties.
+        """
+        with self._cond:
+            if name is None:
+                moids = list(self._objects)
+            else:
+                moids = list(self._by_name.get(name, ()))
+            result = []
+            for moid in moids:
+                entry = self._objects[moid]
+                if not issubclass(entry['type'], vimtype):
+                    continue
+                if datacenter_name is not None and \
+                        self._datacenter_name(entry) != datacenter_name:
+                    continue
+                if predicate is not None and not predicate(entry):
+                    continue
+                result.append(moid)
+            return result
+
+    def find(self, vimtype, name=None, datacenter_name=None, predicate=None):
+        """
+        Return the moId of the first matching cached object, or None.
+        """
+        moids = self.find_all(vimtype, name, datacenter_name, predicate)
+        return moids[0] if moids else None
+
+    def _datacenter_name(self, entry):
+        while entry is not None:
+            if issubclass(entry['type'], vim.Datacenter):
+                return entry.get('name')
+            entry = self._objects.get(entry.get('parent'))
+        return None
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self._wait(self.max_wait_seconds)
+            except vmodl.fault.RequestCanceled:
+                break
+            except Exception as e:
+                if self._stopped.is_set():
+                    break
+                print('Inventory cache update failed: {0}'.format(e))
+                self._stopped.wait(1)
+
+    def _wait(self, max_wait_seconds):
+        options = vmodl.query.PropertyCollector.WaitOptions(
+            maxWaitSeconds=max_wait_seconds)
+        update = self._collector.WaitForUpdatesEx(self._pc_version, options)
+        if update is None:
+            return None
+        with self._cond:
+            for filter_set in update.filterSet:
+                for obj_update in filter_set.objectSet:
+                    self._apply(obj_update)
+            self._pc_version = update.version
+            self.version += 1
+            self._cond.notify_all()
+        return update
+
+    def _apply(self, obj_update):
+        moid = obj_update.obj._GetMoId()
+        if obj_update.kind == 'leave':
+            entry = self._objects.pop(moid, None)
+            if entry is not None:
+                self._unindex(moid, entry.get('name'))
+            return
+
+        entry = self._objects.get(moid)
+        if entry is None:
+            entry = {'obj': obj_update.obj, 'type': type(obj_update.obj),
+                     'moId': moid}
+            self._objects[moid] = entry
+        old_name = entry.get('name')
+        for change in obj_update.changeSet:
+            if change.op in ('remove', 'indirectRemove'):
+                entry.pop(change.name, None)
+            elif change.name == 'parent':
+                entry['parent'] = change.val._GetMoId() \
+                    if change.val is not None else None
+            else:
+                entry[change.name] = change.val
+        if entry.get('name') != old_name:
+            self._unindex(moid, old_name)
+            self._by_name.setdefault(entry.get('name'), {})[moid] = None
+
+    def _unindex(self, moid, name):
+        moids = self._by_name.get(name)
+        if moids is not None:
+            moids.pop(moid, None)
+            if not moids:
+                del self._by_name[name]
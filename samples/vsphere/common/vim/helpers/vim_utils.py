@@ -14,39 +14,125 @@
 __author__ = 'VMware, Inc.'
 __copyright__ = 'Copyright 2013 VMware, Inc. All rights reserved.'
 
+import collections
+import time
+from concurrent.futures import Future
+
 from pyVmomi import vim, vmodl
 
-_views = []  # list of container views
+
+class InventoryEntry(object):
+    """
+    Name, moId, parent moId and type of one managed object in a snapshot
+    """
+    __slots__ = ('obj', 'name', 'moId', 'parent', 'type')
+
+    def __init__(self, obj, name, parent):
+        self.obj = obj
+        self.name = name
+        self.moId = obj._GetMoId()
+        self.parent = parent._GetMoId() if parent is not None else None
+        self.type = type(obj)
 
 
-def get_obj(content, vimtype, name):
+class InventorySnapshot(object):
+    """
+    In-memory index of the managed objects of the given types, collected with
+    a single (paged) RetrievePropertiesEx call and looked up by name or moId
+    without further round-trips.
+    """
+
+    def __init__(self, content, vimtypes, page_size=1000):
+        self.content = content
+        self.vimtypes = list(vimtypes)
+        self.page_size = page_size
+        self.by_name = {}
+        self.by_moId = {}
+        self.refresh()
+
+    def refresh(self):
+        """
+        Re-collect the snapshot from vCenter.
+        """
+        by_name, by_moId = {}, {}
+        for entry in self._collect():
+            by_name.setdefault(entry.name, []).append(entry)
+            by_moId[entry.moId] = entry
+        self.by_name, self.by_moId = by_name, by_moId
+
+    def get(self, vimtype, name):
+        """
+        Return the first managed object of one of the given types with the
+        given name, or None.
+        """
+        types = tuple(vimtype)
+        for entry in self.by_name.get(name, ()):
+            if issubclass(entry.type, types):
+                return entry.obj
+        return None
+
+    def get_by_moId(self, vimtype, moid):
+        """
+        Return the managed object of one of the given types with the given
+        moId, or None.
+        """
+        entry = self.by_moId.get(moid)
+        if entry is not None and issubclass(entry.type, tuple(vimtype)):
+            return entry.obj
+        return None
+
+    def _collect(self):
+        pc = vmodl.query.PropertyCollector
+        container = self.content.viewManager.CreateContainerView(
+            self.content.rootFolder, self.vimtypes, True)
+        try:
+            traversal_spec = pc.TraversalSpec(name='traverseView',
+                                              path='view',
+                                              skip=False,
+                                              type=vim.view.ContainerView)
+            filter_spec = pc.FilterSpec(
+                objectSet=[pc.ObjectSpec(obj=container, skip=True,
+                                         selectSet=[traversal_spec])],
+                propSet=[pc.PropertySpec(type=t, pathSet=['name', 'parent'])
+                         for t in self.vimtypes])
+            options = pc.RetrieveOptions(maxObjects=self.page_size)
+            collector = self.content.propertyCollector
+            result = collector.RetrievePropertiesEx([filter_spec], options)
+            while result is not None:
+                for obj_content in result.objects:
+                    props = dict((p.name, p.val) for p in obj_content.propSet)
+                    yield InventoryEntry(obj_content.obj,
+                                         props.get('name'),
+                                         props.get('parent'))
+                if not result.token:
+                    break
+                result = collector.ContinueRetrievePropertiesEx(result.token)
+        finally:
+            container.Destroy()
+
+
+def get_obj(content, vimtype, name, snapshot=None):
     """
      Get the vsphere managed object associated with a given text name
+
+     Looks the name up in the given InventorySnapshot, or in a one-off
+     snapshot of vimtype when none is given.
     """
-    obj = None
-    container = content.viewManager.CreateContainerView(
-        content.rootFolder, vimtype, True)
-    _views.append(container)
-    for c in container.view:
-        if c.name == name:
-            obj = c
-            break
-    return obj
+    if snapshot is None:
+        snapshot = InventorySnapshot(content, vimtype)
+    return snapshot.get(vimtype, name)
 
 
-def get_obj_by_moId(content, vimtype, moid):
+def get_obj_by_moId(content, vimtype, moid, snapshot=None):
     """
     Get the vsphere managed object by moid value
+
+    Looks the moid up in the given InventorySnapshot, or in a one-off
+    snapshot of vimtype when none is given.
     """
-    obj = None
-    container = content.viewManager.CreateContainerView(
-        content.rootFolder, vimtype, True)
-    _views.append(container)
-    for c in container.view:
-        if c._GetMoId() == moid:
-            obj = c
-            break
-    return obj
+    if snapshot is None:
+        snapshot = InventorySnapshot(content, vimtype)
+    return snapshot.get_by_moId(vimtype, moid)
 
 
 def delete_object(content, mo):
@@ -100,53 +186,175 @@ def poweroff_vm(content, mo):
     return True
 
 
-def wait_for_tasks(content, tasks):
+class TaskErrors(Exception):
     """
-    Given the tasks, it returns after all the tasks are complete
+    Raised with every failure of a batch of tasks once all of them finished
     """
-    taskList = [str(task) for task in tasks]
 
-    # Create filter
-    objSpecs = [
-        vmodl.query.PropertyCollector.ObjectSpec(obj=task) for task in tasks
-    ]
-    propSpec = vmodl.query.PropertyCollector.PropertySpec(
-        type=vim.Task, pathSet=[], all=True)
-    filterSpec = vmodl.query.PropertyCollector.FilterSpec()
-    filterSpec.objectSet = objSpecs
-    filterSpec.propSet = [propSpec]
-    task_filter = content.propertyCollector.CreateFilter(filterSpec, True)
+    def __init__(self, errors):
+        Exception.__init__(self, '{0} task(s) failed'.format(len(errors)))
+        self.errors = errors
 
-    try:
-        version, state = None, None
-
-        # Loop looking for updates till the state moves to a completed state.
-        while len(taskList):
-            update = content.propertyCollector.WaitForUpdates(version)
-            for filterSet in update.filterSet:
-                for objSet in filterSet.objectSet:
-                    task = objSet.obj
-                    for change in objSet.changeSet:
-                        if change.name == 'info':
-                            state = change.val.state
-                        elif change.name == 'info.state':
-                            state = change.val
-                        else:
-                            continue
-
-                        if not str(task) in taskList:
-                            continue
-
-                        if state == vim.TaskInfo.State.success:
-                            # Remove task from taskList
-                            taskList.remove(str(task))
-                        elif state == vim.TaskInfo.State.error:
-                            raise task.info.error
-            # Move to next version
-            version = update.version
-    finally:
-        if task_filter:
-            task_filter.Destroy()
+
+class TaskScheduler(object):
+    """
+    Waits for any number of vim tasks from a single thread.
+
+    All tracked tasks share one filter on a private property collector,
+    through a ListView that tasks are added to when they start and removed
+    from when they finish. Submitted callables that start a task are only
+    invoked while fewer than max_in_flight tasks are running. Every submission
+    returns a Future that resolves to the task result or its fault, and run
+    collects all failures instead of stopping at the first one.
+    """
+
+    def __init__(self, content, max_in_flight=16, max_wait_seconds=5):
+        self.content = content
+        self.max_in_flight = max_in_flight
+        self.max_wait_seconds = max_wait_seconds
+        self.errors = []
+        self._pending = collections.deque()
+        self._running = {}
+        self._collector = None
+        self._view = None
+        self._version = ''
+
+    def submit(self, task, callback=None):
+        """
+        Track a started vim.Task, or queue a callable that starts one. The
+        optional callback is called with the Future once it is resolved.
+        """
+        future = Future()
+        if callback is not None:
+            future.add_done_callback(callback)
+        self._pending.append((task, future))
+        return future
+
+    def run(self, timeout=None):
+        """
+        Start the queued tasks and wait until all of them are complete.
+        Returns the list of errors; tasks still running when the timeout
+        expires are failed with a TimeoutError.
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        self._open()
+        try:
+            while self._pending or self._running:
+                self._start_pending()
+                if not self._running:
+                    continue
+                max_wait = self.max_wait_seconds
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        self._expire()
+                        break
+                    max_wait = max(1, min(max_wait, int(remaining)))
+                options = vmodl.query.PropertyCollector.WaitOptions(
+                    maxWaitSeconds=max_wait)
+                update = self._collector.WaitForUpdatesEx(self._version,
+                                                          options)
+                if update is None:
+                    continue
+                self._version = update.version
+                finished = []
+                for filter_set in update.filterSet:
+                    for obj_update in filter_set.objectSet:
+                        task = self._apply(obj_update)
+                        if task is not None:
+                            finished.append(task)
+                if finished:
+                    self._view.ModifyListView(remove=finished)
+        finally:
+            self._close()
+        return self.errors
+
+    def _open(self):
+        pc = vmodl.query.PropertyCollector
+        self._collector = self.content.propertyCollector.CreatePropertyCollector()
+        self._view = self.content.viewManager.CreateListView()
+        traversal_spec = pc.TraversalSpec(name='traverseTasks', path='view',
+                                          skip=False, type=vim.view.ListView)
+        filter_spec = pc.FilterSpec(
+            objectSet=[pc.ObjectSpec(obj=self._view, skip=True,
+                                     selectSet=[traversal_spec])],
+            propSet=[pc.PropertySpec(type=vim.Task,
+                                     pathSet=['info.state', 'info.result',
+                                              'info.error'])])
+        self._collector.CreateFilter(filter_spec, True)
+        self._version = ''
+
+    def _close(self):
+        if self._collector is not None:
+            self._collector.Destroy()
+            self._collector = None
+        if self._view is not None:
+            self._view.Destroy()
+            self._view = None
+
+    def _start_pending(self):
+        started = []
+        while self._pending:
+            task, future = self._pending[0]
+            if not isinstance(task, vim.Task):
+                if len(self._running) >= self.max_in_flight:
+                    break
+                try:
+                    task = task()
+                except Exception as e:
+                    self._pending.popleft()
+                    self._fail(future, e)
+                    continue
+            self._pending.popleft()
+            future.set_running_or_notify_cancel()
+            self._running[task._GetMoId()] = (task, future, {})
+            started.append(task)
+        if started:
+            self._view.ModifyListView(add=started)
+
+    def _apply(self, obj_update):
+        entry = self._running.get(obj_update.obj._GetMoId())
+        if entry is None:
+            return None
+        task, future, props = entry
+        for change in obj_update.changeSet:
+            props[change.name] = change.val
+        state = props.get('info.state')
+        if state == vim.TaskInfo.State.success:
+            future.set_result(props.get('info.result'))
+        elif state == vim.TaskInfo.State.error:
+            self._fail(future, props.get('info.error'))
+        else:
+            return None
+        del self._running[task._GetMoId()]
+        return task
+
+    def _expire(self):
+        for task, future, _ in self._running.values():
+            self._fail(future, TimeoutError(
+                'Task {0} did not complete in time'.format(task._GetMoId())))
+        self._running.clear()
+        while self._pending:
+            _, future = self._pending.popleft()
+            future.cancel()
+
+    def _fail(self, future, error):
+        self.errors.append(error)
+        future.set_exception(error)
+
+
+def wait_for_tasks(content, tasks, timeout=None):
+    """
+    Given the tasks, it returns after all the tasks are complete.
+    Failed tasks do not stop the wait for the others; the first failure is
+    raised once every task has finished.
+    """
+    scheduler = TaskScheduler(content)
+    for task in tasks:
+        scheduler.submit(task)
+    errors = scheduler.run(timeout)
+    if errors:
+        raise errors[0]
 
 
 def get_cluster_name_by_id(content, name):
@@ -156,16 +364,3 @@ def get_cluster_name_by_id(content, name):
         print('Cluster MoId: {0}'.format(self.mo_id))
     else:
         print('Cluster: {0} not found'.format(self.cluster_name))
-
-
-def __destroy_container_views():
-    for view in _views:
-        try:
-            view.Destroy()
-        except vmodl.fault.ManagedObjectNotFound:
-            pass  # silently bypass the exception if the objects are already deleted/not found on the server
-
-
-import atexit
-
-atexit.register(__destroy_container_views)
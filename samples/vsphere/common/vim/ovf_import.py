@@ -0,0 +1,398 @@
+"""
+* *******************************************************
+* Copyright (c) 2024 Broadcom. All Rights Reserved.
+* SPDX-License-Identifier: MIT
+* *******************************************************
+*
+* DISCLAIMER. THIS PROGRAM IS PROVIDED TO YOU "AS IS" WITHOUT
+* WARRANTIES OR CONDITIONS OF ANY KIND, WHETHER ORAL OR WRITTEN,
+* EXPRESS OR IMPLIED. THE AUTHOR SPECIFICALLY DISCLAIMS ANY IMPLIED
+* WARRANTIES OR CONDITIONS OF MERCHANTABILITY, SATISFACTORY QUALITY,
+* NON-INFRINGEMENT AND FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+__author__ = 'Broadcom, Inc.'
+__copyright__ = 'Copyright (c) 2024 Broadcom. All Rights Reserved.'
+
+import os
+import posixpath
+import tarfile
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from pyVmomi import vim, vmodl
+
+from samples.vsphere.common.vim.datastore_transfer import (TransferError,
+                                                           TransferStats,
+                                                           run_all)
+
+CHUNK_SIZE = 4 * 1024 * 1024
+HEARTBEAT_SECONDS = 15
+TAR_BLOCK = 512
+
+
+def _is_url(location):
+    return location.startswith('http://') or location.startswith('https://')
+
+
+def wait_for_lease(content, lease, timeout=300):
+    """
+    Wait until the lease leaves the initializing state and return its state.
+    Waits on a private property collector instead of polling the lease.
+    """
+    pc = vmodl.query.PropertyCollector
+    collector = content.propertyCollector.CreatePropertyCollector()
+    try:
+        collector.CreateFilter(pc.FilterSpec(
+            objectSet=[pc.ObjectSpec(obj=lease)],
+            propSet=[pc.PropertySpec(type=vim.HttpNfcLease,
+                                     pathSet=['state'])]), True)
+        deadline = time.time() + timeout
+        version = ''
+        state = vim.HttpNfcLease.State.initializing
+        while state == vim.HttpNfcLease.State.initializing:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise TimeoutError('Lease {0} not ready after {1}s'.format(
+                    lease._GetMoId(), timeout))
+            update = collector.WaitForUpdatesEx(
+                version, pc.WaitOptions(maxWaitSeconds=max(1, int(remaining))))
+            if update is None:
+                continue
+            version = update.version
+            for filter_set in update.filterSet:
+                for obj_update in filter_set.objectSet:
+                    for change in obj_update.changeSet:
+                        if change.name == 'state':
+                            state = change.val
+        return state
+    finally:
+        collector.Destroy()
+
+
+def _pax_records(data):
+    """
+    Return the keywords and values of a pax extended header, made of
+    newline terminated '<length> <keyword>=<value>' records.
+    """
+    records = {}
+    pos = 0
+    while pos < len(data) and data[pos:pos + 1] != b'\0':
+        length = data[pos:].split(b' ', 1)[0]
+        record = data[pos:pos + int(length)]
+        keyword, _, value = record[len(length) + 1:-1].partition(b'=')
+        records[keyword.decode('utf-8')] = value.decode('utf-8',
+                                                        'surrogateescape')
+        pos += int(length)
+    return records
+
+
+class OvfPackage(object):
+    """
+    The descriptor and files of an OVF or OVA, local or behind a URL.
+
+    Files of an OVF are read next to its descriptor. The members of an OVA
+    are located from the tar headers, which are read with ranged requests
+    when the OVA is remote, so every disk can then be read on its own from
+    any offset without downloading the archive.
+    """
+
+    def __init__(self, location, session, verify=False):
+        self.location = location
+        self._session = session
+        self._verify = verify
+        self._entries = {}
+        self._lock = threading.Lock()
+        if location.lower().endswith('.ova'):
+            self._load_ova()
+            names = [n for n in self._entries if n.lower().endswith('.ovf')]
+            if not names:
+                raise Exception('No OVF descriptor found in {0}'.format(
+                    location))
+            name = names[0]
+            self.descriptor = b''.join(self.read(name)).decode()
+        else:
+            self.descriptor = b''.join(
+                self._read_range(location, 0, None)).decode()
+
+    def _load_ova(self):
+        offset = 0
+        # Name and size from a pax or GNU long name header, for the next
+        # member
+        pending = {}
+        while True:
+            header = b''.join(self._read_range(self.location, offset,
+                                               TAR_BLOCK))
+            if len(header) < TAR_BLOCK or header == b'\0' * TAR_BLOCK:
+                break
+            info = tarfile.TarInfo.frombuf(header, 'utf-8', 'surrogateescape')
+            offset += TAR_BLOCK
+            if info.type in (tarfile.XHDTYPE, tarfile.GNUTYPE_LONGNAME):
+                data = b''.join(self._read_range(self.location, offset,
+                                                 info.size))
+                if info.type == tarfile.XHDTYPE:
+                    pending.update(_pax_records(data))
+                else:
+                    pending['path'] = data.rstrip(b'\0').decode(
+                        'utf-8', 'surrogateescape')
+            elif info.type == tarfile.GNUTYPE_SPARSE or \
+                    any(k.startswith('GNU.sparse.') for k in pending):
+                raise Exception('Sparse member {0} of {1} is not supported'.
+                                format(pending.get('path', info.name),
+                                       self.location))
+            elif info.type in (tarfile.XGLTYPE, tarfile.GNUTYPE_LONGLINK):
+                pass
+            else:
+                name = pending.get('path', info.name)
+                size = int(pending.get('size', info.size))
+                pending = {}
+                if info.isfile():
+                    self._entries[name] = (self.location, offset, size)
+                offset += -(-size // TAR_BLOCK) * TAR_BLOCK
+                continue
+            offset += -(-info.size // TAR_BLOCK) * TAR_BLOCK
+
+    def _entry(self, name):
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                return entry
+        if _is_url(self.location):
+            location = posixpath.join(posixpath.dirname(self.location), name)
+            r = self._session.head(location, verify=self._verify,
+                                   allow_redirects=True)
+            r.raise_for_status()
+            size = int(r.headers['Content-Length'])
+        else:
+            location = os.path.join(os.path.dirname(self.location), name)
+            size = os.path.getsize(location)
+        with self._lock:
+            return self._entries.setdefault(name, (location, 0, size))
+
+    def size(self, name):
+        return self._entry(name)[2]
+
+    def read(self, name, offset=0, chunk_size=CHUNK_SIZE):
+        """
+        Return an iterator over the content of a file from offset on.
+        """
+        location, start, size = self._entry(name)
+        return self._read_range(location, start + offset, size - offset,
+                                chunk_size)
+
+    def _read_range(self, location, start, length, chunk_size=CHUNK_SIZE):
+        if not _is_url(location):
+            with open(location, 'rb') as f:
+                f.seek(start)
+                while length is None or length > 0:
+                    chunk = f.read(chunk_size if length is None
+                                   else min(chunk_size, length))
+                    if not chunk:
+                        break
+                    if length is not None:
+                        length -= len(chunk)
+                    yield chunk
+            return
+
+        headers = {}
+        if length is not None:
+            headers['Range'] = 'bytes={0}-{1}'.format(start, start + length - 1)
+        elif start:
+            headers['Range'] = 'bytes={0}-'.format(start)
+        with self._session.get(location, headers=headers, stream=True,
+                               verify=self._verify) as r:
+            r.raise_for_status()
+            # A server without range support sends the whole file
+            skip = start if headers and r.status_code == 200 else 0
+            for chunk in r.iter_content(chunk_size):
+                if skip:
+                    dropped = min(skip, len(chunk))
+                    chunk = chunk[dropped:]
+                    skip -= dropped
+                if length is not None:
+                    chunk = chunk[:length]
+                    length -= len(chunk)
+                if chunk:
+                    yield chunk
+                if length == 0:
+                    break
+
+
+class _SourceBody(object):
+    """
+    Request body streaming one package file. A failed source read is resumed
+    from the bytes already sent, so a flaky source does not fail the upload.
+    """
+
+    def __init__(self, package, name, size, stats, chunk_size, retries):
+        self._package = package
+        self._name = name
+        self._size = size
+        self._stats = stats
+        self._chunk_size = chunk_size
+        self._retries = retries
+        self.sent = 0
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        failures = 0
+        while self.sent < self._size:
+            try:
+                for chunk in self._package.read(self._name, self.sent,
+                                                self._chunk_size):
+                    self.sent += len(chunk)
+                    for stats in self._stats:
+                        stats.add(len(chunk))
+                    yield chunk
+                if self.sent < self._size:
+                    raise IOError('Short read of {0}: {1} of {2} bytes'.format(
+                        self._name, self.sent, self._size))
+            except (requests.RequestException, IOError):
+                failures += 1
+                if failures > self._retries:
+                    raise
+                for stats in self._stats:
+                    stats.retries += 1
+                time.sleep(min(2 ** failures, 30))
+
+
+class OvfImporter(object):
+    """
+    Imports OVF and OVA packages through an HttpNfcLease.
+
+    The disks are streamed from the package to the device URLs of the lease
+    in large chunks, several disks at a time, over one keep-alive requests
+    session that pools the connections per host. A heartbeat thread reports
+    the progress to the lease so long imports do not hit the lease timeout.
+    A disk whose upload fails is uploaded again on its own without
+    restarting the import.
+    """
+
+    def __init__(self, content, workers=4, chunk_size=CHUNK_SIZE, retries=3,
+                 heartbeat_seconds=HEARTBEAT_SECONDS, verify=False,
+                 progress=None):
+        self.content = content
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.heartbeat_seconds = heartbeat_seconds
+        self.verify = verify
+        self.progress = progress
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=workers * 2)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+        if not verify:
+            requests.packages.urllib3.disable_warnings()
+
+    def close(self):
+        self._session.close()
+
+    def import_package(self, location, resource_pool, folder, name=None,
+                       host=None, datastore=None, spec_params=None,
+                       nfc_host=None):
+        """
+        Import the OVF or OVA at location, a local path or URL. Returns the
+        imported entity and the aggregate TransferStats of its disks. The
+        '*' host of the device URLs is replaced with nfc_host, by default the
+        host of the vim connection.
+        """
+        package = OvfPackage(location, self._session, self.verify)
+        if spec_params is None:
+            spec_params = vim.OvfManager.CreateImportSpecParams(
+                entityName=name, diskProvisioning='thin')
+        import_spec = self.content.ovfManager.CreateImportSpec(
+            ovfDescriptor=package.descriptor, resourcePool=resource_pool,
+            datastore=datastore, cisp=spec_params)
+        if import_spec.error:
+            raise import_spec.error[0]
+
+        lease = resource_pool.ImportVApp(import_spec.importSpec, folder, host)
+        state = wait_for_lease(self.content, lease)
+        if state != vim.HttpNfcLease.State.ready:
+            raise lease.error
+        try:
+            stats = self._upload_disks(lease, import_spec.fileItem or [],
+                                       package,
+                                       nfc_host or resource_pool._stub.host)
+        except Exception as e:
+            lease.Abort(vmodl.fault.SystemError(reason=str(e)))
+            raise
+        lease.Progress(100)
+        lease.Complete()
+        return lease.info.entity, stats
+
+    def _upload_disks(self, lease, file_items, package, nfc_host):
+        # The host may carry the port of the vim connection
+        nfc_host = nfc_host.split(':')[0] if nfc_host.count(':') == 1 \
+            else nfc_host
+        urls = dict((d.importKey, d.url.replace('*', nfc_host))
+                    for d in lease.info.deviceUrl)
+        sizes = dict((item.path, package.size(item.path))
+                     for item in file_items)
+        stats = TransferStats(package.location, 'import',
+                              sum(sizes.values()))
+
+        stopped = threading.Event()
+
+        def heartbeat():
+            while not stopped.wait(self.heartbeat_seconds):
+                try:
+                    if stats.size:
+                        lease.Progress(min(99, int(stats.bytes * 100 /
+                                                   stats.size)))
+                except Exception as e:
+                    print('Lease progress update failed: {0}'.format(e))
+                if self.progress:
+                    self.progress(stats)
+
+        thread = threading.Thread(target=heartbeat, name='nfc-heartbeat')
+        thread.daemon = True
+        thread.start()
+        try:
+            run_all(lambda item: self._upload_disk(
+                        item, urls[item.deviceId], package, sizes[item.path],
+                        stats),
+                    file_items, self.workers, 'disk uploads')
+        finally:
+            stopped.set()
+            thread.join()
+
+        stats.finish()
+        print('Imported {0} disks, {1} bytes in {2:.1f}s ({3:.2f} MB/s, '
+              '{4} retries)'.format(len(file_items), stats.bytes, stats.seconds,
+                                    stats.throughput, stats.retries))
+        return stats
+
+    def _upload_disk(self, file_item, url, package, size, total):
+        stats = TransferStats(file_item.path, 'put', size)
+        method = 'PUT' if file_item.create else 'POST'
+        for attempt in range(self.retries + 1):
+            body = _SourceBody(package, file_item.path, size, [stats, total],
+                               self.chunk_size, self.retries)
+            try:
+                r = self._session.request(method, url, data=body,
+                                          verify=self.verify, headers={
+                    'Content-Type': 'application/x-vnd.vmware-streamVmdk'})
+                r.close()
+                if r.status_code < 200 or r.status_code >= 300:
+                    raise TransferError('{0} failed with status {1}'.format(
+                        method.capitalize(), r.status_code), r)
+                return stats.finish()
+            except (requests.RequestException, IOError, TransferError) as e:
+                stats.add(-body.sent)
+                total.add(-body.sent)
+                # Client errors will not go away by retrying
+                if attempt == self.retries or \
+                        getattr(e, 'status_code', 500) < 500:
+                    raise
+                stats.retries += 1
+                total.retries += 1
+                print('Upload of {0} failed, retrying: {1}'.format(
+                    file_item.path, e))
+                time.sleep(min(2 ** attempt, 30))
@@ -18,6 +18,8 @@ from pyVmomi import vim
 from samples.vsphere.common.vim.inventory import get_datastore_mo
 
 from samples.vsphere.common.vim import datastore_file
+from samples.vsphere.common.vim.helpers.vim_utils import (TaskErrors,
+                                                          TaskScheduler)
 
 
 def create_vmdk(service_instance, datacenter_mo, datastore_path):
@@ -28,17 +30,49 @@ def create_vmdk(service_instance, datacenter_mo, datastore_path):
         vim.VirtualDiskManager.SeSparseVirtualDiskSpec(
             diskType='seSparse', adapterType='lsiLogic',
             capacityKb=1024 * 1024 * 4))
-    pyVim.task.WaitForTask(task)
+    try:
+        pyVim.task.WaitForTask(task)
+    finally:
+        datastore_file.tree_cache.invalidate()
     print("Created VMDK '{}' in Datacenter '{}'".
           format(datastore_path, datacenter_mo.name))
     return task.info.result
 
 
+def create_vmdks(service_instance, datacenter_mo, datastore_paths,
+                 max_in_flight=8):
+    """
+    Create several vmdks in specific datacenter, with at most max_in_flight
+    creations running at a time. Raises TaskErrors listing every failure.
+    """
+    vdm = service_instance.content.virtualDiskManager
+    scheduler = TaskScheduler(service_instance.content, max_in_flight)
+    futures = []
+    for datastore_path in datastore_paths:
+        def create(datastore_path=datastore_path):
+            return vdm.CreateVirtualDisk(
+                datastore_path, datacenter_mo,
+                vim.VirtualDiskManager.SeSparseVirtualDiskSpec(
+                    diskType='seSparse', adapterType='lsiLogic',
+                    capacityKb=1024 * 1024 * 4))
+        futures.append(scheduler.submit(create))
+    errors = scheduler.run()
+    datastore_file.tree_cache.invalidate()
+    if errors:
+        raise TaskErrors(errors)
+    print("Created {} VMDKs in Datacenter '{}'".
+          format(len(futures), datacenter_mo.name))
+    return [f.result() for f in futures]
+
+
 def delete_vmdk(service_instance, datacenter_mo, datastore_path):
     """Delete vmdk from specific datastore"""
     vdm = service_instance.content.virtualDiskManager
     task = vdm.DeleteVirtualDisk(datastore_path, datacenter_mo)
-    pyVim.task.WaitForTask(task)
+    try:
+        pyVim.task.WaitForTask(task)
+    finally:
+        datastore_file.tree_cache.invalidate()
 
 
 def detect_vmdk(client, soap_stub, datacenter_name, datastore_name,
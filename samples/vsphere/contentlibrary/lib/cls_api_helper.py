@@ -15,13 +15,12 @@ __author__ = 'VMware, Inc.'
 __vcenter_version__ = '6.0+'
 
 import os
-import ssl
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
-try:
-    import urllib2
-except ImportError:
-    import urllib.request as urllib2
+import requests
+from requests.adapters import HTTPAdapter
 
 from com.vmware.content_client import LibraryModel
 from com.vmware.content.library_client import (Item,
@@ -35,19 +34,107 @@ from samples.vsphere.common.id_generator import generate_random_uuid
 from samples.vsphere.common.vim.helpers.get_datastore_by_name import get_datastore_id
 
 
+class FileTransferStats(object):
+    """
+    Progress and throughput of one file transferred in a library item session
+    """
+
+    def __init__(self, name, size=None):
+        self.name = name
+        self.size = size
+        self.bytes = 0
+        self.started = time.time()
+        self.seconds = 0.0
+
+    @property
+    def throughput(self):
+        """Transferred bytes per second"""
+        seconds = self.seconds or (time.time() - self.started)
+        return self.bytes / seconds if seconds else 0.0
+
+    def __repr__(self):
+        return '{0}: {1} bytes in {2:.1f}s ({3:.0f} bytes/s)'.format(
+            self.name, self.bytes, self.seconds, self.throughput)
+
+
+class _ProgressReader(object):
+    """
+    File wrapper handing the upload body to requests in fixed-size chunks
+    while counting the bytes sent.
+    """
+
+    def __init__(self, local_file, stats, chunk_size, progress):
+        self._file = local_file
+        self._stats = stats
+        self._chunk_size = chunk_size
+        self._progress = progress
+
+    def __len__(self):
+        return self._stats.size
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self._chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def read(self, size=-1):
+        chunk = self._file.read(min(size, self._chunk_size)
+                                if size and size > 0 else self._chunk_size)
+        self._stats.bytes += len(chunk)
+        if chunk and self._progress:
+            self._progress(self._stats)
+        return chunk
+
+
 class ClsApiHelper(object):
     """
     Helper class to perform commonly used operations using Content Library API.
 
+    Files of an update or download session are transferred by a pool of
+    transfer_workers threads over keep-alive connections, streaming chunk_size
+    blocks from and to disk. progress, when set, is called with the
+    FileTransferStats of a file after every chunk.
     """
 
     ISO_FILE_RELATIVE_DIR = '../resources/isoImages/'
     PLAIN_OVF_RELATIVE_DIR = '../resources/plainVmTemplate'
     SIMPLE_OVF_RELATIVE_DIR = '../resources/simpleVmTemplate'
 
-    def __init__(self, cls_api_client, skip_verification):
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, cls_api_client, skip_verification, transfer_workers=4,
+                 chunk_size=CHUNK_SIZE, progress=None):
         self.client = cls_api_client
         self.skip_verification = skip_verification
+        self.transfer_workers = transfer_workers
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self._http_session = None
+        self._http_session_lock = threading.Lock()
+
+    def _get_http_session(self):
+        with self._http_session_lock:
+            if self._http_session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_maxsize=self.transfer_workers)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                if self.skip_verification:
+                    session.verify = False
+                    requests.packages.urllib3.disable_warnings()
+                self._http_session = session
+        return self._http_session
+
+    def _transfer_all(self, func, items):
+        """
+        Run func over items on the transfer pool and return the results once
+        every transfer finished, raising the first failure if any.
+        """
+        with ThreadPoolExecutor(self.transfer_workers) as executor:
+            futures = [executor.submit(func, *item) for item in items]
+        return [future.result() for future in futures]
 
     def get_ovf_files_map(self, ovf_location):
         """
@@ -187,64 +274,125 @@ class ClsApiHelper(object):
         self.client.upload_service.delete(session_id)
 
     def upload_files_in_session(self, files_map, session_id):
-        for f_name, f_path in files_map.items():
-            file_spec = self.client.upload_file_service.AddSpec(name=f_name,
-                                                                source_type=UpdateSessionFile.SourceType.PUSH,
-                                                                size=os.path.getsize(f_path))
-            file_info = self.client.upload_file_service.add(session_id, file_spec)
-            # Upload the file content to the file upload URL
-            with open(f_path, 'rb') as local_file:
-                request = urllib2.Request(file_info.upload_endpoint.uri, local_file)
-                request.add_header('Cache-Control', 'no-cache')
-                request.add_header('Content-Length', '{0}'.format(os.path.getsize(f_path)))
-                request.add_header('Content-Type', 'text/ovf')
-                if self.skip_verification and hasattr(ssl, '_create_unverified_context'):
-                    # Python 2.7.9 has stronger SSL certificate validation,
-                    # so we need to pass in a context when dealing with
-                    # self-signed certificates.
-                    context = ssl._create_unverified_context()
-                    urllib2.urlopen(request, context=context)
-                else:
-                    # Don't pass context parameter since versions of Python
-                    # before 2.7.9 don't support it.
-                    urllib2.urlopen(request)
-
-    def download_files(self, library_item_id, directory):
+        """
+        Upload the files of files_map to an update session in parallel
+
+        Returns the FileTransferStats of every file, keyed by item file name.
+        """
+        stats = self._transfer_all(lambda f_name, f_path:
+                                   self._upload_file(session_id, f_name, f_path),
+                                   files_map.items())
+        return dict((s.name, s) for s in stats)
+
+    def _upload_file(self, session_id, f_name, f_path):
+        size = os.path.getsize(f_path)
+        file_spec = self.client.upload_file_service.AddSpec(name=f_name,
+                                                            source_type=UpdateSessionFile.SourceType.PUSH,
+                                                            size=size)
+        file_info = self.client.upload_file_service.add(session_id, file_spec)
+        stats = FileTransferStats(f_name, size)
+        # Stream the file content to the file upload URL
+        with open(f_path, 'rb') as local_file:
+            response = self._get_http_session().put(
+                file_info.upload_endpoint.uri,
+                data=_ProgressReader(local_file, stats, self.chunk_size,
+                                     self.progress),
+                headers={'Cache-Control': 'no-cache',
+                         'Content-Length': '{0}'.format(size),
+                         'Content-Type': 'text/ovf'})
+        response.raise_for_status()
+        stats.seconds = time.time() - stats.started
+        print('Uploaded {0}'.format(stats))
+        return stats
+
+    def download_files(self, library_item_id, directory, timeout=300):
         """
         Download files from a library item
 
+        Every file of the download session is prepared up front and each one
+        starts downloading, in parallel with the others and streaming to
+        disk, as soon as it is reported prepared.
+
         Args:
             library_item_id: id for the library item to download files from
             directory: location on the client machine to download the files into
+            timeout: seconds to wait for all the files to be prepared
 
         """
-        downloaded_files_map = {}
         # create a new download session for downloading the session files
         session_id = self.client.download_service.create(create_spec=DownloadSessionModel(
             library_item_id=library_item_id),
             client_token=generate_random_uuid())
-        file_infos = self.client.download_file_service.list(session_id)
-        for file_info in file_infos:
-            self.client.download_file_service.prepare(session_id, file_info.name)
-            download_info = self.wait_for_prepare(session_id, file_info.name)
-            if self.skip_verification and hasattr(ssl, '_create_unverified_context'):
-                # Python 2.7.9 has stronger SSL certificate validation,
-                # so we need to pass in a context when dealing with self-signed
-                # certificates.
-                context = ssl._create_unverified_context()
-                response = urllib2.urlopen(
-                    url=download_info.download_endpoint.uri,
-                    context=context)
-            else:
-                # Don't pass context parameter since versions of Python
-                # before 2.7.9 don't support it.
-                response = urllib2.urlopen(download_info.download_endpoint.uri)
-            file_path = os.path.join(directory, file_info.name)
+        try:
+            with ThreadPoolExecutor(self.transfer_workers) as executor:
+                futures = [executor.submit(self._download_file, file_info,
+                                           directory)
+                           for file_info in self.prepare_files(session_id,
+                                                               timeout=timeout)]
+            stats = [future.result() for future in futures]
+        finally:
+            self.client.download_service.delete(session_id)
+        return dict((s.name, os.path.join(directory, s.name)) for s in stats)
+
+    def _download_file(self, download_info, directory):
+        stats = FileTransferStats(download_info.name, download_info.size)
+        file_path = os.path.join(directory, download_info.name)
+        with self._get_http_session().get(download_info.download_endpoint.uri,
+                                          stream=True) as response:
+            response.raise_for_status()
             with open(file_path, 'wb') as local_file:
-                local_file.write(response.read())
-            downloaded_files_map[file_info.name] = file_path
-        self.client.download_service.delete(session_id)
-        return downloaded_files_map
+                for chunk in response.iter_content(self.chunk_size):
+                    local_file.write(chunk)
+                    stats.bytes += len(chunk)
+                    if self.progress:
+                        self.progress(stats)
+        stats.seconds = time.time() - stats.started
+        print('Downloaded {0}'.format(stats))
+        return stats
+
+    def prepare_files(self, session_id, file_names=None, timeout=300,
+                      initial_interval=0.5, max_interval=8):
+        """
+        Prepares files of a download session and yields their
+        downloadSessionFile info as each one becomes prepared
+
+        All files (default: every file in the session) are prepared up front,
+        then the whole session is polled with a single list call per round.
+        The polling interval starts at initial_interval, doubles after every
+        round without a newly prepared file, up to max_interval, and drops
+        back once a file is ready.
+
+        """
+        if file_names is None:
+            file_names = [file_info.name for file_info in
+                          self.client.download_file_service.list(session_id)]
+        for file_name in file_names:
+            self.client.download_file_service.prepare(session_id, file_name)
+
+        waiting = set(file_names)
+        interval = initial_interval
+        start_time = time.time()
+        while waiting:
+            ready = False
+            for file_info in self.client.download_file_service.list(session_id):
+                if file_info.name not in waiting:
+                    continue
+                if file_info.status == DownloadSessionFile.PrepareStatus.PREPARED:
+                    waiting.discard(file_info.name)
+                    ready = True
+                    print('File {0} prepared after {1:.1f}s'.format(
+                        file_info.name, time.time() - start_time))
+                    yield file_info
+                elif file_info.status == DownloadSessionFile.PrepareStatus.ERROR:
+                    raise Exception('failed to prepare file {0}'.format(file_info.name))
+            if not waiting:
+                break
+            if time.time() - start_time >= timeout:
+                raise Exception(
+                    'timed out after waiting {0} seconds for files {1} to be prepared'.format(
+                        timeout, ', '.join(sorted(waiting))))
+            interval = initial_interval if ready else min(interval * 2, max_interval)
+            time.sleep(interval)
 
     def wait_for_prepare(self, session_id, file_name,
                          status_list=(DownloadSessionFile.PrepareStatus.PREPARED,),
@@ -16,20 +16,50 @@ __copyright__ = 'Copyright 2016 VMware, Inc.  All rights reserved.'
 __vcenter_version__ = '6.0+'
 
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 
 class ClsSyncHelper:
     """
     Helper class to wait for the subscribed libraries and items to be
     synchronized completely with the publisher.
+
+    Item metadata is fetched concurrently by up to max_workers threads, the
+    source ID of each subscribed item is cached since it never changes, and
+    each poll only re-fetches the items that are not in sync yet.
     """
     wait_interval_sec = 1
     start_time = None
     sync_timeout_sec = None
 
-    def __init__(self, cls_api_client, sync_timeout_sec):
+    def __init__(self, cls_api_client, sync_timeout_sec, max_workers=8):
         self.client = cls_api_client
         self.sync_timeout_sec = sync_timeout_sec
+        self.max_workers = max_workers
+        self._source_ids = {}
+
+    def get_items(self, item_ids):
+        """
+        Fetch the given library items concurrently, keyed by item ID.
+        """
+        item_ids = list(item_ids)
+        if not item_ids:
+            return {}
+        with ThreadPoolExecutor(min(self.max_workers, len(item_ids))) as executor:
+            items = list(executor.map(self.client.library_item_service.get,
+                                      item_ids))
+        for item_id, item in zip(item_ids, items):
+            self._source_ids[item_id] = item.source_id
+        return dict(zip(item_ids, items))
+
+    def get_source_ids(self, sub_item_ids):
+        """
+        Return the source (published) item ID of each subscribed item,
+        fetching only the ones not cached yet.
+        """
+        self.get_items(set(sub_item_ids) - set(self._source_ids))
+        return dict((sub_item_id, self._source_ids[sub_item_id])
+                    for sub_item_id in sub_item_ids)
 
     def verify_library_sync(self, pub_lib_id, sub_lib):
         """
@@ -41,9 +71,8 @@ class ClsSyncHelper:
             return False
 
         sub_item_ids = self.client.library_item_service.list(sub_lib.id)
-        for sub_item_id in sub_item_ids:
-            if not self.verify_item_sync(sub_item_id):
-                return False
+        if not self.verify_items_sync(sub_item_ids):
+            return False
 
         if not self.verify_library_last_sync_time(sub_lib):
             return False
@@ -54,22 +83,34 @@ class ClsSyncHelper:
         """
         Wait until the subscribed item is synchronized with the published item.
         """
+        return self.verify_items_sync([sub_item_id])
+
+    def verify_items_sync(self, sub_item_ids):
+        """
+        Wait until the subscribed items are synchronized with their published
+        items. The published versions are fetched once; every poll re-fetches
+        only the subscribed items still behind.
+        """
         self.start_time = time.time()
-        is_synced = False
-        pub_item_id = self.client.library_item_service.get(
-            sub_item_id).source_id
-        pub_item = self.client.library_item_service.get(pub_item_id)
+        source_ids = self.get_source_ids(sub_item_ids)
+        pub_versions = dict(
+            (pub_item_id, (pub_item.metadata_version, pub_item.content_version))
+            for pub_item_id, pub_item in
+            self.get_items(set(source_ids.values())).items())
 
+        pending = set(sub_item_ids)
         while self.not_timed_out():
-            sub_item = self.client.library_item_service.get(sub_item_id)
-            # Verify if the subscribed item is the latest
-            if (sub_item.metadata_version == pub_item.metadata_version and
-                        sub_item.content_version == pub_item.content_version):
-                is_synced = True
-                break
+            sub_items = self.get_items(pending)
+            # Drop the subscribed items that are at the published versions
+            pending -= set(
+                sub_item_id for sub_item_id, sub_item in sub_items.items()
+                if (sub_item.metadata_version, sub_item.content_version) ==
+                pub_versions[source_ids[sub_item_id]])
+            if not pending:
+                return True
             time.sleep(self.wait_interval_sec)
 
-        return is_synced
+        return False
 
     def verify_same_items(self, pub_lib_id, sub_lib_id):
         """
@@ -115,14 +156,8 @@ class ClsSyncHelper:
         """
         if len(pub_item_ids) != len(sub_item_ids):
             return False
-        synced_item_ids = []
-        for sub_item_id in sub_item_ids:
-            source_id = self.client.library_item_service.get(
-                sub_item_id).source_id
-            if source_id not in synced_item_ids and source_id in pub_item_ids:
-                synced_item_ids.append(sub_item_id)
-
-        return len(pub_item_ids) == len(synced_item_ids)
+        source_ids = self.get_source_ids(sub_item_ids)
+        return set(source_ids.values()) == set(pub_item_ids)
 
     def not_timed_out(self):
         """
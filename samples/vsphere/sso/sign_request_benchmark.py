@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+"""
+* *******************************************************
+* Copyright (c) 2024 Broadcom. All Rights Reserved.
+* SPDX-License-Identifier: MIT
+* *******************************************************
+*
+* DISCLAIMER. THIS PROGRAM IS PROVIDED TO YOU "AS IS" WITHOUT
+* WARRANTIES OR CONDITIONS OF ANY KIND, WHETHER ORAL OR WRITTEN,
+* EXPRESS OR IMPLIED. THE AUTHOR SPECIFICALLY DISCLAIMS ANY IMPLIED
+* WARRANTIES OR CONDITIONS OF MERCHANTABILITY, SATISFACTORY QUALITY,
+* NON-INFRINGEMENT AND FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+__author__ = 'Broadcom, Inc.'
+__copyright__ = 'Copyright (c) 2024 Broadcom. All Rights Reserved.'
+
+import argparse
+import datetime
+import os
+import shutil
+import tempfile
+import timeit
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+from samples.vsphere.common import sso
+
+# Minimal assertion used as the HoK token of the LoginByToken requests
+SAML_TOKEN = ('<saml2:Assertion '
+              'xmlns:saml2="urn:oasis:names:tc:SAML:2.0:assertion" '
+              'ID="_benchmark"><saml2:Conditions '
+              'NotOnOrAfter="2030-01-01T00:00:00.000Z"/></saml2:Assertion>')
+
+
+class SignRequestBenchmark(object):
+    """
+    Measures the per-request cost of building and signing STS requests
+    offline, without contacting an STS.
+
+    A throwaway RSA key and certificate are generated unless the files of a
+    solution user are given.
+    """
+
+    def __init__(self):
+        parser = argparse.ArgumentParser()
+        parser.add_argument('--cert', help='Solution user certificate, PEM')
+        parser.add_argument('--key', help='Solution user private key, PEM')
+        parser.add_argument('-n', '--iterations', type=int, default=200,
+                            help='Requests to sign per measurement')
+        self.args = parser.parse_args()
+        self.tempdir = None
+
+    def run(self):
+        cert, key = self.args.cert, self.args.key
+        if not cert or not key:
+            cert, key = self.generate_key_pair()
+
+        def hok_request():
+            sso.SecurityTokenRequest(
+                public_key=cert, private_key=key).construct_hok_request()
+
+        def hok_by_hok_request():
+            request = sso.SecurityTokenRequest(private_key=key,
+                                               hok_token=SAML_TOKEN)
+            sso.add_saml_context(request.construct_hok_by_hok_request(),
+                                 SAML_TOKEN, key)
+
+        print('Signing cost per request, {} requests each'.format(
+            self.args.iterations))
+        for name, func in (('HoK token request', hok_request),
+                           ('HoK by HoK request', hok_by_hok_request)):
+            # The first call loads the key and warms the caches
+            func()
+            seconds = timeit.timeit(func, number=self.args.iterations)
+            print('  {0:<20} {1:8.3f} ms'.format(
+                name, seconds * 1000.0 / self.args.iterations))
+
+    def generate_key_pair(self):
+        self.tempdir = tempfile.mkdtemp()
+        private_key = rsa.generate_private_key(public_exponent=65537,
+                                               key_size=2048)
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME,
+                                             u'benchmark')])
+        now = datetime.datetime.utcnow()
+        cert = x509.CertificateBuilder().subject_name(name) \
+            .issuer_name(name) \
+            .public_key(private_key.public_key()) \
+            .serial_number(x509.random_serial_number()) \
+            .not_valid_before(now) \
+            .not_valid_after(now + datetime.timedelta(days=1)) \
+            .sign(private_key, hashes.SHA256())
+        cert_path = os.path.join(self.tempdir, 'benchmark.crt')
+        key_path = os.path.join(self.tempdir, 'benchmark.key')
+        with open(cert_path, 'wb') as f:
+            f.write(cert.public_bytes(serialization.Encoding.PEM))
+        with open(key_path, 'wb') as f:
+            f.write(private_key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.TraditionalOpenSSL,
+                serialization.NoEncryption()))
+        return cert_path, key_path
+
+    def cleanup(self):
+        if self.tempdir:
+            shutil.rmtree(self.tempdir)
+
+
+def main():
+    benchmark = SignRequestBenchmark()
+    try:
+        benchmark.run()
+    finally:
+        benchmark.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -15,16 +15,21 @@ __author__ = 'VMware, Inc.'
 __vcenter_version__ = '6.5+'
 
 from com.vmware.vcenter_client import Datastore
+from pyVmomi import vim
 
 from samples.vsphere.vcenter.helper import datacenter_helper
 
 
-def get_datastore(client, datacenter_name, datastore_name):
+def get_datastore(client, datacenter_name, datastore_name, inventory=None):
     """
     Returns the identifier of a datastore
     Note: The method assumes that there is only one datastore and datacenter
     with the mentioned names.
+    If an InventoryCache is given, the names are resolved from memory.
     """
+    if inventory is not None:
+        return inventory.find(vim.Datastore, datastore_name, datacenter_name)
+
     datacenter = datacenter_helper.get_datacenter(client, datacenter_name)
     if not datacenter:
         print("Datacenter '{}' not found".format(datacenter_name))
@@ -15,28 +15,37 @@ __author__ = 'VMware, Inc.'
 __vcenter_version__ = '6.5+'
 
 from com.vmware.vcenter_client import Folder
+from pyVmomi import vim
 
 from samples.vsphere.vcenter.helper import datacenter_helper
 
 
-def get_folder(client, datacenter_name, folder_name):
+def get_folder(client, datacenter_name, folder_name, inventory=None):
     """
     Returns the identifier of a folder
     Note: The method assumes that there is only one folder and datacenter
     with the mentioned names.
+    If an InventoryCache is given, the names are resolved from memory.
     """
-    datacenter = datacenter_helper.get_datacenter(client, datacenter_name)
-    if not datacenter:
-        print("Datacenter '{}' not found".format(datacenter_name))
-        return None
+    if inventory is not None:
+        folder = inventory.find(
+            vim.Folder, folder_name, datacenter_name,
+            lambda entry: 'VirtualMachine' in entry.get('childType', ()))
+    else:
+        datacenter = datacenter_helper.get_datacenter(client, datacenter_name)
+        if not datacenter:
+            print("Datacenter '{}' not found".format(datacenter_name))
+            return None
+
+        filter_spec = Folder.FilterSpec(type=Folder.Type.VIRTUAL_MACHINE,
+                                        names=set([folder_name]),
+                                        datacenters=set([datacenter]))
 
-    filter_spec = Folder.FilterSpec(type=Folder.Type.VIRTUAL_MACHINE,
-                                    names=set([folder_name]),
-                                    datacenters=set([datacenter]))
+        folder_summaries = client.vcenter.Folder.list(filter_spec)
+        folder = folder_summaries[0].folder \
+            if len(folder_summaries) > 0 else None
 
-    folder_summaries = client.vcenter.Folder.list(filter_spec)
-    if len(folder_summaries) > 0:
-        folder = folder_summaries[0].folder
+    if folder is not None:
         print("Detected folder '{}' as {}".format(folder_name, folder))
         return folder
     else:
@@ -0,0 +1,228 @@
+"""
+* *******************************************************
+* Copyright (c) 2024 Broadcom. All Rights Reserved.
+* SPDX-License-Identifier: MIT
+* *******************************************************
+*
+* DISCLAIMER. THIS PROGRAM IS PROVIDED TO YOU "AS IS" WITHOUT
+* WARRANTIES OR CONDITIONS OF ANY KIND, WHETHER ORAL OR WRITTEN,
+* EXPRESS OR IMPLIED. THE AUTHOR SPECIFICALLY DISCLAIMS ANY IMPLIED
+* WARRANTIES OR CONDITIONS OF MERCHANTABILITY, SATISFACTORY QUALITY,
+* NON-INFRINGEMENT AND FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+__author__ = 'Broadcom, Inc.'
+__copyright__ = 'Copyright (c) 2024 Broadcom. All Rights Reserved.'
+__vcenter_version__ = '7.0 U2+'
+
+import os
+
+import requests
+from com.vmware.vcenter.vm.guest.filesystem_client import Transfers
+from requests.adapters import HTTPAdapter
+
+from samples.vsphere.common.vim.datastore_transfer import (TransferError,
+                                                           TransferStats,
+                                                           run_all)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class _ReaderBody(object):
+    """
+    Request body that reads a file-like object in chunks and counts the
+    bytes sent. The length lets requests send a Content-Length header
+    instead of a chunked body, which the guest transfer URLs require.
+    """
+
+    def __init__(self, fileobj, size, stats, progress, chunk_size):
+        self._fileobj = fileobj
+        self._remaining = size
+        self._size = size
+        self._stats = stats
+        self._progress = progress
+        self._chunk_size = chunk_size
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self._chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        chunk = self._fileobj.read(size) if size else b''
+        self._remaining -= len(chunk)
+        if chunk:
+            self._stats.add(len(chunk))
+            if self._progress:
+                self._progress(self._stats)
+        return chunk
+
+
+def _remaining_size(fileobj):
+    try:
+        return os.fstat(fileobj.fileno()).st_size - fileobj.tell()
+    except (AttributeError, OSError, IOError, ValueError):
+        pass
+    try:
+        position = fileobj.tell()
+        fileobj.seek(0, os.SEEK_END)
+        size = fileobj.tell() - position
+        fileobj.seek(position)
+        return size
+    except (AttributeError, OSError, IOError, ValueError):
+        raise ValueError('The size of a file-like object that cannot seek '
+                         'must be given')
+
+
+class GuestFileTransfer(object):
+    """
+    Copies files into and out of a guest through the vAPI guest file
+    transfer URLs.
+
+    Files are streamed in chunks between the ESXi host and local files or
+    file-like objects, so their size is not limited by memory. All transfers
+    share one keep-alive requests session, which pools the connections to
+    every ESXi host the URLs point to. Sizes are checked against
+    Files.get after every transfer, and every transfer returns a
+    TransferStats.
+    """
+
+    def __init__(self, client, vm, credentials, workers=4,
+                 chunk_size=CHUNK_SIZE, verify=False, progress=None):
+        self.client = client
+        self.vm = vm
+        self.credentials = credentials
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.verify = verify
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=workers)
+        self._session.mount('https://', adapter)
+        if not verify:
+            requests.packages.urllib3.disable_warnings()
+
+    def close(self):
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _files(self):
+        return self.client.vcenter.vm.guest.filesystem.Files
+
+    def _transfer_url(self, guest_path, attributes=None):
+        return self.client.vcenter.vm.guest.filesystem.Transfers.create(
+            self.vm, self.credentials,
+            Transfers.CreateSpec(path=guest_path, attributes=attributes))
+
+    def _request(self, method, url, **kwargs):
+        # Passed per request, as REQUESTS_CA_BUNDLE would override a
+        # session level verify=False
+        r = self._session.request(method, url, verify=self.verify, **kwargs)
+        if r.status_code != 200:
+            r.close()
+            raise TransferError('{} failed with status {}'.format(
+                method.capitalize(), r.status_code), r)
+        return r
+
+    def upload(self, source, guest_path, overwrite=True, permissions=None,
+               size=None):
+        """
+        Upload a local file or a file-like object opened in binary mode to
+        guest_path. The size of a file-like object that cannot seek must be
+        given. Permissions, like '0644', apply to Posix guests.
+        """
+        if not hasattr(source, 'read'):
+            with open(source, 'rb') as f:
+                return self.upload(f, guest_path, overwrite, permissions,
+                                   os.fstat(f.fileno()).st_size)
+        if size is None:
+            size = _remaining_size(source)
+
+        posix = None
+        if permissions is not None:
+            posix = Transfers.PosixFileAttributesCreateSpec(
+                permissions=permissions)
+        url = self._transfer_url(guest_path, Transfers.FileCreationAttributes(
+            size, overwrite=overwrite, posix=posix))
+
+        stats = TransferStats(guest_path, 'put', size)
+        body = _ReaderBody(source, size, stats, self.progress,
+                           self.chunk_size)
+        self._request('PUT', url, data=body, headers={
+            'Content-Type': 'application/octet-stream'}).close()
+        if stats.bytes != size:
+            raise IOError('Short read from source of {}: {} of {} bytes'.
+                          format(guest_path, stats.bytes, size))
+        self._check_size(guest_path, size)
+        return stats.finish()
+
+    def download(self, guest_path, destination):
+        """
+        Download guest_path into a local file or a file-like object opened
+        in binary mode. A local file is written next to its final name and
+        only renamed once complete.
+        """
+        size = self._files().get(self.vm, self.credentials, guest_path).size
+        if hasattr(destination, 'write'):
+            return self._download_to(guest_path, destination, size)
+
+        partial = destination + '.partial'
+        try:
+            with open(partial, 'wb') as f:
+                stats = self._download_to(guest_path, f, size)
+        except Exception:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        os.replace(partial, destination)
+        return stats
+
+    def _download_to(self, guest_path, fileobj, size):
+        url = self._transfer_url(guest_path)
+        stats = TransferStats(guest_path, 'get', size)
+        with self._request('GET', url, stream=True) as r:
+            for chunk in r.iter_content(self.chunk_size):
+                fileobj.write(chunk)
+                stats.add(len(chunk))
+                if self.progress:
+                    self.progress(stats)
+        if size is not None and stats.bytes != size:
+            raise IOError('Short read of {}: {} of {} bytes'.format(
+                guest_path, stats.bytes, size))
+        return stats.finish()
+
+    def _check_size(self, guest_path, size):
+        info = self._files().get(self.vm, self.credentials, guest_path)
+        if info.size != size:
+            raise IOError('Size of {} in the guest is {} instead of {} bytes'.
+                          format(guest_path, info.size, size))
+
+    def upload_files(self, files, overwrite=True, permissions=None):
+        """
+        Upload (local path, guest path) pairs with a bounded pool of
+        workers. Returns the TransferStats of every file.
+        """
+        return run_all(
+            lambda item: self.upload(item[0], item[1], overwrite,
+                                     permissions), files, self.workers)
+
+    def download_files(self, files):
+        """
+        Download (guest path, local path) pairs with a bounded pool of
+        workers. Returns the TransferStats of every file.
+        """
+        return run_all(lambda item: self.download(*item), files,
+                       self.workers)
@@ -16,10 +16,283 @@ __vcenter_version__ = '6.7+'
 
 import time
 import logging
+import threading
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
 from com.vmware.vcenter.vm.guest_client import Power
 from com.vmware.vcenter.vm.guest_client import Identity
 from com.vmware.vapi.std.errors_client import (NotFound, ServiceUnavailable)
 
+# Targets a GuestStatePoller can wait for
+POWER_STATE = 'power_state'
+OPERATIONS_READY = 'operations_ready'
+INFO_READY = 'info_ready'
+
+
+class _PolledVM(object):
+    """
+    Waiters, last values and polling schedule of one vm.
+    """
+
+    def __init__(self, interval):
+        self.waiters = []
+        self.values = None
+        self.interval = interval
+        # A new vm is checked right away, its state may already be reached
+        self.next_poll = time.time()
+
+
+class GuestStatePoller(object):
+    """
+    Waits for the guest state of many vms through the vAPI guest services.
+
+    A single background thread polls the vms that have waiters, each once
+    per round whatever the number of waiters on it, on a small pool of
+    workers. Power.get answers power state and operations ready targets and
+    Identity.get the guest info readiness. The interval of a vm grows from
+    interval up to max_interval while its state does not change, so vms that
+    take minutes to boot do not cost a call per second each, and drops back
+    when it changes or a new waiter arrives. With an idle_timeout, the thread
+    and its workers exit after that many seconds without waiters, call
+    on_idle with the poller, and start again on the next watch.
+    """
+
+    def __init__(self, client, interval=1.0, max_interval=10.0, backoff=1.5,
+                 max_workers=8, idle_timeout=None, on_idle=None):
+        self.client = client
+        self.interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_workers = max_workers
+        self.idle_timeout = idle_timeout
+        self.on_idle = on_idle
+        self._vms = {}
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        with self._cond:
+            self._stopped = False
+            self._start_thread()
+        return self
+
+    def _start_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run,
+                                            name='guest-state-poller')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stop polling. Callers still waiting get a RuntimeError.
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+        with self._cond:
+            vms, self._vms = self._vms, {}
+        for polled in vms.values():
+            for _, _, future in polled.waiters:
+                future.set_exception(RuntimeError('Guest state poller stopped'))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def watch(self, vm, target, desired):
+        """
+        Return a Future resolved with the desired value once the target of
+        the vm, one of POWER_STATE, OPERATIONS_READY or INFO_READY, has it.
+        """
+        future = futures.Future()
+        with self._cond:
+            polled = self._vms.get(vm)
+            if polled is None:
+                polled = self._vms[vm] = _PolledVM(self.interval)
+            else:
+                polled.interval = self.interval
+                polled.next_poll = min(polled.next_poll,
+                                       time.time() + self.interval)
+            polled.waiters.append((target, desired, future))
+            if not self._stopped:
+                self._start_thread()
+            self._cond.notify_all()
+        return future
+
+    def wait_for(self, vm, target, desired, timeout=None):
+        """
+        Wait until the target of the vm has the desired value. Raises a
+        concurrent.futures.TimeoutError if it did not in time.
+        """
+        self.wait_for_all([vm], target, desired, timeout)
+
+    def wait_for_all(self, vms, target, desired, timeout=None):
+        """
+        Wait until the target of every vm has the desired value. Raises a
+        concurrent.futures.TimeoutError naming the vms that did not in time.
+        """
+        watched = dict((self.watch(vm, target, desired), vm) for vm in vms)
+        done, not_done = futures.wait(watched, timeout)
+        if not_done:
+            self._discard(not_done)
+            raise futures.TimeoutError(
+                '{} of {} vms did not reach {} {} after {}s: {}'.format(
+                    len(not_done), len(watched), target, desired, timeout,
+                    ', '.join(sorted(watched[f] for f in not_done))))
+        for future in done:
+            future.result()
+
+    def _discard(self, discarded):
+        with self._cond:
+            for vm in list(self._vms):
+                polled = self._vms[vm]
+                polled.waiters = [w for w in polled.waiters
+                                  if w[2] not in discarded]
+                if not polled.waiters:
+                    del self._vms[vm]
+
+    def _run(self):
+        idle = False
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            while not idle:
+                with self._cond:
+                    due = self._due()
+                    idle_until = None
+                    while not self._stopped and not due:
+                        if self._vms:
+                            timeout = min(p.next_poll for p in
+                                          self._vms.values()) - time.time()
+                            idle_until = None
+                        elif self.idle_timeout is None:
+                            timeout = None
+                        else:
+                            if idle_until is None:
+                                idle_until = time.time() + self.idle_timeout
+                            timeout = idle_until - time.time()
+                            if timeout <= 0:
+                                # A watch starts a new thread from now on
+                                self._thread = None
+                                idle = True
+                                break
+                        self._cond.wait(timeout)
+                        due = self._due()
+                    if self._stopped or idle:
+                        break
+                    batch = [(vm, set(w[0] for w in self._vms[vm].waiters))
+                             for vm in due]
+                polls = [(vm, executor.submit(self._poll, vm, targets))
+                         for vm, targets in batch]
+                for vm, poll in polls:
+                    self._resolve(vm, poll)
+        if idle and self.on_idle is not None:
+            self.on_idle(self)
+
+    def _due(self):
+        now = time.time()
+        return [vm for vm, polled in self._vms.items()
+                if polled.next_poll <= now]
+
+    def _poll(self, vm, targets):
+        values = {}
+        if POWER_STATE in targets or OPERATIONS_READY in targets:
+            info = self.client.vcenter.vm.guest.Power.get(vm)
+            values[POWER_STATE] = info.state
+            values[OPERATIONS_READY] = info.operations_ready
+        if INFO_READY in targets:
+            try:
+                self.client.vcenter.vm.guest.Identity.get(vm)
+                values[INFO_READY] = True
+            except ServiceUnavailable:
+                logging.debug('Got ServiceUnavailable waiting for guest info')
+                values[INFO_READY] = False
+        return values
+
+    def _resolve(self, vm, poll):
+        error = poll.exception()
+        values = poll.result() if error is None else None
+        resolved = []
+        with self._cond:
+            polled = self._vms.get(vm)
+            if polled is None:
+                return
+            if error is not None:
+                resolved = [(f, None, error) for _, _, f in polled.waiters]
+                polled.waiters = []
+            else:
+                logging.debug('Guest state of %s is %s' % (vm, values))
+                for target, desired, future in polled.waiters:
+                    if values.get(target) == desired:
+                        resolved.append((future, desired, None))
+                polled.waiters = [w for w in polled.waiters
+                                  if w[2] not in [r[0] for r in resolved]]
+                if values == polled.values:
+                    polled.interval = min(polled.interval * self.backoff,
+                                          self.max_interval)
+                else:
+                    polled.interval = self.interval
+                polled.values = values
+            polled.next_poll = time.time() + polled.interval
+            if not polled.waiters:
+                del self._vms[vm]
+        for future, result, error in resolved:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+# Seconds a shared poller waits for new waiters before it is dropped
+POLLER_IDLE_TIMEOUT = 30
+
+_pollers = {}
+_pollers_lock = threading.Lock()
+
+
+def get_guest_state_poller(vsphere_client):
+    """
+    Return the GuestStatePoller shared by all waits on a client, so
+    concurrent waits for many vms are batched together. A poller left
+    without waiters for POLLER_IDLE_TIMEOUT seconds stops and is dropped,
+    along with its reference to the client.
+    """
+    # Keyed by identity, the poller keeps the client alive so the id
+    # cannot be reused while it is registered
+    with _pollers_lock:
+        poller = _pollers.get(id(vsphere_client))
+        if poller is None:
+            poller = _pollers[id(vsphere_client)] = GuestStatePoller(
+                vsphere_client, idle_timeout=POLLER_IDLE_TIMEOUT,
+                on_idle=_drop_poller)
+        return poller
+
+
+def _drop_poller(poller):
+    with _pollers_lock:
+        # Kept when a watch restarted it in the meantime
+        with poller._cond:
+            if poller._thread is not None:
+                return
+        if _pollers.get(id(poller.client)) is poller:
+            del _pollers[id(poller.client)]
+
+
+def shutdown_guest_state_pollers():
+    """
+    Stop and drop the pollers of every client.
+    """
+    with _pollers_lock:
+        pollers = list(_pollers.values())
+        _pollers.clear()
+    for poller in pollers:
+        poller.stop()
+
 
 def wait_for_guest_info_ready(vsphere_client, vmId, timeout):
     """
@@ -27,25 +300,17 @@ def wait_for_guest_info_ready(vsphere_client, vmId, timeout):
     """
     print('Waiting for guest info to be ready.')
     start = time.time()
-    timeout = start + timeout
-    while timeout > time.time():
-        logging.info('Waiting for guest info to be ready')
-        time.sleep(1)
-        try:
-            result = vsphere_client.vcenter.vm.guest.Identity.get(vmId)
-            break
-        except ServiceUnavailable as e:
-            logging.debug('Got ServiceUnavailable waiting for guest info')
-            pass
-        except Exception as e:
-            print('Unexpected exception %s waiting for guest info' % e)
-            raise e
-    if time.time() >= timeout:
+    try:
+        get_guest_state_poller(vsphere_client).wait_for(vmId, INFO_READY,
+                                                        True, timeout)
+    except futures.TimeoutError:
         raise Exception('Timed out waiting for guest info to be available.\n'
                         'Be sure the VM has VMware Tools.')
-    else:
-        logging.info('Took %d seconds for guest info to be available'
-                     % (time.time() - start))
+    except Exception as e:
+        print('Unexpected exception %s waiting for guest info' % e)
+        raise e
+    logging.info('Took %d seconds for guest info to be available'
+                 % (time.time() - start))
 
 
 def wait_for_guest_power_state(vsphere_client, vmId, desiredState, timeout):
@@ -54,19 +319,13 @@ def wait_for_guest_power_state(vsphere_client, vmId, desiredState, timeout):
     """
     print("Waiting for guest power state {}".format(desiredState))
     start = time.time()
-    timeout = start + timeout
-    while timeout > time.time():
-        time.sleep(1)
-        curState = vsphere_client.vcenter.vm.guest.Power.get(vmId).state
-        logging.debug('Current guest power state is %s, looking for %s'
-                      % (curState, desiredState))
-        if desiredState == curState:
-            break
-    if desiredState != curState:
+    try:
+        get_guest_state_poller(vsphere_client).wait_for(vmId, POWER_STATE,
+                                                        desiredState, timeout)
+    except futures.TimeoutError:
         raise Exception('Timed out waiting for guest to reach desired power state')
-    else:
-        logging.info('Took %s seconds for guest power state to change to %s'
-                     % (time.time() - start, desiredState))
+    logging.info('Took %s seconds for guest power state to change to %s'
+                 % (time.time() - start, desiredState))
 
 
 def wait_for_power_operations_state(vsphere_client, vmId, desiredState, timeout):
@@ -75,17 +334,25 @@ def wait_for_power_operations_state(vsphere_client, vmId, desiredState, timeout)
     """
     print('Waiting for guest power operations to be {}'.format(desiredState))
     start = time.time()
-    timeout = start + timeout
-    while timeout > time.time():
-        time.sleep(1)
-        curState = vsphere_client.vcenter.vm.guest.Power.get(vmId).operations_ready
-        logging.debug('Current guest operations ready state is %s,'
-                      ' looking for %s' % (curState, desiredState))
-        if desiredState == curState:
-            break
-    if desiredState != curState:
+    try:
+        get_guest_state_poller(vsphere_client).wait_for(
+            vmId, OPERATIONS_READY, desiredState, timeout)
+    except futures.TimeoutError:
         raise Exception('Timed out waiting for guest to reach desired '
                         ' operations ready state')
-    else:
-        logging.info('Took %s seconds for guest operations ready state\
-                     to change to %s' % (time.time() - start, desiredState))
+    logging.info('Took %s seconds for guest operations ready state'
+                 ' to change to %s' % (time.time() - start, desiredState))
+
+
+def wait_for_guests_power_state(vsphere_client, vmIds, desiredState, timeout):
+    """
+    Waits for the guests of all vms to reach the desired power state, or
+    times out naming the vms that did not.
+    """
+    print("Waiting for {} guests to reach power state {}".format(
+        len(vmIds), desiredState))
+    start = time.time()
+    get_guest_state_poller(vsphere_client).wait_for_all(
+        vmIds, POWER_STATE, desiredState, timeout)
+    logging.info('Took %s seconds for %d guests to change to %s'
+                 % (time.time() - start, len(vmIds), desiredState))
@@ -0,0 +1,121 @@
+"""
+* *******************************************************
+* Copyright (c) 2024 Broadcom. All Rights Reserved.
+* SPDX-License-Identifier: MIT
+* *******************************************************
+*
+* DISCLAIMER. THIS PROGRAM IS PROVIDED TO YOU "AS IS" WITHOUT
+* WARRANTIES OR CONDITIONS OF ANY KIND, WHETHER ORAL OR WRITTEN,
+* EXPRESS OR IMPLIED. THE AUTHOR SPECIFICALLY DISCLAIMS ANY IMPLIED
+* WARRANTIES OR CONDITIONS OF MERCHANTABILITY, SATISFACTORY QUALITY,
+* NON-INFRINGEMENT AND FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+__author__ = 'Broadcom, Inc.'
+__copyright__ = 'Copyright (c) 2024 Broadcom. All Rights Reserved.'
+__vcenter_version__ = '6.5+'
+
+from concurrent.futures import ThreadPoolExecutor
+
+from com.vmware.vcenter_client import (Cluster, Datacenter, Datastore, Folder,
+                                       Host, Network, ResourcePool, VM)
+
+# kind: (service attribute, filter spec factory, summary id attribute)
+KINDS = {
+    'cluster': ('Cluster', Cluster.FilterSpec, 'cluster'),
+    'datastore': ('Datastore', Datastore.FilterSpec, 'datastore'),
+    'folder': ('Folder',
+               lambda **kw: Folder.FilterSpec(
+                   type=Folder.Type.VIRTUAL_MACHINE, **kw),
+               'folder'),
+    'host': ('Host', Host.FilterSpec, 'host'),
+    'network': ('Network', Network.FilterSpec, 'network'),
+    'resource_pool': ('ResourcePool', ResourcePool.FilterSpec,
+                      'resource_pool'),
+    'vm': ('VM', VM.FilterSpec, 'vm'),
+}
+
+
+class NameResolver(object):
+    """
+    Resolves many (kind, datacenter name, name) requests to identifiers at
+    once.
+
+    Datacenters are looked up in a single query and memoized. The requests
+    of each kind are answered by one list() call with all their names, per
+    datacenter since summaries do not tell which datacenter an object is
+    in, and the calls of different kinds run concurrently. Resolved
+    identifiers are memoized too, so resolving the same placement for many
+    vms costs the queries only once. A name of None resolves to the first
+    object of that kind in the datacenter.
+    """
+
+    def __init__(self, client, max_workers=4):
+        self.client = client
+        self.max_workers = max_workers
+        self._datacenters = {}
+        self._ids = {}
+
+    def get_datacenters(self, datacenter_names):
+        """
+        Return a dict of datacenter name to identifier, or None if missing.
+        """
+        missing = set(datacenter_names) - set(self._datacenters)
+        if missing:
+            summaries = self.client.vcenter.Datacenter.list(
+                Datacenter.FilterSpec(names=missing))
+            for summary in summaries:
+                self._datacenters.setdefault(summary.name, summary.datacenter)
+            for name in missing:
+                self._datacenters.setdefault(name, None)
+        return dict((name, self._datacenters[name])
+                    for name in datacenter_names)
+
+    def resolve(self, requests):
+        """
+        Return a dict mapping every (kind, datacenter name, name) request to
+        the identifier of the object, or None if it was not found.
+        """
+        requests = set(requests)
+        todo = [r for r in requests if r not in self._ids]
+        if todo:
+            datacenters = self.get_datacenters(set(r[1] for r in todo))
+            groups = {}
+            for kind, datacenter_name, name in todo:
+                if datacenters[datacenter_name] is None:
+                    self._ids[(kind, datacenter_name, name)] = None
+                    continue
+                groups.setdefault((kind, datacenter_name), set()).add(name)
+
+            with ThreadPoolExecutor(self.max_workers) as executor:
+                results = executor.map(
+                    lambda group: self._list(group[0],
+                                             datacenters[group[1]],
+                                             group[2]),
+                    [(k, dc, names) for (k, dc), names in groups.items()])
+                for ((kind, datacenter_name), names), found in \
+                        zip(groups.items(), results):
+                    for name in names:
+                        self._ids[(kind, datacenter_name, name)] = \
+                            found.get(name)
+        return dict((r, self._ids[r]) for r in requests)
+
+    def get(self, kind, datacenter_name, name=None):
+        """
+        Resolve a single request.
+        """
+        request = (kind, datacenter_name, name)
+        return self.resolve([request])[request]
+
+    def _list(self, kind, datacenter, names):
+        service, filter_spec, id_attribute = KINDS[kind]
+        # Without a name filter the query also answers the named requests
+        summaries = getattr(self.client.vcenter, service).list(filter_spec(
+            names=None if None in names else names,
+            datacenters=set([datacenter])))
+        found = {}
+        for summary in summaries:
+            found.setdefault(summary.name, getattr(summary, id_attribute))
+        if summaries:
+            found[None] = getattr(summaries[0], id_attribute)
+        return found
@@ -15,27 +15,37 @@ __author__ = 'VMware, Inc.'
 __vcenter_version__ = '6.5+'
 
 from com.vmware.vcenter_client import ResourcePool
+from pyVmomi import vim
 
 from samples.vsphere.vcenter.helper import datacenter_helper
 
 
-def get_resource_pool(client, datacenter_name, resource_pool_name=None):
+def get_resource_pool(client, datacenter_name, resource_pool_name=None,
+                      inventory=None):
     """
     Returns the identifier of the resource pool with the given name or the
     first resource pool in the datacenter if the name is not provided.
+    If an InventoryCache is given, the names are resolved from memory.
     """
-    datacenter = datacenter_helper.get_datacenter(client, datacenter_name)
-    if not datacenter:
-        print("Datacenter '{}' not found".format(datacenter_name))
-        return None
+    if inventory is not None:
+        resource_pool = inventory.find(vim.ResourcePool,
+                                       resource_pool_name or None,
+                                       datacenter_name)
+    else:
+        datacenter = datacenter_helper.get_datacenter(client, datacenter_name)
+        if not datacenter:
+            print("Datacenter '{}' not found".format(datacenter_name))
+            return None
+
+        names = set([resource_pool_name]) if resource_pool_name else None
+        filter_spec = ResourcePool.FilterSpec(datacenters=set([datacenter]),
+                                              names=names)
 
-    names = set([resource_pool_name]) if resource_pool_name else None
-    filter_spec = ResourcePool.FilterSpec(datacenters=set([datacenter]),
-                                          names=names)
+        resource_pool_summaries = client.vcenter.ResourcePool.list(filter_spec)
+        resource_pool = resource_pool_summaries[0].resource_pool \
+            if len(resource_pool_summaries) > 0 else None
 
-    resource_pool_summaries = client.vcenter.ResourcePool.list(filter_spec)
-    if len(resource_pool_summaries) > 0:
-        resource_pool = resource_pool_summaries[0].resource_pool
+    if resource_pool is not None:
         print("Selecting ResourcePool '{}'".format(resource_pool))
         return resource_pool
     else:
@@ -14,29 +14,42 @@
 __author__ = 'VMware, Inc.'
 __vcenter_version__ = '6.5+'
 
-from com.vmware.vcenter_client import VM
+from concurrent.futures import (FIRST_COMPLETED, ThreadPoolExecutor,
+                                wait)
 
+from com.vmware.vapi.std.errors_client import UnableToAllocateResource
+from com.vmware.vcenter.vm_client import Power
+from com.vmware.vcenter_client import VM, Cluster, Host
+from pyVmomi import vim
 
-def get_vm(client, vm_name):
+FILTER_SPEC_FIELDS = ('vms', 'names', 'folders', 'datacenters', 'hosts',
+                      'clusters', 'resource_pools', 'power_states')
+
+
+def get_vm(client, vm_name, inventory=None):
     """
     Return the identifier of a vm
     Note: The method assumes that there is only one vm with the mentioned name.
+    If an InventoryCache is given, the name is resolved from memory.
     """
-    names = set([vm_name])
-    vms = client.vcenter.VM.list(VM.FilterSpec(names=names))
+    if inventory is not None:
+        vm = inventory.find(vim.VirtualMachine, vm_name)
+    else:
+        names = set([vm_name])
+        vms = client.vcenter.VM.list(VM.FilterSpec(names=names))
+        vm = vms[0].vm if len(vms) > 0 else None
 
-    if len(vms) == 0:
+    if vm is None:
         print("VM with name ({}) not found".format(vm_name))
         return None
 
-    vm = vms[0].vm
     print("Found VM '{}' ({})".format(vm_name, vm))
     return vm
 
 
 def get_vms(client, vm_names):
     """Return identifiers of a list of vms"""
-    vms = client.vcenter.VM.list(VM.FilterSpec(names=vm_names))
+    vms = list(iter_vms(client, VM.FilterSpec(names=vm_names)))
 
     if len(vms) == 0:
         print('No vm found')
@@ -44,3 +57,98 @@ def get_vms(client, vm_names):
 
     print("Found VMs '{}' ({})".format(vm_names, vms))
     return vms
+
+
+def iter_vms(client, filter_spec=None, max_workers=8):
+    """
+    Yield the VM.Summary of every vm matching filter_spec.
+
+    VM.list fails with UnableToAllocateResource when more than 4000 vms
+    match. Such a query is split into shards by power state, then by cluster
+    (plus one shard per standalone host), then by host, and the shards are
+    listed concurrently on a bounded thread pool. Summaries are yielded as
+    each shard completes and vms seen in an earlier shard are skipped.
+    """
+    filter_spec = filter_spec or VM.FilterSpec()
+    splitter = _FilterSpecSplitter(client)
+    seen = set()
+    executor = ThreadPoolExecutor(max_workers)
+    try:
+        pending = set([executor.submit(_list_shard, client, splitter,
+                                       filter_spec)])
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                summaries, shards = future.result()
+                for shard in shards:
+                    pending.add(executor.submit(_list_shard, client, splitter,
+                                                shard))
+                for summary in summaries:
+                    if summary.vm not in seen:
+                        seen.add(summary.vm)
+                        yield summary
+    finally:
+        # Also reached when the caller stops iterating early
+        executor.shutdown(wait=False)
+
+
+def _list_shard(client, splitter, filter_spec):
+    """
+    List one shard, or return the specs it has to be split into.
+    """
+    try:
+        return client.vcenter.VM.list(filter_spec), []
+    except UnableToAllocateResource:
+        return [], splitter.split(filter_spec)
+
+
+class _FilterSpecSplitter(object):
+    """
+    Splits a VM.FilterSpec into specs that partition its result. Cluster and
+    host lists are fetched once per datacenter and cluster filter.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._clusters = {}
+        self._hosts = {}
+
+    def split(self, spec):
+        if not spec.power_states:
+            return [_copy_spec(spec, power_states=set([state]))
+                    for state in Power.State.get_values()]
+        if not spec.clusters and not spec.hosts:
+            datacenters = frozenset(spec.datacenters or ())
+            if datacenters not in self._clusters:
+                clusters = self.client.vcenter.Cluster.list(
+                    Cluster.FilterSpec(datacenters=spec.datacenters))
+                standalone = self.client.vcenter.Host.list(
+                    Host.FilterSpec(datacenters=spec.datacenters,
+                                    standalone=True))
+                self._clusters[datacenters] = (
+                    [c.cluster for c in clusters],
+                    [h.host for h in standalone])
+            clusters, standalone = self._clusters[datacenters]
+            return [_copy_spec(spec, clusters=set([c])) for c in clusters] + \
+                [_copy_spec(spec, hosts=set([h])) for h in standalone]
+        if not spec.hosts or len(spec.hosts) > 1:
+            hosts = spec.hosts
+            if not hosts:
+                key = (frozenset(spec.datacenters or ()),
+                       frozenset(spec.clusters))
+                if key not in self._hosts:
+                    self._hosts[key] = [h.host for h in
+                                        self.client.vcenter.Host.list(
+                                            Host.FilterSpec(
+                                                datacenters=spec.datacenters,
+                                                clusters=spec.clusters))]
+                hosts = self._hosts[key]
+            return [_copy_spec(spec, hosts=set([h])) for h in hosts]
+        raise Exception('More than 4000 vms match a single host and power '
+                        'state: {}'.format(spec))
+
+
+def _copy_spec(spec, **changes):
+    fields = dict((name, getattr(spec, name)) for name in FILTER_SPEC_FIELDS)
+    fields.update(changes)
+    return VM.FilterSpec(**fields)
@@ -16,29 +16,27 @@ __vcenter_version__ = '6.5+'
 
 from com.vmware.vcenter_client import VM
 
-from samples.vsphere.vcenter.helper import datastore_helper
-from samples.vsphere.vcenter.helper import folder_helper
-from samples.vsphere.vcenter.helper import resource_pool_helper
+from samples.vsphere.vcenter.helper.name_resolver import NameResolver
 
 
 def get_placement_spec_for_resource_pool(client,
                                          datacenter_name,
                                          vm_folder_name,
-                                         datastore_name):
+                                         datastore_name,
+                                         resolver=None):
     """
     Returns a VM placement spec for a resourcepool. Ensures that the
     vm folder and datastore are all in the same datacenter which is specified.
+    The names are resolved together through a NameResolver; pass one in to
+    share its memoized results across many placement specs.
     """
-    resource_pool = resource_pool_helper.get_resource_pool(client,
-                                                           datacenter_name)
-
-    folder = folder_helper.get_folder(client,
-                                      datacenter_name,
-                                      vm_folder_name)
-
-    datastore = datastore_helper.get_datastore(client,
-                                               datacenter_name,
-                                               datastore_name)
+    resolver = resolver or NameResolver(client)
+    ids = resolver.resolve([('resource_pool', datacenter_name, None),
+                            ('folder', datacenter_name, vm_folder_name),
+                            ('datastore', datacenter_name, datastore_name)])
+    resource_pool = ids[('resource_pool', datacenter_name, None)]
+    folder = ids[('folder', datacenter_name, vm_folder_name)]
+    datastore = ids[('datastore', datacenter_name, datastore_name)]
 
     # Create the vm placement spec with the datastore, resource pool and vm
     # folder
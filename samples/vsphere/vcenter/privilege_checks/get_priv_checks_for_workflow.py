@@ -16,10 +16,7 @@
 __author__ = 'VMware, Inc.'
 __vcenter_version__ = '8.0u1+'
 
-import urllib.request
-import concurrent.futures
 import asyncio
-import requests
 import logging
 import sys
 import ssl
@@ -31,9 +28,7 @@ from pyVmomi import vim, VmomiSupport
 from samples.vsphere.common import sample_cli
 from samples.vsphere.common import sample_util
 from samples.vsphere.common.ssl_helper import get_unverified_session
-from six.moves import http_client, urllib
-from os import path
-from time import sleep
+from samples.vsphere.common.vim.ovf_import import OvfImporter
 
 """
 Creates a virtual machine from an ovf template
@@ -105,8 +100,7 @@ class OvfDeployer:
                                user=args.username,
                                pwd=args.password,
                                sslContext=self.context)
-        self.base_url = path.dirname(args.ovf_url)
-        self.ovf_content = self.get_ovf_content(args.ovf_url)
+        self.ovf_url = args.ovf_url
         self.container_view = None
         self.host = vim.HostSystem(args.host_moId, self.si._stub)
         self.datacenter = self.get_datacenter(args)
@@ -126,11 +120,22 @@ class OvfDeployer:
                              "0")
 
     async def deploy(self):
-        import_spec = self.create_import_spec()
-        lease = self.import_vapp(import_spec)
-        await self.upload_files(lease, import_spec.fileItem)
-        lease.Progress(100)
-        lease.Complete()
+        importSpecParams = vim.OvfManager.CreateImportSpecParams(
+            ipAllocationPolicy='dhcpPolicy',
+            ipProtocol='IPv4',
+            diskProvisioning='thin',
+            entityName=self.vm_name)
+        importer = OvfImporter(self.si.content,
+                               verify=self.context is None)
+        # Runs on this thread, which carries the opId of the vim calls
+        try:
+            vm, stats = importer.import_package(
+                self.ovf_url, self.resource_pool, self.datacenter.vmFolder,
+                host=self.host, datastore=self.datastore,
+                spec_params=importSpecParams, nfc_host=self.host.name)
+        finally:
+            importer.close()
+        self.logger.info('Deployed %s at %.2f MB/s' % (vm, stats.throughput))
 
     def set_vpxd_option(self, si, key, val):
         optionVal = vim.option.OptionValue()
@@ -140,65 +145,6 @@ class OvfDeployer:
         om = si.content.setting
         om.UpdateValues(optionVals)
 
-    def get_ovf_content(self, ovf_url):
-        return urllib.request.urlopen(ovf_url).read()
-
-    def create_import_spec(self):
-        importSpecParams = vim.OvfManager.CreateImportSpecParams(
-            ipAllocationPolicy='dhcpPolicy',
-            ipProtocol='IPv4',
-            diskProvisioning='thin',
-            entityName=self.vm_name)
-        spec = self.si.content.ovfManager.CreateImportSpec(
-            ovfDescriptor=self.ovf_content.decode(),
-            resourcePool=self.resource_pool,
-            datastore=self.datastore,
-            cisp=importSpecParams)
-        return spec
-
-    def import_vapp(self, import_spec):
-        lease = self.resource_pool.ImportVApp(import_spec.importSpec,
-                                              self.datacenter.vmFolder,
-                                              self.host)
-        while lease.state == vim.HttpNfcLease.State.initializing:
-            sleep(1)
-
-        assert lease.state == vim.HttpNfcLease.State.ready
-        return lease
-
-    async def upload_files(self, lease, file_items):
-        upload_map = {}
-        for device_url in lease.info.deviceUrl:
-            upload_map[device_url.importKey] = [device_url.key, device_url.url]
-
-        loop = asyncio.get_event_loop()
-        upload_tasks = []
-        with concurrent.futures.ThreadPoolExecutor() as pool:
-            for file_item in file_items:
-                _, dst_url = upload_map[file_item.deviceId]
-                upload_tasks.append(
-                    loop.run_in_executor(pool, self.upload_file,
-                                         *[file_item, dst_url]))
-            await asyncio.wait(upload_tasks, return_when=asyncio.ALL_COMPLETED,
-                               timeout=2 * 60 * 60)
-
-    def upload_file(self, file_item, dst_url):
-        src_url = "{}/{}".format(self.base_url, file_item.path)
-        src_req = requests.get(src_url, verify=False, stream=True)
-        assert src_req.ok
-        parsed_url = urllib.parse.urlparse(dst_url)
-        dst_req = http_client.HTTPSConnection(self.host.name,
-                                              context=self.context)
-        request_type = "PUT" if file_item.create else "POST"
-        dst_req.putrequest(request_type, parsed_url.path)
-        dst_req.putheader('Content-Length', file_item.size)
-        dst_req.endheaders()
-        chunk = min(64 * 1024, file_item.size)
-        for content_chunk in src_req.iter_content(chunk_size=chunk):
-            dst_req.send(content_chunk)
-        dst_req.close()
-        src_req.close()
-
     async def _wait_for_task(self, task):
         state = task.info.state
         error = task.info.error
@@ -69,6 +69,19 @@ def cleanup_datacenters(context):
         context.client.vcenter.Datacenter.delete(datacenter, force=True)
 
 
+def create_datacenter(context, datacenter_name, folder=None):
+    """Create a datacenter and save its identifier"""
+    if folder is None:
+        folder = folder_list_datacenter_folder(context)[0].folder
+    datacenter = context.client.vcenter.Datacenter.create(
+        Datacenter.CreateSpec(name=datacenter_name, folder=folder)
+    )
+    print("Created Datacenter '{}' ({})".format(datacenter, datacenter_name))
+    context.testbed.entities.setdefault('DATACENTER_IDS', {})[
+        datacenter_name] = datacenter
+    return datacenter
+
+
 def setup_datacenters(context):
     """Create datacenters for running vcenter samples"""
     # Find a Folder in which to put the Datacenters
@@ -77,25 +90,12 @@ def setup_datacenters(context):
     print("Creating datacenters in Folder '{}' ({})".
           format(folder, folder_summaries[0].name))
 
-    # Create first datacenter
-    datacenter1_name = context.testbed.config['DATACENTER1_NAME']
-    datacenter1 = context.client.vcenter.Datacenter.create(
-        Datacenter.CreateSpec(name=datacenter1_name, folder=folder)
-    )
-    print("Created Datacenter '{}' ({})".format(datacenter1, datacenter1_name))
-
-    # Create second datacenter
-    datacenter2_name = context.testbed.config['DATACENTER2_NAME']
-    datacenter2 = context.client.vcenter.Datacenter.create(
-        Datacenter.CreateSpec(name=datacenter2_name, folder=folder)
-    )
-    print("Created Datacenter '{}' ({})".format(datacenter2, datacenter2_name))
-
     # Save datacenter name to identifier mappings for later use
-    context.testbed.entities['DATACENTER_IDS'] = {
-        datacenter1_name: datacenter1,
-        datacenter2_name: datacenter2
-    }
+    context.testbed.entities['DATACENTER_IDS'] = {}
+    create_datacenter(context, context.testbed.config['DATACENTER1_NAME'],
+                      folder)
+    create_datacenter(context, context.testbed.config['DATACENTER2_NAME'],
+                      folder)
 
 
 def cleanup(context):
@@ -88,16 +88,17 @@ def cleanup_nfs_datastore(context):
 
 def setup_nfs_datastore(context):
     """Setup NFS datastore for running vcenter samples"""
-    host1_name = context.testbed.config['ESX_HOST1']
-    nfs_datastore1 = setup_nfs_datastore_on_host(context, host1_name)
+    context.testbed.entities['HOST_NFS_DATASTORE_IDS'] = {}
+    setup_host_nfs_datastore(context, context.testbed.config['ESX_HOST1'])
+    setup_host_nfs_datastore(context, context.testbed.config['ESX_HOST2'])
 
-    host2_name = context.testbed.config['ESX_HOST2']
-    nfs_datastore2 = setup_nfs_datastore_on_host(context, host2_name)
 
-    context.testbed.entities['HOST_NFS_DATASTORE_IDS'] = {
-        host1_name: nfs_datastore1,
-        host2_name: nfs_datastore2
-    }
+def setup_host_nfs_datastore(context, host_name):
+    """Mount the NFS volume on one ESX host and save its identifier"""
+    datastore = setup_nfs_datastore_on_host(context, host_name)
+    context.testbed.entities.setdefault('HOST_NFS_DATASTORE_IDS', {})[
+        host_name] = datastore
+    return datastore
 
 
 def setup_nfs_datastore_on_host(context, host_name):
@@ -193,8 +194,6 @@ def detect_vmfs_datastores(context):
 
 def setup_vmfs_datastore(context, host_name, datastore_name):
     """Find VMFS datastore given host and datastore names"""
-    context.testbed.entities['HOST_VMFS_DATASTORE_IDS'] = {}
-
     names = set([host_name])
 
     # Use vAPI find the Host managed identities
@@ -215,8 +214,8 @@ def setup_vmfs_datastore(context, host_name, datastore_name):
         datastore = vmfs_datastores[datastore_name]._moId
         print("Detected VMFS Volume '{}' as {} on Host '{}' ({})".
               format(datastore_name, datastore, host_name, host))
-        context.testbed.entities['HOST_VMFS_DATASTORE_IDS'][host_name] \
-            = datastore
+        context.testbed.entities.setdefault('HOST_VMFS_DATASTORE_IDS', {})[
+            host_name] = datastore
         return True
 
     # Rename a VMFS datastore
@@ -242,6 +241,7 @@ def setup_vmfs_datastores(context):
     host2_vmfs_volume = context.testbed.config['ESX_HOST2_VMFS_DATASTORE']
 
     # From each host, look for the VMFS Volume
+    context.testbed.entities['HOST_VMFS_DATASTORE_IDS'] = {}
     setup_vmfs_datastore(context, host1_name, host1_vmfs_volume)
     setup_vmfs_datastore(context, host2_name, host2_vmfs_volume)
 
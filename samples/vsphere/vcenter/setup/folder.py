@@ -95,20 +95,21 @@ def cleanup_vm_folders(context):
     delete_vm_folder(context, datacenter2_name, folder2_name)
 
 
-def setup_vm_folders(context):
-    """Setup vm folder used to run vcenter samples"""
-    folder1_name = context.testbed.config['VM_FOLDER1_NAME']
-    datacenter1_name = context.testbed.config['DATACENTER1_NAME']
-    folder1 = create_vm_folder(context, datacenter1_name, folder1_name)
+def setup_vm_folder(context, datacenter_name, folder_name):
+    """Create vm folder in given datacenter and save its identifier"""
+    folder = create_vm_folder(context, datacenter_name, folder_name)
+    context.testbed.entities.setdefault('VM_FOLDER_IDS', {})[folder_name] = \
+        folder
+    return folder
 
-    folder2_name = context.testbed.config['VM_FOLDER2_NAME']
-    datacenter2_name = context.testbed.config['DATACENTER2_NAME']
-    folder2 = create_vm_folder(context, datacenter2_name, folder2_name)
 
-    context.testbed.entities['VM_FOLDER_IDS'] = {
-        folder1_name: folder1,
-        folder2_name: folder2,
-    }
+def setup_vm_folders(context):
+    """Setup vm folder used to run vcenter samples"""
+    context.testbed.entities['VM_FOLDER_IDS'] = {}
+    setup_vm_folder(context, context.testbed.config['DATACENTER1_NAME'],
+                    context.testbed.config['VM_FOLDER1_NAME'])
+    setup_vm_folder(context, context.testbed.config['DATACENTER2_NAME'],
+                    context.testbed.config['VM_FOLDER2_NAME'])
 
 
 def setup(context):
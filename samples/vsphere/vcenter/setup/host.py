@@ -148,48 +148,38 @@ def move_host_into_cluster_vim(context, host_name, cluster_name):
     print("Host '{}' ({}) out of maintenance mode".format(host, host_name))
 
 
-def setup_hosts_vapi(context):
-    """Use vsphere automation API to setup host for sample run"""
+def setup_host(context, host_name, datacenter_name, create=create_host_vapi):
+    """Add a Host to the named Datacenter and save its identifier"""
+    host = create(context, host_name, datacenter_name)
+    context.testbed.entities.setdefault('HOST_IDS', {})[host_name] = host
+    return host
+
+
+def _setup_hosts(context, create):
+    context.testbed.entities['HOST_IDS'] = {}
+
     # Create Host1 as a standalone host in Datacenter1
-    host1_name = context.testbed.config['ESX_HOST1']
-    datacenter1_name = context.testbed.config['DATACENTER1_NAME']
-    host1 = create_host_vapi(context, host1_name, datacenter1_name)
+    setup_host(context, context.testbed.config['ESX_HOST1'],
+               context.testbed.config['DATACENTER1_NAME'], create)
 
     # Create Host2 in a Cluster2
     host2_name = context.testbed.config['ESX_HOST2']
-    datacenter2_name = context.testbed.config['DATACENTER2_NAME']
-    host2 = create_host_vapi(context, host2_name, datacenter2_name)
-
-    context.testbed.entities['HOST_IDS'] = {
-        host1_name: host1,
-        host2_name: host2
-    }
+    setup_host(context, host2_name,
+               context.testbed.config['DATACENTER2_NAME'], create)
 
     # Move Host2 into Cluster2
     cluster_name = context.testbed.config['CLUSTER1_NAME']
     move_host_into_cluster_vim(context, host2_name, cluster_name)
 
 
-def setup_hosts_vim(context):
-    """Use vim API to setup host for sample run"""
-    # Create Host1 as a standalone host in Datacenter1
-    host1_name = context.testbed.config['ESX_HOST1']
-    datacenter1_name = context.testbed.config['DATACENTER1_NAME']
-    host1 = create_host_vim(context, host1_name, datacenter1_name)
-
-    # Create Host2 in a Cluster2
-    host2_name = context.testbed.config['ESX_HOST2']
-    datacenter2_name = context.testbed.config['DATACENTER2_NAME']
-    host2 = create_host_vim(context, host2_name, datacenter2_name)
+def setup_hosts_vapi(context):
+    """Use vsphere automation API to setup host for sample run"""
+    _setup_hosts(context, create_host_vapi)
 
-    context.testbed.entities['HOST_IDS'] = {
-        host1_name: host1,
-        host2_name: host2
-    }
 
-    # Move Host2 into Cluster2
-    cluster_name = context.testbed.config['CLUSTER1_NAME']
-    move_host_into_cluster_vim(context, host2_name, cluster_name)
+def setup_hosts_vim(context):
+    """Use vim API to setup host for sample run"""
+    _setup_hosts(context, create_host_vim)
 
 
 def setup_hosts(context):
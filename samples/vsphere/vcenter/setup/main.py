@@ -82,6 +82,7 @@ context.option['DO_SAMPLES'] = args.samples
 context.option['DO_SAMPLES_INCREMENTAL'] = args.samples_incremental
 context.option['DO_SAMPLES_CLEANUP'] = args.samples_cleanup
 context.option['SKIP_VERIFICATION'] = args.skipverification
+context.option['TESTBED_WORKERS'] = args.testbed_workers
 print(context.to_option_string())
 
 ###############################################################################
@@ -42,6 +42,7 @@ def build_arg_parser():
     -e2, --esxhost2
     -epass, --esxpassword
     -n,  --nfsserver
+    -w, --testbed_workers
 
     """
     parser = argparse.ArgumentParser(
@@ -116,4 +117,11 @@ def build_arg_parser():
                         action='store',
                         help='NFS Server IP to setup datastore for samples run.'
                              'If not passed as argument, update testbed.py file')
+
+    parser.add_argument('-w', '--testbed_workers',
+                        action='store',
+                        type=int,
+                        default=8,
+                        help='Number of testbed setup, validate and cleanup '
+                             'steps to run concurrently. ')
     return parser
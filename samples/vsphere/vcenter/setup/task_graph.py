@@ -0,0 +1,179 @@
+"""
+* *******************************************************
+* Copyright (c) 2024 Broadcom. All Rights Reserved.
+* SPDX-License-Identifier: MIT
+* *******************************************************
+*
+* DISCLAIMER. THIS PROGRAM IS PROVIDED TO YOU "AS IS" WITHOUT
+* WARRANTIES OR CONDITIONS OF ANY KIND, WHETHER ORAL OR WRITTEN,
+* EXPRESS OR IMPLIED. THE AUTHOR SPECIFICALLY DISCLAIMS ANY IMPLIED
+* WARRANTIES OR CONDITIONS OF MERCHANTABILITY, SATISFACTORY QUALITY,
+* NON-INFRINGEMENT AND FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+__author__ = 'Broadcom, Inc.'
+__copyright__ = 'Copyright (c) 2024 Broadcom. All Rights Reserved.'
+
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+MAX_WORKERS = 8
+
+
+class TaskGraphError(Exception):
+    """
+    Raised when one or more tasks of a graph failed
+    """
+
+    def __init__(self, message, errors):
+        Exception.__init__(self, message, errors)
+        self.errors = errors
+
+
+class Task(object):
+    """
+    One node of a TaskGraph and the timing of its run
+    """
+
+    def __init__(self, name, func, requires):
+        self.name = name
+        self.func = func
+        self.requires = requires
+        self.status = 'pending'
+        self.result = None
+        self.error = None
+        self.started = None
+        self.finished = None
+
+    @property
+    def seconds(self):
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+
+class TaskGraph(object):
+    """
+    Runs named tasks as soon as the tasks they require have completed.
+
+    Tasks can only require tasks added before them, so the graph cannot
+    contain cycles. Tasks whose requirements are all done run concurrently
+    on a pool of max_workers threads. When a task fails the tasks depending
+    on it are skipped while the independent branches still run to the end.
+    """
+
+    def __init__(self, name, max_workers=MAX_WORKERS):
+        self.name = name
+        self.max_workers = max_workers
+        self.tasks = {}
+        self._order = []
+        self._started = None
+        self._finished = None
+
+    def add(self, name, func, requires=()):
+        """
+        Add a task calling func() once all tasks named in requires are done.
+        """
+        if name in self.tasks:
+            raise ValueError("Task '{}' already added".format(name))
+        for required in requires:
+            if required not in self.tasks:
+                raise ValueError("Task '{}' requires unknown task '{}'".
+                                 format(name, required))
+        self.tasks[name] = Task(name, func, tuple(requires))
+        self._order.append(name)
+
+    def run(self):
+        """
+        Run all tasks and print the timing report. Returns a dict of task
+        name to result, or raises TaskGraphError if any task failed.
+        """
+        self._started = time.time()
+        running = {}
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            while True:
+                for task in self._ready():
+                    task.status = 'running'
+                    running[executor.submit(self._run_task, task)] = task
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del running[future]
+        self._finished = time.time()
+        self.report()
+
+        errors = [(t.name, t.error) for t in self._tasks() if t.error]
+        if errors:
+            raise TaskGraphError('{}: {} of {} tasks failed'.format(
+                self.name, len(errors), len(self.tasks)), errors)
+        return dict((t.name, t.result) for t in self._tasks())
+
+    def _tasks(self):
+        return [self.tasks[name] for name in self._order]
+
+    def _ready(self):
+        # Tasks come after the tasks they require, so a skip propagates to
+        # all dependents in this single pass
+        ready = []
+        for task in self._tasks():
+            if task.status != 'pending':
+                continue
+            states = [self.tasks[r].status for r in task.requires]
+            if any(s in ('failed', 'skipped') for s in states):
+                task.status = 'skipped'
+            elif all(s == 'done' for s in states):
+                ready.append(task)
+        return ready
+
+    def _run_task(self, task):
+        task.started = time.time()
+        try:
+            task.result = task.func()
+            task.status = 'done'
+        except Exception as e:
+            task.error = e
+            task.status = 'failed'
+            print("Task '{}' failed: {}".format(task.name, e))
+        finally:
+            task.finished = time.time()
+
+    def critical_path(self):
+        """
+        Return the chain of tasks that determined the total run time, from
+        the first task to the last one to finish.
+        """
+        finished = [t for t in self._tasks() if t.finished is not None]
+        if not finished:
+            return []
+        task = max(finished, key=lambda t: t.finished)
+        path = [task]
+        while True:
+            requires = [self.tasks[r] for r in task.requires
+                        if self.tasks[r].finished is not None]
+            if not requires:
+                break
+            task = max(requires, key=lambda t: t.finished)
+            path.append(task)
+        return list(reversed(path))
+
+    def report(self):
+        """
+        Print start offset, duration and status of every task.
+        """
+        total = (self._finished or time.time()) - self._started
+        print('{} timing ({:.1f}s wall clock, {:.1f}s of task time)'.format(
+            self.name, total, sum(t.seconds for t in self._tasks())))
+        print('  {:<40} {:>8} {:>8}  {}'.format('Task', 'Start', 'Seconds',
+                                                'Status'))
+        tasks = sorted(self._tasks(),
+                       key=lambda t: (t.started is None, t.started))
+        for task in tasks:
+            start = '' if task.started is None else \
+                '{:.1f}'.format(task.started - self._started)
+            print('  {:<40} {:>8} {:>8.1f}  {}'.format(
+                task.name, start, task.seconds, task.status))
+        path = self.critical_path()
+        if path:
+            print('  Critical path: {}'.format(
+                ' -> '.join(t.name for t in path)))
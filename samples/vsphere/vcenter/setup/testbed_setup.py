@@ -14,6 +14,8 @@
 __author__ = 'VMware, Inc.'
 __copyright__ = 'Copyright 2016 VMware, Inc. All rights reserved.'
 
+from functools import partial
+
 import samples.vsphere.vcenter.setup.backend_directory as backend_directory
 import samples.vsphere.vcenter.setup.cluster as cluster
 import samples.vsphere.vcenter.setup.datacenter as datacenter
@@ -23,6 +25,8 @@ import samples.vsphere.vcenter.setup.folder as folder
 import samples.vsphere.vcenter.setup.host as host
 import samples.vsphere.vcenter.setup.iso_image as iso_image
 import samples.vsphere.vcenter.setup.network as network
+from samples.vsphere.vcenter.setup.task_graph import (MAX_WORKERS, TaskGraph,
+                                                      TaskGraphError)
 
 """
 Setup Simple Testbed: Which provides the prerequisites for using the VM API
@@ -62,47 +66,126 @@ Inputs:
 """
 
 
+# Testbed modules and the modules whose entities they need. Validate runs
+# them in this order and cleanup in the reverse order, each as soon as the
+# modules it waits for are done.
+MODULES = [
+    ('datacenter', datacenter, ()),
+    ('folder', folder, ('datacenter',)),
+    ('cluster', cluster, ('datacenter',)),
+    ('host', host, ('datacenter', 'cluster')),
+    ('datastore', datastore, ('host',)),
+    ('network', network, ('host',)),
+    ('backend_directory', backend_directory, ('datastore',)),
+    ('iso_image', iso_image, ('backend_directory',)),
+    ('floppy_image', floppy_image, ('backend_directory',)),
+]
+
+
+def _workers(context):
+    return context.option.get('TESTBED_WORKERS') or MAX_WORKERS
+
+
 def setup(context):
     print('Setup Testbed Start')
-    datacenter.setup(context)
-    folder.setup(context)
-    cluster.setup(context)
-    host.setup(context)
-    datastore.setup(context)
-    network.setup(context)
-    backend_directory.setup(context)
-    iso_image.setup(context)
-    floppy_image.setup(context)
+    config = context.testbed.config
+    datacenter1_name = config['DATACENTER1_NAME']
+    datacenter2_name = config['DATACENTER2_NAME']
+    host1_name = config['ESX_HOST1']
+    host2_name = config['ESX_HOST2']
+
+    # Steps working on different datacenters and hosts run concurrently and
+    # add their own entries to these
+    for key in ('DATACENTER_IDS', 'VM_FOLDER_IDS', 'HOST_IDS',
+                'HOST_NFS_DATASTORE_IDS', 'HOST_VMFS_DATASTORE_IDS'):
+        context.testbed.entities[key] = {}
+
+    graph = TaskGraph('Setup Testbed', _workers(context))
+    for datacenter_name in (datacenter1_name, datacenter2_name):
+        graph.add('datacenter ' + datacenter_name,
+                  partial(datacenter.create_datacenter, context,
+                          datacenter_name))
+    for datacenter_name, folder_name in (
+            (datacenter1_name, config['VM_FOLDER1_NAME']),
+            (datacenter2_name, config['VM_FOLDER2_NAME'])):
+        graph.add('folder ' + folder_name,
+                  partial(folder.setup_vm_folder, context, datacenter_name,
+                          folder_name),
+                  requires=['datacenter ' + datacenter_name])
+    graph.add('cluster', partial(cluster.setup, context),
+              requires=['datacenter ' + datacenter2_name])
+
+    # Host2 is moved into the cluster before anything else is done with it
+    graph.add('host ' + host1_name,
+              partial(host.setup_host, context, host1_name, datacenter1_name),
+              requires=['datacenter ' + datacenter1_name])
+    graph.add('host ' + host2_name,
+              partial(host.setup_host, context, host2_name, datacenter2_name),
+              requires=['datacenter ' + datacenter2_name])
+    graph.add('cluster host ' + host2_name,
+              partial(host.move_host_into_cluster_vim, context, host2_name,
+                      config['CLUSTER1_NAME']),
+              requires=['host ' + host2_name, 'cluster'])
+    host_ready = {
+        host1_name: 'host ' + host1_name,
+        host2_name: 'cluster host ' + host2_name,
+    }
+
+    for host_name, vmfs_volume in (
+            (host1_name, config['ESX_HOST1_VMFS_DATASTORE']),
+            (host2_name, config['ESX_HOST2_VMFS_DATASTORE'])):
+        graph.add('nfs datastore ' + host_name,
+                  partial(datastore.setup_host_nfs_datastore, context,
+                          host_name),
+                  requires=[host_ready[host_name]])
+        graph.add('vmfs datastore ' + host_name,
+                  partial(datastore.setup_vmfs_datastore, context, host_name,
+                          vmfs_volume),
+                  requires=[host_ready[host_name]])
+    graph.add('network', partial(network.setup, context),
+              requires=[host_ready[host2_name]])
+
+    # The sample backends live on the NFS volume of the vm datacenter
+    graph.add('backend_directory', partial(backend_directory.setup, context),
+              requires=['nfs datastore ' + host1_name,
+                        'nfs datastore ' + host2_name])
+    graph.add('iso_image', partial(iso_image.setup, context),
+              requires=['backend_directory'])
+    graph.add('floppy_image', partial(floppy_image.setup, context),
+              requires=['backend_directory'])
+
+    graph.run()
     print('Setup Testbed Complete\n')
 
 
-def cleanup(context):
-    print('Cleanup Testbed Start')
-    floppy_image.cleanup(context)
+def _cleanup_iso_image(context):
     if context.option['DO_TESTBED_ISO_CLEANUP']:
         iso_image.cleanup(context)
-    backend_directory.cleanup(context)
-    network.cleanup(context)
-    datastore.cleanup(context)
-    host.cleanup(context)
-    cluster.cleanup(context)
-    folder.cleanup(context)
-    datacenter.cleanup(context)
+
+
+def cleanup(context):
+    print('Cleanup Testbed Start')
+    graph = TaskGraph('Cleanup Testbed', _workers(context))
+    for name, module, _ in reversed(MODULES):
+        func = module.cleanup if module is not iso_image \
+            else _cleanup_iso_image
+        # A module is cleaned up after all modules that needed it
+        graph.add(name, partial(func, context),
+                  requires=[n for n, _, requires in MODULES
+                            if name in requires])
+    graph.run()
     print('Cleanup Testbed Complete\n')
 
 
 def validate(context):
     print('Validating and Detecting Resources in Testbed')
-    r = (datacenter.validate(context) and
-         folder.validate(context) and
-         cluster.validate(context) and
-         host.validate(context) and
-         datastore.validate(context) and
-         network.validate(context) and
-         backend_directory.validate(context) and
-         iso_image.validate(context) and
-         floppy_image.validate(context)
-         )
+    graph = TaskGraph('Validate Testbed', _workers(context))
+    for name, module, requires in MODULES:
+        graph.add(name, partial(module.validate, context), requires=requires)
+    try:
+        r = all(graph.run().values())
+    except TaskGraphError:
+        r = False
     if r:
         print('==> Testbed validated')
         return True
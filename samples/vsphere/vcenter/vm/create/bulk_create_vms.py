@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+
+"""
+* *******************************************************
+* Copyright (c) 2024 Broadcom. All Rights Reserved.
+* SPDX-License-Identifier: MIT
+* *******************************************************
+*
+* DISCLAIMER. THIS PROGRAM IS PROVIDED TO YOU "AS IS" WITHOUT
+* WARRANTIES OR CONDITIONS OF ANY KIND, WHETHER ORAL OR WRITTEN,
+* EXPRESS OR IMPLIED. THE AUTHOR SPECIFICALLY DISCLAIMS ANY IMPLIED
+* WARRANTIES OR CONDITIONS OF MERCHANTABILITY, SATISFACTORY QUALITY,
+* NON-INFRINGEMENT AND FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+__author__ = 'Broadcom, Inc.'
+__copyright__ = 'Copyright (c) 2024 Broadcom. All Rights Reserved.'
+__vcenter_version__ = '6.5+'
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from com.vmware.vapi.std.errors_client import (AlreadyExists, ResourceBusy,
+                                               ServiceUnavailable, TimedOut,
+                                               UnableToAllocateResource)
+from com.vmware.vcenter.vm.hardware_client import (Disk, Ethernet,
+                                                   ScsiAddressSpec)
+from com.vmware.vcenter.vm_client import Power
+from com.vmware.vcenter_client import VM
+from vmware.vapi.vsphere.client import create_vsphere_client
+
+from samples.vsphere.common import sample_cli
+from samples.vsphere.common import sample_util
+from samples.vsphere.common.ssl_helper import get_unverified_session
+from samples.vsphere.vcenter.helper.name_resolver import NameResolver
+from samples.vsphere.vcenter.helper.vm_helper import iter_vms
+from samples.vsphere.vcenter.setup import testbed
+
+# Errors after which the create is tried again
+TRANSIENT_ERRORS = (ResourceBusy, ServiceUnavailable, TimedOut,
+                    UnableToAllocateResource)
+
+
+class VMSpec(object):
+    """
+    Name, placement and hardware of one vm to provision. Networks are
+    (portgroup name, Ethernet.BackingType) pairs. Without a host the vm is
+    placed in the resource pool, or the first resource pool of the
+    datacenter.
+    """
+
+    def __init__(self, name, datacenter_name, vm_folder_name, datastore_name,
+                 resource_pool_name=None, host_name=None, networks=(),
+                 guest_os=None, disks=1):
+        self.name = name
+        self.datacenter_name = datacenter_name
+        self.vm_folder_name = vm_folder_name
+        self.datastore_name = datastore_name
+        self.resource_pool_name = resource_pool_name
+        self.host_name = host_name
+        self.networks = list(networks)
+        self.guest_os = guest_os
+        self.disks = disks
+
+
+class ProvisionResult(object):
+    """
+    Outcome of provisioning one vm.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.vm = None
+        self.attempts = 0
+        self.seconds = 0.0
+        self.error = None
+
+    def __repr__(self):
+        if self.error is not None:
+            return "{}: failed after {} attempts: {}".format(
+                self.name, self.attempts, self.error)
+        return "{} ({}): {:.1f}s, {} attempts".format(
+            self.name, self.vm, self.seconds, self.attempts)
+
+
+class BulkVMProvisioner(object):
+    """
+    Creates many vms from VMSpecs.
+
+    Placement and network names are resolved once for all specs through a
+    NameResolver. The creates run on a bounded pool of workers, with at most
+    per_host_limit concurrent creates on one host (or resource pool, when
+    DRS picks the host) and per_datastore_limit on one datastore. Transient
+    failures are retried with backoff.
+    """
+
+    def __init__(self, client, max_workers=16, per_host_limit=4,
+                 per_datastore_limit=8, retries=3, resolver=None):
+        self.client = client
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.per_datastore_limit = per_datastore_limit
+        self.retries = retries
+        self.resolver = resolver or NameResolver(client)
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def run(self, specs):
+        """
+        Provision all specs and return their ProvisionResults in order.
+        """
+        start = time.time()
+        ids = self.resolver.resolve(self._requests(specs))
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            results = list(executor.map(
+                lambda spec: self._provision(spec, ids), specs))
+        elapsed = time.time() - start
+
+        created = [r for r in results if r.error is None]
+        print("Provisioned {} of {} VMs in {:.1f}s ({:.1f} VMs per minute)".
+              format(len(created), len(results), elapsed,
+                     len(created) * 60.0 / elapsed if elapsed else 0.0))
+        if created:
+            latencies = sorted(r.seconds for r in created)
+            print("Create latency: min {:.1f}s, median {:.1f}s, max {:.1f}s".
+                  format(latencies[0], latencies[len(latencies) // 2],
+                         latencies[-1]))
+        for result in results:
+            if result.error is not None:
+                print(result)
+        return results
+
+    def _requests(self, specs):
+        requests = set()
+        for spec in specs:
+            dc = spec.datacenter_name
+            requests.add(('folder', dc, spec.vm_folder_name))
+            requests.add(('datastore', dc, spec.datastore_name))
+            if spec.host_name:
+                requests.add(('host', dc, spec.host_name))
+            else:
+                requests.add(('resource_pool', dc, spec.resource_pool_name))
+            for network_name, _ in spec.networks:
+                requests.add(('network', dc, network_name))
+        return requests
+
+    def _create_spec(self, spec, ids):
+        dc = spec.datacenter_name
+        placement = VM.PlacementSpec(
+            folder=ids[('folder', dc, spec.vm_folder_name)],
+            datastore=ids[('datastore', dc, spec.datastore_name)])
+        if spec.host_name:
+            placement.host = ids[('host', dc, spec.host_name)]
+        else:
+            placement.resource_pool = \
+                ids[('resource_pool', dc, spec.resource_pool_name)]
+        missing = [name for name, value in
+                   (('folder', placement.folder),
+                    ('datastore', placement.datastore),
+                    ('host or resource pool',
+                     placement.host or placement.resource_pool))
+                   if value is None]
+        if missing:
+            raise Exception('Placement not found: {}'.format(
+                ', '.join(missing)))
+
+        disks = [Disk.CreateSpec(type=Disk.HostBusAdapterType.SCSI,
+                                 scsi=ScsiAddressSpec(bus=0, unit=0),
+                                 new_vmdk=Disk.VmdkCreateSpec())]
+        disks += [Disk.CreateSpec(new_vmdk=Disk.VmdkCreateSpec())
+                  for _ in range(spec.disks - 1)]
+        nics = [Ethernet.CreateSpec(
+            start_connected=True,
+            backing=Ethernet.BackingSpec(
+                type=backing_type,
+                network=ids[('network', dc, network_name)]))
+            for network_name, backing_type in spec.networks]
+        return VM.CreateSpec(name=spec.name, guest_os=spec.guest_os,
+                             placement=placement, disks=disks, nics=nics)
+
+    def _semaphore(self, key, limit):
+        with self._lock:
+            semaphore = self._semaphores.get(key)
+            if semaphore is None:
+                semaphore = self._semaphores[key] = \
+                    threading.BoundedSemaphore(limit)
+            return semaphore
+
+    def _provision(self, spec, ids):
+        result = ProvisionResult(spec.name)
+        try:
+            create_spec = self._create_spec(spec, ids)
+        except Exception as e:
+            result.error = e
+            return result
+        placement = create_spec.placement
+        # Always taken in this order, so workers cannot deadlock
+        datastore_slot = self._semaphore(('datastore', placement.datastore),
+                                         self.per_datastore_limit)
+        host_slot = self._semaphore(
+            ('host', placement.host or placement.resource_pool),
+            self.per_host_limit)
+
+        with datastore_slot, host_slot:
+            start = time.time()
+            for attempt in range(self.retries + 1):
+                result.attempts += 1
+                try:
+                    result.vm = self.client.vcenter.VM.create(create_spec)
+                    break
+                except AlreadyExists as e:
+                    # An earlier attempt may have succeeded on the server
+                    # even though the call failed
+                    if attempt > 0:
+                        result.vm = self._find(spec.name)
+                    if result.vm is None:
+                        result.error = e
+                    break
+                except TRANSIENT_ERRORS as e:
+                    if attempt == self.retries:
+                        result.error = e
+                        break
+                    time.sleep(min(2 ** attempt, 30))
+                except Exception as e:
+                    result.error = e
+                    break
+            result.seconds = time.time() - start
+        return result
+
+    def _find(self, name):
+        for summary in iter_vms(self.client, VM.FilterSpec(names=set([name]))):
+            return summary.vm
+        return None
+
+    def delete(self, names):
+        """
+        Power off and delete the named vms on the worker pool.
+        """
+        vms = list(iter_vms(self.client, VM.FilterSpec(names=set(names))))
+
+        def delete(summary):
+            if summary.power_state != Power.State.POWERED_OFF:
+                self.client.vcenter.vm.Power.stop(summary.vm)
+            self.client.vcenter.VM.delete(summary.vm)
+            print("Deleted VM '{}' ({})".format(summary.name, summary.vm))
+
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            list(executor.map(delete, vms))
+
+
+class BulkCreateVMs(object):
+    """
+    Demonstrates how to create many basic VMs concurrently.
+
+    Sample Prerequisites:
+        - datacenter
+        - vm folder
+        - datastore
+        - standard switch network
+    """
+
+    def __init__(self):
+        parser = sample_cli.build_arg_parser()
+        parser.add_argument('--count', type=int, default=10,
+                            help='Number of vms to create')
+        parser.add_argument('--prefix', default='Sample_Bulk_VM_',
+                            help='Name prefix of the vms')
+        parser.add_argument('--workers', type=int, default=16,
+                            help='Concurrent creates')
+        args = sample_util.process_cli_args(parser.parse_args())
+        self.cleardata = args.cleardata
+        session = get_unverified_session() if args.skipverification else None
+        self.client = create_vsphere_client(server=args.server,
+                                            username=args.username,
+                                            password=args.password,
+                                            session=session)
+        self.names = ['{}{}'.format(args.prefix, i)
+                      for i in range(args.count)]
+        self.provisioner = BulkVMProvisioner(self.client,
+                                             max_workers=args.workers)
+
+    def run(self):
+        specs = [VMSpec(name,
+                        testbed.config['VM_DATACENTER_NAME'],
+                        testbed.config['VM_FOLDER2_NAME'],
+                        testbed.config['VM_DATASTORE_NAME'],
+                        networks=[(testbed.config['STDPORTGROUP_NAME'],
+                                   Ethernet.BackingType.STANDARD_PORTGROUP)],
+                        guest_os=testbed.config['VM_GUESTOS'],
+                        disks=2)
+                 for name in self.names]
+        return self.provisioner.run(specs)
+
+    def cleanup(self):
+        self.provisioner.delete(self.names)
+
+
+def main():
+    bulk_create_vms = BulkCreateVMs()
+    bulk_create_vms.cleanup()
+    bulk_create_vms.run()
+    if bulk_create_vms.cleardata:
+        bulk_create_vms.cleanup()
+
+
+if __name__ == '__main__':
+    main()
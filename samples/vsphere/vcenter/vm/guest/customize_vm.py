@@ -23,12 +23,13 @@ from vmware.vapi.vsphere.client import create_vsphere_client
 from com.vmware.vapi.std.errors_client import NotFound
 from samples.vsphere.common.sample_cli import build_arg_parser
 from samples.vsphere.common.ssl_helper import get_unverified_session
+from samples.vsphere.common.vim.helpers.event_stream import EventStream
 from samples.vsphere.vcenter.helper.vm_helper import get_vm
 from pyVim.connect import (SmartConnect, Disconnect)
 from pyVmomi import vim
+from concurrent import futures
 import atexit
 import configparser
-import time
 import ssl
 
 # import CustomizationSpecManager from existing test case
@@ -91,49 +92,24 @@ class CustomizeVM(object):
         if not self.vm:
             raise Exception('Need an existing Linux vm with name ({}).'
                             'Please create the vm first.'.format(self.vm_name))
-        self.vmRef = self._getVmRef(vmName=self.vm_name)
-
-    def _getVmRef(self, vmName=None):
-        content = self.si.RetrieveContent()
-        for child in content.rootFolder.childEntity:
-            if hasattr(child, 'vmFolder'):
-                datacenter = child
-                vmFolder = datacenter.vmFolder
-                vmList = vmFolder.childEntity
-                for vm in vmList:
-                    if vm.name == vmName:
-                        return vm
-        raise Exception("Cannot find the vm with name: {0}".format(vmName))
-
-    def _findCustEvent(self, expectedEvent, tsBeforeQuery):
-        vm = self.vmRef
-        eventMgr = self.si.content.eventManager
-        recOpt = vim.event.EventFilterSpec.RecursionOption()
-        evtFilterEnt = \
-            vim.event.EventFilterSpec.ByEntity(entity=vm,
-                                               recursion=recOpt.self)
-        evtFilterTime = \
-            vim.event.EventFilterSpec.ByTime(beginTime=tsBeforeQuery)
-        eventFilterSpec = vim.event.EventFilterSpec(entity=evtFilterEnt,
-                                                    disableFullMessage=False,
-                                                    time=evtFilterTime)
-        eventList = eventMgr.QueryEvents(eventFilterSpec)
-        for event in eventList:
-            if type(event) == expectedEvent:
-                print('Find expected customization Event %s' % expectedEvent)
-                return True
-        print('Did not find expected customization event, waiting...')
+        self.vmRef = self._getVmRef()
+
+    def _getVmRef(self):
+        # The vAPI vm identifier is the moId of the VirtualMachine
+        return vim.VirtualMachine(self.vm, self.si._stub)
 
     def waitForCustEvent(self, expectedEvent, timeout):
         print('Waiting for customization event %s in %d seconds' %
               (expectedEvent, timeout))
-        tsBeforeQuery = self.si.CurrentTime()
-        timeout = time.time() + timeout
-        while time.time() < timeout:
-            if self._findCustEvent(expectedEvent, tsBeforeQuery):
-                return True
-            time.sleep(10)
-        raise Exception('Timeout to find expected customization event')
+        # One collector reads only the new events of the vm as they arrive
+        with EventStream(self.si.content, [expectedEvent],
+                         entity=self.vmRef) as stream:
+            try:
+                stream.wait_for(self.vmRef, [expectedEvent], timeout)
+            except futures.TimeoutError:
+                raise Exception('Timeout to find expected customization event')
+        print('Find expected customization Event %s' % expectedEvent)
+        return True
 
     def setVM(self):
         print("Test Step: Using VM '{}' ({}) for Customize test".
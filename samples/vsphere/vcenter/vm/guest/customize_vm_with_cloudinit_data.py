@@ -20,14 +20,14 @@ __vcenter_version__ = 'VCenter 7.0 U3'
 
 import atexit
 import os
-import time
 import ssl
+from concurrent import futures
 from com.vmware.vcenter.guest_client import CustomizationSpec, \
     CloudConfiguration, CloudinitConfiguration, ConfigurationSpec, \
     GlobalDNSSettings
 from samples.vsphere.common import sample_cli, sample_util
 from samples.vsphere.common.ssl_helper import get_unverified_session
-from samples.vsphere.common.vim.helpers.vim_utils import get_obj
+from samples.vsphere.common.vim.helpers.event_stream import EventStream
 from samples.vsphere.vcenter.helper.vm_helper import get_vm
 from pyVim.connect import (SmartConnect, Disconnect)
 from pyVmomi import vim
@@ -74,29 +74,11 @@ class CustomizeVMWithCloudinitData(object):
         if self.vm is None:
             raise Exception('Need an existing Linux vm with name ({}). Please '
                             'create the vm first.'.format(self.args.vm_name))
-        self.vmRef = self._getVmRef(vmName=self.args.vm_name)
+        self.vmRef = self._getVmRef()
 
-    def _getVmRef(self, vmName=None):
-        content = self.si.RetrieveContent()
-        return get_obj(content, [vim.VirtualMachine], vmName)
-
-    def _findCustEvent(self, expectedEvent, tsBeforeQuery):
-        eventMgr = self.si.content.eventManager
-        recOpt = vim.event.EventFilterSpec.RecursionOption()
-        evtFilterEnt = \
-            vim.event.EventFilterSpec.ByEntity(entity=self.vmRef,
-                                               recursion=recOpt.self)
-        evtFilterTime = \
-            vim.event.EventFilterSpec.ByTime(beginTime=tsBeforeQuery)
-        eventFilterSpec = vim.event.EventFilterSpec(entity=evtFilterEnt,
-                                                    disableFullMessage=False,
-                                                    time=evtFilterTime)
-        eventList = eventMgr.QueryEvents(eventFilterSpec)
-        for event in eventList:
-            if type(event) == expectedEvent:
-                print('Find expected customization Event %s' % expectedEvent)
-                return True
-        print('Did not find expected customization event, waiting...')
+    def _getVmRef(self):
+        # The vAPI vm identifier is the moId of the VirtualMachine
+        return vim.VirtualMachine(self.vm, self.si._stub)
 
     def createCloudinitDataSpec(self):
         """
@@ -143,13 +125,15 @@ class CustomizeVMWithCloudinitData(object):
     def waitForCustEvent(self, expectedEvent, timeout):
         print('Waiting for customization event {} in {} seconds'.
               format(expectedEvent, timeout))
-        currentTime = self.si.CurrentTime()
-        timeout = time.time() + timeout
-        while time.time() < timeout:
-            if self._findCustEvent(expectedEvent, currentTime):
-                return True
-            time.sleep(10)
-        raise Exception('Timeout to find expected customization event')
+        # One collector reads only the new events of the vm as they arrive
+        with EventStream(self.si.content, [expectedEvent],
+                         entity=self.vmRef) as stream:
+            try:
+                stream.wait_for(self.vmRef, [expectedEvent], timeout)
+            except futures.TimeoutError:
+                raise Exception('Timeout to find expected customization event')
+        print('Find expected customization Event {}'.format(expectedEvent))
+        return True
 
     def powerOnAndVerifyCustomizationResult(self):
         print('---power on VM {} and verify customization result---'.
@@ -16,8 +16,8 @@
 __author__ = 'VMware Inc.'
 __vcenter_version__ = 'VCenter 7.0 U2'
 
+import io
 import os
-import ssl
 import time
 
 from com.vmware.vcenter.vm.guest.filesystem_client import Transfers
@@ -27,17 +27,10 @@ from com.vmware.vcenter_client import VM
 from samples.vsphere.common import sample_cli
 from samples.vsphere.common import sample_util
 from samples.vsphere.common.ssl_helper import get_unverified_session
+from samples.vsphere.vcenter.helper.guest_file_transfer import \
+    GuestFileTransfer
 from vmware.vapi.vsphere.client import create_vsphere_client
 
-try:
-    # Python 3
-    from urllib.parse import urlparse
-    import http.client as httpclient
-except ImportError:
-    # Python 2
-    from urlparse import urlparse
-    import httplib as httpclient
-
 
 class GuestOps(object):
     """
@@ -66,13 +59,6 @@ class GuestOps(object):
                                     working_directory=dir,
                                     environment_variables=env)
 
-    # Create the Transfer.CreateSpec for the file transfer to/from the guest
-    def _create_transfer_spec(self,
-                              path,
-                              attributes=None):
-        return Transfers.CreateSpec(attributes=attributes,
-                                    path=path)
-
     # Create a FileAttributeCreateSpec for a generic (non-OS specific) guest
     def _fileAttributeCreateSpec_Plain(self,
                                        size,
@@ -84,60 +70,6 @@ class GuestOps(object):
                                                 last_modified=last_modified,
                                                 last_accessed=last_accessed)
 
-    # Create a FileAttributeCreateSpec for a linux (Posix) guest
-    def _fileAttributeCreateSpec_Linux(self,
-                                       size,
-                                       overwrite=None,
-                                       last_modified=None,
-                                       last_accessed=None,
-                                       owner_id=None,
-                                       group_id=None,
-                                       permissions=None):
-        posix = Transfers.PosixFileAttributesCreateSpec(owner_id=owner_id,
-                                                        group_id=group_id,
-                                                        permissions=permissions)
-        return Transfers.FileCreationAttributes(size,
-                                                overwrite=overwrite,
-                                                last_modified=last_modified,
-                                                last_accessed=last_accessed,
-                                                posix=posix)
-
-    def _download(self,
-                  url,
-                  expectedLen=None):
-        urloptions = urlparse(url)
-        # Skip server cert verification.
-        # This is not recommended in production code.
-        conn = httpclient.HTTPSConnection(urloptions.netloc,
-                                          context=ssl._create_unverified_context())
-
-        conn.request("GET", urloptions.path + "?" + urloptions.query)
-        res = conn.getresponse()
-        if res.status != 200:
-            print("GET request failed with errorcode : %s" % res.status)
-            raise HTTPError(res.status, res.reason)
-        body = res.read().decode()
-
-        return body
-
-    def _upload(self, url, body):
-        urloptions = urlparse(url)
-        conn = httpclient.HTTPSConnection(urloptions.netloc,
-                                          context=ssl._create_unverified_context())
-
-        headers = {"Content-Length": len(body)}
-        # Skip server cert verification.
-        # This is not recommended in production code.
-        conn.request("PUT", urloptions.path + "?" + urloptions.query,
-                     body,
-                     headers)
-        res = conn.getresponse()
-        if res.status != 200:
-            print("PUT request failed with errorcode : %s" % res.status)
-            raise HTTPError(res.status, res.reason)
-
-        return res
-
     def __init__(self):
         # Create argument parser for standard inputs:
         # server, username, password, cleanup and skipverification
@@ -206,81 +138,67 @@ class GuestOps(object):
         stderr = self.client.vcenter.vm.guest.filesystem.Files.create_temporary(
                    vm_id, creds, '', '.stderr', parent_path=tempDir)
 
-        # Step 4 - (Optional)  copy in the script to be run.
-        #          While optional, using this step to demo tranfer of a
-        #          file to a guest.
-        scriptPath = self.client.vcenter.vm.guest.filesystem.Files.create_temporary(
-                       vm_id, creds, '', '.sh', tempDir)
-
-        # Create script contents and transfer to the guest.
-        # TODO: Need generic pick up of script content
-        baseFN = os.path.basename(scriptPath)
-        script = ('#! /bin/bash\n'
-                  '#    ' +
-                  baseFN + '\n'
-                  '\n'
-                  'sleep 5    # Adding a little length to the process.\n'
-                  'ps -ef\n'
-                  'echo\n'
-                  'rpm -qa | sort\n'
-                  '\n')
-        print(script)
-        attr = self._fileAttributeCreateSpec_Linux(size=len(script),
-                                                   overwrite=True,
-                                                   permissions='0755')
-        spec = self._create_transfer_spec(path=scriptPath,
-                                          attributes=attr)
-        toURL = self.client.vcenter.vm.guest.filesystem.Transfers.create(vm_id,
-                                                                         creds,
-                                                                         spec)
-        res = self._upload(toURL, script)
-
-        # Check that the uploaded file size is correct.
-        info = self.client.vcenter.vm.guest.filesystem.Files.get(vm_id,
-                                                                 creds,
-                                                                 scriptPath)
-        if info.size != len(script):
-            raise Exception('Uploaded file size not as epected.')
-
-        # Step 5 - Start the program on the guest, capturing stdout and stderr
-        # in the separate temp files obtained earlier.
-        options = (" > " + stdout + " 2> " + stderr)
-
-        spec = self._process_create_spec(scriptPath,
-                                         args=options,
-                                         dir=tempDir)
-        pid = self.client.vcenter.vm.guest.Processes.create(vm_id, creds, spec)
-        print('process created with pid: %s\n' % pid)
-
-        # Step 6
-        # Need a loop to wait for the process to finish to handle longer
-        # running processes.
-        while True:
-            time.sleep(1.0)
-            try:
-                # List the single process for pid.
-                result = self.client.vcenter.vm.guest.Processes.get(vm_id,
-                                                                    creds,
-                                                                    pid)
-                if result.exit_code is not None:
-                    print('Command: ' + result.command)
-                    print('Exit code: %s\n' % result.exit_code)
-                    break
-                if result.finished is None:
-                    print('Process with pid %s is still running.' % pid)
-                    continue
-            except Exception as e:
-                raise e
-
-        # Step 7 Copy out the results (stdout).
-        spec = self._create_transfer_spec(path=stdout)
-        # create the download URL
-        fromURL = self.client.vcenter.vm.guest.filesystem.Transfers.create(vm_id,
-                                                                           creds,
-                                                                           spec)
-        body = self._download(fromURL, expectedLen=info.size)
+        # The transfer streams files and checks their size in the guest.
+        # It skips the ESXi host cert verification by default.
+        # This is not recommended in production code.
+        with GuestFileTransfer(self.client, vm_id, creds) as transfer:
+            # Step 4 - (Optional)  copy in the script to be run.
+            #          While optional, using this step to demo tranfer of a
+            #          file to a guest.
+            scriptPath = self.client.vcenter.vm.guest.filesystem.Files.create_temporary(
+                           vm_id, creds, '', '.sh', tempDir)
+
+            # Create script contents and transfer to the guest.
+            # TODO: Need generic pick up of script content
+            baseFN = os.path.basename(scriptPath)
+            script = ('#! /bin/bash\n'
+                      '#    ' +
+                      baseFN + '\n'
+                      '\n'
+                      'sleep 5    # Adding a little length to the process.\n'
+                      'ps -ef\n'
+                      'echo\n'
+                      'rpm -qa | sort\n'
+                      '\n')
+            print(script)
+            transfer.upload(io.BytesIO(script.encode()), scriptPath,
+                            overwrite=True, permissions='0755')
+
+            # Step 5 - Start the program on the guest, capturing stdout and
+            # stderr in the separate temp files obtained earlier.
+            options = (" > " + stdout + " 2> " + stderr)
+
+            spec = self._process_create_spec(scriptPath,
+                                             args=options,
+                                             dir=tempDir)
+            pid = self.client.vcenter.vm.guest.Processes.create(vm_id, creds,
+                                                                spec)
+            print('process created with pid: %s\n' % pid)
+
+            # Step 6
+            # Need a loop to wait for the process to finish to handle longer
+            # running processes.
+            while True:
+                time.sleep(1.0)
+                try:
+                    # List the single process for pid.
+                    result = self.client.vcenter.vm.guest.Processes.get(
+                        vm_id, creds, pid)
+                    if result.exit_code is not None:
+                        print('Command: ' + result.command)
+                        print('Exit code: %s\n' % result.exit_code)
+                        break
+                    if result.finished is None:
+                        print('Process with pid %s is still running.' % pid)
+                        continue
+                except Exception as e:
+                    raise e
+
+            # Step 7 Copy out the results (stdout).
+            body = io.BytesIO()
+            transfer.download(stdout, body)
         print("-----------  stdout  ------------------")
-        print(body)
+        print(body.getvalue().decode())
         print("---------------------------------------")
 
         # Optionally the contents of "stderr" could be downloaded.
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+"""
+* *******************************************************
+* Copyright (c) 2024 Broadcom. All Rights Reserved.
+* SPDX-License-Identifier: MIT
+* *******************************************************
+*
+* DISCLAIMER. THIS PROGRAM IS PROVIDED TO YOU "AS IS" WITHOUT
+* WARRANTIES OR CONDITIONS OF ANY KIND, WHETHER ORAL OR WRITTEN,
+* EXPRESS OR IMPLIED. THE AUTHOR SPECIFICALLY DISCLAIMS ANY IMPLIED
+* WARRANTIES OR CONDITIONS OF MERCHANTABILITY, SATISFACTORY QUALITY,
+* NON-INFRINGEMENT AND FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+__author__ = 'Broadcom, Inc.'
+__copyright__ = 'Copyright (c) 2024 Broadcom. All Rights Reserved.'
+__vcenter_version__ = '6.7+'
+
+from concurrent import futures
+
+from pyVmomi import vim
+
+from samples.vsphere.common.sample_base import SampleBase
+from samples.vsphere.common.vim.helpers.guest_monitor import \
+    (GuestStateMonitor, guest_operations_ready, tools_running)
+from samples.vsphere.common.vim.helpers.vim_utils import InventorySnapshot
+
+
+class WaitForGuests(SampleBase):
+    """
+    Demonstrates waiting for the VMware Tools of many VMs, for example after
+    a mass power-on, through a single property collector subscription.
+
+    Note: The sample needs existing powered on virtual machines.
+    """
+
+    def __init__(self):
+        SampleBase.__init__(self, self.__doc__)
+        self.servicemanager = None
+        self.vm_names = None
+        self.timeout = None
+        self.operations = False
+
+    def _options(self):
+        self.argparser.add_argument('-vmnames', '--vmnames', required=True,
+                                    help='Comma separated names of the VMs '
+                                         'to wait for')
+        self.argparser.add_argument('-timeout', '--timeout', type=int,
+                                    default=600,
+                                    help='Seconds to wait for the VMs')
+        self.argparser.add_argument('-operations', '--operations',
+                                    action='store_true',
+                                    help='Wait for guest operations to be '
+                                         'ready instead of the tools to run')
+
+    def _setup(self):
+        self.vm_names = [name.strip() for name in self.args.vmnames.split(',')]
+        self.timeout = self.args.timeout
+        self.operations = self.args.operations
+
+        if self.servicemanager is None:
+            self.servicemanager = self.get_service_manager()
+
+    def _execute(self):
+        content = self.servicemanager.content
+        snapshot = InventorySnapshot(content, [vim.VirtualMachine])
+        vms = []
+        for name in self.vm_names:
+            vm = snapshot.get([vim.VirtualMachine], name)
+            if vm is None:
+                raise Exception('VM {0} not found'.format(name))
+            vms.append(vm)
+
+        condition = guest_operations_ready if self.operations \
+            else tools_running
+        with GuestStateMonitor(content) as monitor:
+            try:
+                states = monitor.wait_for_all(vms, condition, self.timeout)
+            except futures.TimeoutError as e:
+                print(e)
+                return
+        for name, vm in zip(self.vm_names, vms):
+            props = states[vm._GetMoId()]
+            print('{0}: tools {1}, guest {2}'.format(
+                name, props.get('guest.toolsRunningStatus'),
+                props.get('guest.guestState')))
+
+
+def main():
+    wait_for_guests = WaitForGuests()
+    wait_for_guests.main()
+
+
+if __name__ == '__main__':
+    main()
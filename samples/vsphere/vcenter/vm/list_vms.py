@@ -24,6 +24,7 @@ from vmware.vapi.vsphere.client import create_vsphere_client
 from samples.vsphere.common import sample_cli
 from samples.vsphere.common import sample_util
 from samples.vsphere.common.ssl_helper import get_unverified_session
+from samples.vsphere.vcenter.helper.vm_helper import iter_vms
 
 
 class ListVM(object):
@@ -43,14 +44,18 @@ class ListVM(object):
 
     def run(self):
         """
-        List VMs present in server
+        List VMs present in server. The list is streamed, so inventories
+        beyond the 4000 vm limit of VM.list are listed in shards.
         """
-        list_of_vms = self.client.vcenter.VM.list()
         print("----------------------------")
         print("List Of VMs")
         print("----------------------------")
-        pprint(list_of_vms)
+        count = 0
+        for vm_summary in iter_vms(self.client):
+            pprint(vm_summary)
+            count += 1
         print("----------------------------")
+        print("{} VMs".format(count))
 
 
 def main():
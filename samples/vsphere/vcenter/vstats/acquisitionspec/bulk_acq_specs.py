@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""
+* *******************************************************
+* Copyright (c) 2024 Broadcom. All Rights Reserved.
+* SPDX-License-Identifier: MIT
+* *******************************************************
+*
+* DISCLAIMER. THIS PROGRAM IS PROVIDED TO YOU "AS IS" WITHOUT
+* WARRANTIES OR CONDITIONS OF ANY KIND, WHETHER ORAL OR WRITTEN,
+* EXPRESS OR IMPLIED. THE AUTHOR SPECIFICALLY DISCLAIMS ANY IMPLIED
+* WARRANTIES OR CONDITIONS OF MERCHANTABILITY, SATISFACTORY QUALITY,
+* NON-INFRINGEMENT AND FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+__author__ = 'Broadcom, Inc.'
+__copyright__ = 'Copyright (c) 2024 Broadcom. All Rights Reserved.'
+__vcenter_version__ = '7.0+'
+
+import time
+
+from com.vmware.vstats_client import (AcqSpecs, Counters, CounterSets, Data,
+                                      RsrcId)
+from vmware.vapi.vsphere.client import create_vsphere_client
+
+from samples.vsphere.common import sample_util
+from samples.vsphere.common.sample_cli import build_arg_parser
+from samples.vsphere.common.ssl_helper import get_unverified_session
+from samples.vsphere.vcenter.hcl.utils import get_configuration
+from samples.vsphere.vcenter.vstats.helpers.acq_spec_manager import \
+    (AcqSpecManager, CounterCatalog)
+from samples.vsphere.vcenter.vstats.helpers.data_collector import \
+    (DataPointCollector, resource_filter)
+
+
+class SampleBulkAcqSpecs(object):
+    """
+    Description: Demonstrates collecting the CPU and disk counters of many
+    VMs with the fewest Acquisition Specifications, renewing them and
+    deleting the stale ones.
+    Sample Prerequisites:
+    vCenter 7.0x with 7.0x ESXi hosts.
+    """
+
+    def __init__(self):
+        # The manager sets and renews the expiration of its specs, so this
+        # sample takes their lifetime instead of --expiration.
+        parser = build_arg_parser()
+        parser.add_argument('--interval', type=int, required=True,
+                            help='Interval of the Acquisition Specifications.'
+                            ' Example: 10')
+        parser.add_argument('--lifetime', type=int, default=3600,
+                            help='Seconds the Acquisition Specifications live'
+                            ' before they must be renewed')
+        parser.add_argument('--vm_count', type=int, default=10,
+                            help='Number of VMs to collect stats for')
+        args = sample_util.process_cli_args(parser.parse_args())
+        self.interval = args.interval
+        self.vm_count = args.vm_count
+
+        stub_config = get_configuration(
+                args.server, args.username, args.password,
+                args.skipverification)
+        catalog = CounterCatalog(Counters(stub_config),
+                                 CounterSets(stub_config))
+        self.manager = AcqSpecManager(AcqSpecs(stub_config), catalog,
+                                      self.interval, lifetime=args.lifetime)
+        self.data_client = Data(stub_config)
+
+        session = get_unverified_session() if args.skipverification else None
+        self.vsphere_client = create_vsphere_client(
+                server=args.server, username=args.username,
+                password=args.password, session=session)
+
+    def run(self):
+        vm_type = "VM"
+        wait_time = 30
+
+        # CPU and disk counters of VMs, grouped into counter sets by the
+        # manager where possible.
+        cids = [cid for cid in self.manager.catalog.counters()
+                if cid.endswith("." + vm_type) and
+                cid.split(".")[0] in ("cpu", "disk")]
+        vm_ids = [vm.vm for vm in
+                  self.vsphere_client.vcenter.VM.list()][:self.vm_count]
+        addresses = [[RsrcId(id_value=vm_id, type=vm_type)]
+                     for vm_id in vm_ids]
+
+        # Remove the expired specs left behind by earlier runs, then create
+        # the missing ones.
+        SampleBulkAcqSpecs.print_output(
+                "Stale Acquisition Specifications deleted: {}".format(
+                    self.manager.collect_garbage()))
+        spec_ids = self.manager.ensure(cids, addresses)
+        SampleBulkAcqSpecs.print_output(
+                "{} Acquisition Specifications cover {} counters on {} VMs".
+                format(len(spec_ids), len(cids), len(vm_ids)))
+
+        # Wait for 30 seconds for data collection to happen.
+        time.sleep(wait_time)
+
+        collector = DataPointCollector(self.data_client)
+        collector.collect(resources=[resource_filter(vm_type, vm_id)
+                                     for vm_id in vm_ids])
+        SampleBulkAcqSpecs.print_output(
+                "Data Points collected", collector.store.summary())
+
+        SampleBulkAcqSpecs.print_output(
+                "Acquisition Specifications renewed: {}".format(
+                    self.manager.renew()))
+
+    def cleanup(self):
+        self.manager.release()
+        SampleBulkAcqSpecs.print_output(
+                "Acquisition Specifications deleted")
+
+    @staticmethod
+    def print_output(*argv):
+        print("------------------------------------")
+        for arg in argv:
+            print(arg)
+
+
+def main():
+    """
+     Entry point for the sample client.
+    """
+    bulk_acq_specs = SampleBulkAcqSpecs()
+    try:
+        bulk_acq_specs.run()
+    finally:
+        bulk_acq_specs.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -24,6 +24,8 @@ from vmware.vapi.vsphere.client import create_vsphere_client
 from samples.vsphere.common import sample_util
 from samples.vsphere.common.ssl_helper import get_unverified_session
 from samples.vsphere.vcenter.hcl.utils import get_configuration
+from samples.vsphere.vcenter.vstats.helpers.data_collector import \
+    DataPointCollector
 from samples.vsphere.vcenter.vstats.helpers.sample_cli import parser
 
 
@@ -91,10 +93,10 @@ class SampleQueryDataPoints(object):
         time.sleep(wait_time)
 
         # Query for data points filtered by cid.
-        filter_spec = self.data_client.FilterSpec(cid=cid)
-        data_points = self.data_client.query_data_points(filter=filter_spec)
+        collector = DataPointCollector(self.data_client)
+        collector.collect(cid=cid)
         SampleQueryDataPoints.print_output(
-                "Data Points collected", data_points)
+                "Data Points collected", collector.store.summary())
 
         # CleanUp.
         # Delete the Acquisition Specification.
@@ -24,6 +24,8 @@ from vmware.vapi.vsphere.client import create_vsphere_client
 from samples.vsphere.common import sample_util
 from samples.vsphere.common.ssl_helper import get_unverified_session
 from samples.vsphere.vcenter.hcl.utils import get_configuration
+from samples.vsphere.vcenter.vstats.helpers.data_collector import \
+    DataPointCollector
 from samples.vsphere.vcenter.vstats.helpers.sample_cli import parser
 
 
@@ -98,10 +100,10 @@ class SampleQueryDataPointsSetID(object):
 
         # Query for data points filtered by resource.
         resource = "type." + vm_type + "=" + vm_id
-        filter_spec = self.data_client.FilterSpec(resources=[resource])
-        data_points = self.data_client.query_data_points(filter=filter_spec)
+        collector = DataPointCollector(self.data_client)
+        collector.collect(resources=[resource])
         SampleQueryDataPointsSetID.print_output(
-                "Data Points collected", data_points)
+                "Data Points collected", collector.store.summary())
 
         # CleanUp.
         # Delete the Acquisition Specification.
@@ -22,6 +22,8 @@ from com.vmware.vstats_client import Providers, AcqSpecs, CidMid, RsrcId, Data
 
 from samples.vsphere.common import sample_util
 from samples.vsphere.vcenter.hcl.utils import get_configuration
+from samples.vsphere.vcenter.vstats.helpers.data_collector import \
+    DataPointCollector
 from samples.vsphere.vcenter.vstats.helpers.sample_cli import parser
 
 
@@ -90,10 +92,10 @@ class SampleQueryDataPointsPredicate(object):
         time.sleep(wait_time)
 
         # Query for data points filtered by cid.
-        filter_spec = self.data_client.FilterSpec(cid=cid)
-        data_points = self.data_client.query_data_points(filter=filter_spec)
+        collector = DataPointCollector(self.data_client)
+        collector.collect(cid=cid)
         SampleQueryDataPointsPredicate.print_output(
-                "Data points collected", data_points)
+                "Data points collected", collector.store.summary())
 
         # CleanUp.
         # Delete the Acquisition Specification.
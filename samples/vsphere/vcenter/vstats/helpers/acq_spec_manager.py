@@ -0,0 +1,246 @@
+"""
+* *******************************************************
+* Copyright (c) 2024 Broadcom. All Rights Reserved.
+* SPDX-License-Identifier: MIT
+* *******************************************************
+*
+* DISCLAIMER. THIS PROGRAM IS PROVIDED TO YOU "AS IS" WITHOUT
+* WARRANTIES OR CONDITIONS OF ANY KIND, WHETHER ORAL OR WRITTEN,
+* EXPRESS OR IMPLIED. THE AUTHOR SPECIFICALLY DISCLAIMS ANY IMPLIED
+* WARRANTIES OR CONDITIONS OF MERCHANTABILITY, SATISFACTORY QUALITY,
+* NON-INFRINGEMENT AND FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+__author__ = 'Broadcom, Inc.'
+__copyright__ = 'Copyright (c) 2024 Broadcom. All Rights Reserved.'
+__vcenter_version__ = '7.0+'
+
+import threading
+import time
+import uuid
+
+from com.vmware.vstats_client import AcqSpecs, CidMid
+
+from samples.vsphere.common.vim.datastore_transfer import run_all
+
+# Memo prefix of the acquisition specifications of every manager, followed
+# by the owner of the manager
+MEMO = 'acquisition spec manager'
+
+
+def owner_memo(owner):
+    return '{0} {1}'.format(MEMO, owner)
+
+
+def address_key(resources):
+    """
+    Return a hashable key for a resource address, a list of RsrcId.
+    """
+    return tuple(sorted((r.type, r.id_value, r.predicate, r.scheme, r.key)
+                        for r in resources))
+
+
+def counter_key(counter_spec):
+    if counter_spec.set_id is not None:
+        return ('set', counter_spec.set_id)
+    return ('cid', counter_spec.cid_mid.cid, counter_spec.cid_mid.mid)
+
+
+class CounterCatalog(object):
+    """
+    Counters and counter sets listed once and kept in memory.
+    """
+
+    def __init__(self, counters_client, counter_sets_client):
+        self.counters_client = counters_client
+        self.counter_sets_client = counter_sets_client
+        self._counters = None
+        self._counter_sets = None
+        self._lock = threading.Lock()
+
+    def counters(self):
+        """
+        Return the Counters.Info of every counter by cid.
+        """
+        with self._lock:
+            if self._counters is None:
+                self._counters = dict((c.cid, c)
+                                      for c in self.counters_client.list())
+            return self._counters
+
+    def counter_sets(self):
+        """
+        Return the cids of every counter set by set id.
+        """
+        with self._lock:
+            if self._counter_sets is None:
+                self._counter_sets = dict(
+                    (s.id, frozenset(c.cid for c in s.counters))
+                    for s in self.counter_sets_client.list())
+            return self._counter_sets
+
+    def refresh(self):
+        with self._lock:
+            self._counters = None
+            self._counter_sets = None
+
+
+class AcqSpecManager(object):
+    """
+    Keeps the acquisition specifications covering counters × resources.
+
+    The requested counters are grouped into the counter sets made only of
+    requested counters, largest first, and the remaining ones get a spec
+    each. One spec is needed per counter group and resource address, as the
+    resources of a spec describe one address, like all VMs of a host. Specs
+    that already exist with the same counters, resources and interval are
+    reused, and the missing ones are created concurrently. The specs of a
+    manager carry a memo naming its owner, a new run id by default, so
+    renew extends the ones about to expire and collect_garbage deletes the
+    stale ones in bulk without touching the specs of other managers.
+    """
+
+    def __init__(self, acq_specs_client, catalog, interval, lifetime=3600,
+                 renew_before=600, owner=None, max_workers=8):
+        self.acq_specs_client = acq_specs_client
+        self.catalog = catalog
+        self.interval = interval
+        self.lifetime = lifetime
+        self.renew_before = renew_before
+        self.owner = owner or uuid.uuid4().hex[:12]
+        self.memo = owner_memo(self.owner)
+        self.max_workers = max_workers
+        # Spec id to (key, CreateSpec) of the specs in use
+        self.specs = {}
+        self._lock = threading.Lock()
+
+    def plan(self, cids, addresses):
+        """
+        Return the CreateSpecs, without expiration, covering every counter
+        of cids on every resource address, a list of RsrcId.
+        """
+        counters = self.catalog.counters()
+        unknown = sorted(set(cids) - set(counters))
+        if unknown:
+            raise ValueError('Unknown counters: {}'.format(', '.join(unknown)))
+
+        remaining = set(cids)
+        counter_specs = []
+        counter_sets = sorted(self.catalog.counter_sets().items(),
+                              key=lambda item: (-len(item[1]), item[0]))
+        for set_id, set_cids in counter_sets:
+            if len(set_cids) > 1 and set_cids <= remaining:
+                counter_specs.append(AcqSpecs.CounterSpec(set_id=set_id))
+                remaining -= set_cids
+        counter_specs += [AcqSpecs.CounterSpec(cid_mid=CidMid(cid=cid))
+                          for cid in sorted(remaining)]
+
+        planned = {}
+        for counter_spec in counter_specs:
+            for resources in addresses:
+                spec = AcqSpecs.CreateSpec(counters=counter_spec,
+                                           resources=list(resources),
+                                           interval=self.interval,
+                                           memo_=self.memo)
+                planned.setdefault(self._key(spec), spec)
+        return list(planned.values())
+
+    def _key(self, spec):
+        return (counter_key(spec.counters), address_key(spec.resources),
+                spec.interval)
+
+    def list_specs(self):
+        """
+        Return the AcqSpecs.Info of every specification, across all pages.
+        """
+        infos = []
+        page = None
+        while True:
+            result = self.acq_specs_client.list(
+                AcqSpecs.FilterSpec(page=page))
+            infos += result.acq_specs or []
+            page = result.next
+            if not page:
+                return infos
+
+    def ensure(self, cids, addresses):
+        """
+        Make sure every planned spec exists and is enabled. Returns the
+        spec ids in plan order.
+        """
+        planned = self.plan(cids, addresses)
+        existing = {}
+        for info in self.list_specs():
+            if info.memo_ == self.memo and \
+                    info.status == AcqSpecs.Status.ENABLED:
+                existing.setdefault(self._key(info), info.id)
+
+        expiration = int(time.time()) + self.lifetime
+        to_create = []
+        ids = []
+        for spec in planned:
+            spec_id = existing.get(self._key(spec))
+            if spec_id is None:
+                spec.expiration = expiration
+                to_create.append(spec)
+            ids.append(spec_id)
+        created = iter(run_all(self.acq_specs_client.create, to_create,
+                               self.max_workers, 'creates'))
+        ids = [spec_id or next(created) for spec_id in ids]
+
+        with self._lock:
+            for spec_id, spec in zip(ids, planned):
+                self.specs[spec_id] = (self._key(spec), spec)
+        print('{} acquisition specs in use, {} created, {} reused'.format(
+            len(ids), len(to_create), len(ids) - len(to_create)))
+        return ids
+
+    def renew(self):
+        """
+        Extend the specs of the manager expiring within renew_before
+        seconds, and return how many were renewed.
+        """
+        now = int(time.time())
+        expiring = [info for info in self.list_specs()
+                    if info.id in self.specs and info.expiration and
+                    info.expiration - now < self.renew_before]
+
+        def renew(info):
+            self.acq_specs_client.update(info.id, AcqSpecs.UpdateSpec(
+                counters=info.counters, resources=info.resources,
+                interval=info.interval, expiration=now + self.lifetime,
+                memo_=info.memo_))
+
+        run_all(renew, expiring, self.max_workers, 'renewals')
+        return len(expiring)
+
+    def collect_garbage(self):
+        """
+        Delete the specs of the manager that are expired, disabled or not in
+        use, and the expired specs left behind by any other manager, and
+        return how many were deleted.
+        """
+        stale = [info.id for info in self.list_specs()
+                 if self._is_stale(info)]
+        run_all(self.acq_specs_client.delete, stale, self.max_workers, 'deletes')
+        with self._lock:
+            for spec_id in stale:
+                self.specs.pop(spec_id, None)
+        return len(stale)
+
+    def _is_stale(self, info):
+        if info.memo_ == self.memo:
+            return info.id not in self.specs or \
+                info.status != AcqSpecs.Status.ENABLED
+        # Specs of other managers may still be in use until they expire
+        return (info.memo_ or '').startswith(MEMO) and \
+            info.status == AcqSpecs.Status.EXPIRED
+
+    def release(self):
+        """
+        Delete all specs in use.
+        """
+        with self._lock:
+            spec_ids, self.specs = list(self.specs), {}
+        run_all(self.acq_specs_client.delete, spec_ids, self.max_workers,
+                'deletes')
@@ -0,0 +1,256 @@
+"""
+* *******************************************************
+* Copyright (c) 2024 Broadcom. All Rights Reserved.
+* SPDX-License-Identifier: MIT
+* *******************************************************
+*
+* DISCLAIMER. THIS PROGRAM IS PROVIDED TO YOU "AS IS" WITHOUT
+* WARRANTIES OR CONDITIONS OF ANY KIND, WHETHER ORAL OR WRITTEN,
+* EXPRESS OR IMPLIED. THE AUTHOR SPECIFICALLY DISCLAIMS ANY IMPLIED
+* WARRANTIES OR CONDITIONS OF MERCHANTABILITY, SATISFACTORY QUALITY,
+* NON-INFRINGEMENT AND FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+__author__ = 'Broadcom, Inc.'
+__copyright__ = 'Copyright (c) 2024 Broadcom. All Rights Reserved.'
+__vcenter_version__ = '7.0+'
+
+import array
+import csv
+
+from com.vmware.vstats_client import Data
+
+# NumPy is optional, the buffers are plain typed arrays without it
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Resources per query, so one filter does not carry thousands of them
+RESOURCE_BATCH = 200
+
+
+def resource_filter(rsrc_type, id_value):
+    """
+    Return the resource string of Data.FilterSpec, like type.VM=vm-41.
+    """
+    return 'type.{0}={1}'.format(rsrc_type, id_value)
+
+
+def iter_pages(data_client, filter_spec):
+    """
+    Query data points page by page until the server returns no next
+    marker, yielding the data points of every page. The filter spec of the
+    caller is left untouched.
+    """
+    spec = Data.FilterSpec(start=filter_spec.start, end=filter_spec.end,
+                           cid=filter_spec.cid, metric=filter_spec.metric,
+                           types=filter_spec.types,
+                           resources=filter_spec.resources,
+                           order=filter_spec.order, page=filter_spec.page)
+    while True:
+        result = data_client.query_data_points(filter=spec)
+        yield result.data_points or []
+        if not result.next:
+            break
+        spec.page = result.next
+
+
+def iter_data_points(data_client, filter_spec):
+    """
+    Yield every data point matching filter_spec across all pages.
+    """
+    for data_points in iter_pages(data_client, filter_spec):
+        for data_point in data_points:
+            yield data_point
+
+
+class DataPointStore(object):
+    """
+    Data points kept as columns, one pair of typed arrays of timestamps and
+    values per counter and resource.
+
+    A point costs 16 bytes instead of a DataPoint struct with its strings,
+    and the counter and resource strings are kept once per series.
+    """
+
+    def __init__(self):
+        self._series = {}
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, cid, rid, ts, val):
+        series = self._series.get((cid, rid))
+        if series is None:
+            series = self._series[(cid, rid)] = (array.array('q'),
+                                                 array.array('d'))
+        series[0].append(ts)
+        series[1].append(val)
+        self.count += 1
+
+    def add_data_points(self, data_points):
+        """
+        Append DataPoint structs and return how many were added.
+        """
+        added = 0
+        for data_point in data_points:
+            self.add(data_point.cid, data_point.rid, data_point.ts,
+                     data_point.val)
+            added += 1
+        return added
+
+    def cids(self):
+        return sorted(set(cid for cid, _ in self._series))
+
+    def resources(self, cid=None):
+        return sorted(set(rid for c, rid in self._series
+                          if cid is None or c == cid))
+
+    def series(self, cid, rid):
+        """
+        Return the timestamps and values of one series, as NumPy arrays
+        when NumPy is installed. Empty when the series is unknown.
+        """
+        ts, val = self._series.get((cid, rid), (array.array('q'),
+                                                array.array('d')))
+        if numpy is not None:
+            # Copied, a view would keep the arrays from growing
+            return (numpy.array(ts, dtype=numpy.int64),
+                    numpy.array(val, dtype=numpy.float64))
+        return ts, val
+
+    def last_timestamp(self, cid=None, rid=None):
+        """
+        Return the latest timestamp of the matching series, or None.
+        """
+        last = None
+        for (c, r), (ts, _) in self._series.items():
+            if (cid is None or c == cid) and (rid is None or r == rid) and ts:
+                last = max(ts) if last is None else max(last, max(ts))
+        return last
+
+    def rows(self):
+        """
+        Yield (cid, rid, ts, val) tuples series by series.
+        """
+        for (cid, rid) in sorted(self._series):
+            ts, val = self._series[(cid, rid)]
+            for i in range(len(ts)):
+                yield cid, rid, ts[i], val[i]
+
+    def summary(self):
+        """
+        Return one line per series with its number of points and last value.
+        """
+        lines = []
+        for (cid, rid) in sorted(self._series):
+            ts, val = self._series[(cid, rid)]
+            lines.append('{0} {1}: {2} points, last {3} at {4}'.format(
+                cid, rid, len(ts), val[-1], ts[-1]))
+        return '\n'.join(lines) or 'No data points'
+
+    def to_csv(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['cid', 'rid', 'ts', 'val'])
+            writer.writerows(self.rows())
+        return path
+
+    def to_parquet(self, path):
+        """
+        Write the points to a Parquet file with dictionary encoded cid and
+        rid columns. Needs pyarrow.
+        """
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('pyarrow is required to write Parquet files, '
+                              'use to_csv instead')
+        keys = sorted(self._series)
+        cids = self.cids()
+        rids = self.resources()
+        cid_indexes = dict((cid, i) for i, cid in enumerate(cids))
+        rid_indexes = dict((rid, i) for i, rid in enumerate(rids))
+        cid_index = array.array('i')
+        rid_index = array.array('i')
+        ts = array.array('q')
+        val = array.array('d')
+        for cid, rid in keys:
+            series_ts, series_val = self._series[(cid, rid)]
+            cid_index.extend([cid_indexes[cid]] * len(series_ts))
+            rid_index.extend([rid_indexes[rid]] * len(series_ts))
+            ts.extend(series_ts)
+            val.extend(series_val)
+        table = pyarrow.table({
+            'cid': pyarrow.DictionaryArray.from_arrays(
+                pyarrow.array(cid_index, pyarrow.int32()), cids),
+            'rid': pyarrow.DictionaryArray.from_arrays(
+                pyarrow.array(rid_index, pyarrow.int32()), rids),
+            'ts': pyarrow.array(ts, pyarrow.int64()),
+            'val': pyarrow.array(val, pyarrow.float64()),
+        })
+        pyarrow.parquet.write_table(table, path)
+        return path
+
+
+class DataPointCollector(object):
+    """
+    Collects data points into a DataPointStore, following pagination.
+
+    Every collect keeps the latest timestamp collected for each counter and
+    resource, and asks again from the oldest of them for the same query, so
+    a resource reporting late is not skipped because another one is ahead.
+    Points at or before the latest timestamp of their series are dropped,
+    so calling collect once per interval stores each point once. overlap
+    seconds are added to the window for series that have no point yet.
+    Long resource lists are split into several queries of resource_batch
+    resources.
+    """
+
+    def __init__(self, data_client, store=None,
+                 resource_batch=RESOURCE_BATCH, overlap=0):
+        self.data_client = data_client
+        self.store = store if store is not None else DataPointStore()
+        self.resource_batch = resource_batch
+        self.overlap = overlap
+        # Query key to the latest timestamp by (cid, rid)
+        self._cursors = {}
+
+    def collect(self, cid=None, resources=None, types=None, metric=None,
+                end=None):
+        """
+        Query the points added since the last collect of the same query,
+        filtered like Data.FilterSpec, and return how many were stored.
+        """
+        resources = list(resources) if resources else None
+        batches = [None] if resources is None else \
+            [resources[i:i + self.resource_batch]
+             for i in range(0, len(resources), self.resource_batch)]
+
+        added = 0
+        for batch in batches:
+            key = (cid, metric, tuple(types or ()), tuple(batch or ()))
+            cursors = self._cursors.setdefault(key, {})
+            # The start of a time window is included
+            start = min(cursors.values()) + 1 - self.overlap \
+                if cursors else None
+            filter_spec = Data.FilterSpec(start=start, end=end, cid=cid,
+                                          metric=metric, types=types,
+                                          resources=batch)
+            # Compared with the cursors before the query, the points of a
+            # series may come in any order
+            previous = dict(cursors)
+            for data_points in iter_pages(self.data_client, filter_spec):
+                for data_point in data_points:
+                    series = (data_point.cid, data_point.rid)
+                    if data_point.ts <= previous.get(series, data_point.ts - 1):
+                        continue
+                    cursors[series] = max(cursors.get(series, data_point.ts),
+                                          data_point.ts)
+                    self.store.add(data_point.cid, data_point.rid,
+                                   data_point.ts, data_point.val)
+                    added += 1
+        return added
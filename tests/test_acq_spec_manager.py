@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+
+"""
+* *******************************************************
+* Copyright (c) 2024 Broadcom. All Rights Reserved.
+* SPDX-License-Identifier: MIT
+* *******************************************************
+*
+* DISCLAIMER. THIS PROGRAM IS PROVIDED TO YOU "AS IS" WITHOUT
+* WARRANTIES OR CONDITIONS OF ANY KIND, WHETHER ORAL OR WRITTEN,
+* EXPRESS OR IMPLIED. THE AUTHOR SPECIFICALLY DISCLAIMS ANY IMPLIED
+* WARRANTIES OR CONDITIONS OF MERCHANTABILITY, SATISFACTORY QUALITY,
+* NON-INFRINGEMENT AND FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+__author__ = 'Broadcom, Inc.'
+__copyright__ = 'Copyright (c) 2024 Broadcom. All Rights Reserved.'
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+from com.vmware.vstats_client import AcqSpecs, RsrcId
+
+from samples.vsphere.vcenter.vstats.helpers.acq_spec_manager import \
+    (AcqSpecManager, CounterCatalog, owner_memo)
+
+CIDS = ['cpu.capacity.demand.VM', 'cpu.capacity.usage.VM',
+        'disk.throughput.read.VM', 'mem.usage.VM']
+
+
+class FakeCatalogClient(object):
+    def __init__(self, items):
+        self.items = items
+
+    def list(self):
+        return self.items
+
+
+def make_catalog():
+    counters = FakeCatalogClient([SimpleNamespace(cid=cid) for cid in CIDS])
+    counter_sets = FakeCatalogClient([
+        SimpleNamespace(id='cpu', counters=[
+            SimpleNamespace(cid='cpu.capacity.demand.VM'),
+            SimpleNamespace(cid='cpu.capacity.usage.VM')]),
+        SimpleNamespace(id='all-vm', counters=[
+            SimpleNamespace(cid=cid) for cid in CIDS + ['net.VM']])])
+    return CounterCatalog(counters, counter_sets)
+
+
+class FakeAcqSpecsClient(object):
+    """
+    Keeps AcqSpecs.Info in memory and lists them page_size at a time.
+    """
+
+    def __init__(self, page_size=2):
+        self.page_size = page_size
+        self.specs = {}
+        self.deleted = []
+        self._lock = threading.Lock()
+
+    def add(self, spec_id, memo, status=AcqSpecs.Status.ENABLED, spec=None):
+        spec = spec or AcqSpecs.CreateSpec(
+            counters=AcqSpecs.CounterSpec(set_id='cpu'),
+            resources=[RsrcId(id_value='vm-1', type='VM')], interval=30)
+        self.specs[spec_id] = AcqSpecs.Info(
+            id=spec_id, counters=spec.counters, resources=spec.resources,
+            interval=spec.interval, expiration=spec.expiration, memo_=memo,
+            status=status)
+
+    def create(self, spec):
+        with self._lock:
+            spec_id = 'spec-{}'.format(len(self.specs) + len(self.deleted))
+            self.add(spec_id, spec.memo_, spec=spec)
+        return spec_id
+
+    def delete(self, spec_id):
+        with self._lock:
+            del self.specs[spec_id]
+            self.deleted.append(spec_id)
+
+    def list(self, filter_spec):
+        infos = sorted(self.specs.values(), key=lambda info: info.id)
+        start = int(filter_spec.page or 0)
+        end = start + self.page_size
+        return AcqSpecs.ListResult(
+            acq_specs=infos[start:end],
+            next=str(end) if end < len(infos) else None)
+
+
+def addresses(*vm_ids):
+    return [[RsrcId(id_value=vm_id, type='VM')] for vm_id in vm_ids]
+
+
+def test_plan_groups_counters_into_sets():
+    manager = AcqSpecManager(FakeAcqSpecsClient(), make_catalog(), 30)
+    planned = manager.plan(CIDS, addresses('vm-1', 'vm-2'))
+    counters = sorted(set((s.counters.set_id, s.counters.cid_mid and
+                           s.counters.cid_mid.cid) for s in planned),
+                      key=str)
+    # all-vm has a counter that was not requested
+    assert counters == [('cpu', None), (None, 'disk.throughput.read.VM'),
+                        (None, 'mem.usage.VM')]
+    assert len(planned) == 6
+    assert all(s.memo_ == manager.memo and s.interval == 30 for s in planned)
+
+
+def test_plan_rejects_unknown_counters():
+    manager = AcqSpecManager(FakeAcqSpecsClient(), make_catalog(), 30)
+    with pytest.raises(ValueError):
+        manager.plan(['cpu.unknown.VM'], addresses('vm-1'))
+
+
+def test_plan_drops_duplicate_addresses():
+    manager = AcqSpecManager(FakeAcqSpecsClient(), make_catalog(), 30)
+    planned = manager.plan(['mem.usage.VM'], addresses('vm-1', 'vm-1'))
+    assert len(planned) == 1
+
+
+def test_ensure_reuses_the_specs_of_the_manager():
+    client = FakeAcqSpecsClient()
+    catalog = make_catalog()
+    manager = AcqSpecManager(client, catalog, 30, owner='run-1')
+    first = manager.ensure(CIDS, addresses('vm-1', 'vm-2'))
+    assert len(client.specs) == 6
+    again = AcqSpecManager(client, catalog, 30, owner='run-1')
+    assert again.ensure(CIDS, addresses('vm-1', 'vm-2')) == first
+    other = AcqSpecManager(client, catalog, 30, owner='run-2')
+    other.ensure(CIDS, addresses('vm-1'))
+    assert len(client.specs) == 9
+
+
+def test_managers_get_their_own_memo():
+    catalog = make_catalog()
+    first = AcqSpecManager(FakeAcqSpecsClient(), catalog, 30)
+    second = AcqSpecManager(FakeAcqSpecsClient(), catalog, 30)
+    assert first.memo != second.memo
+    assert AcqSpecManager(FakeAcqSpecsClient(), catalog, 30,
+                          owner='run-1').memo == owner_memo('run-1')
+
+
+def test_collect_garbage_spares_other_managers():
+    client = FakeAcqSpecsClient()
+    manager = AcqSpecManager(client, make_catalog(), 30, owner='run-1')
+    in_use = manager.ensure(['mem.usage.VM'], addresses('vm-1'))
+    client.add('own-unused', manager.memo)
+    client.add('own-disabled', manager.memo, AcqSpecs.Status.DISABLED)
+    client.add('other-live', owner_memo('run-2'))
+    client.add('other-disabled', owner_memo('run-2'),
+               AcqSpecs.Status.DISABLED)
+    client.add('other-expired', owner_memo('run-2'), AcqSpecs.Status.EXPIRED)
+    client.add('unmanaged-expired', 'created by hand',
+               AcqSpecs.Status.EXPIRED)
+    assert manager.collect_garbage() == 3
+    assert sorted(client.deleted) == ['other-expired', 'own-disabled',
+                                      'own-unused']
+    assert in_use[0] in client.specs
+    assert 'other-live' in client.specs
+
+
+def test_release_deletes_the_specs_in_use():
+    client = FakeAcqSpecsClient()
+    manager = AcqSpecManager(client, make_catalog(), 30)
+    manager.ensure(CIDS, addresses('vm-1'))
+    client.add('other-live', owner_memo('run-2'))
+    manager.release()
+    assert list(client.specs) == ['other-live']
+    assert manager.specs == {}
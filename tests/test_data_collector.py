@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+"""
+* *******************************************************
+* Copyright (c) 2024 Broadcom. All Rights Reserved.
+* SPDX-License-Identifier: MIT
+* *******************************************************
+*
+* DISCLAIMER. THIS PROGRAM IS PROVIDED TO YOU "AS IS" WITHOUT
+* WARRANTIES OR CONDITIONS OF ANY KIND, WHETHER ORAL OR WRITTEN,
+* EXPRESS OR IMPLIED. THE AUTHOR SPECIFICALLY DISCLAIMS ANY IMPLIED
+* WARRANTIES OR CONDITIONS OF MERCHANTABILITY, SATISFACTORY QUALITY,
+* NON-INFRINGEMENT AND FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+__author__ = 'Broadcom, Inc.'
+__copyright__ = 'Copyright (c) 2024 Broadcom. All Rights Reserved.'
+
+import csv
+
+from com.vmware.vstats_client import Data
+
+from samples.vsphere.vcenter.vstats.helpers.data_collector import \
+    (DataPointCollector, DataPointStore, iter_data_points, resource_filter)
+
+
+def point(rid, ts, val=1.0, cid='cpu.capacity.demand.VM'):
+    return Data.DataPoint(cid=cid, rid=rid, ts=ts, val=val)
+
+
+class FakeDataClient(object):
+    """
+    Serves the points newer than the start of the filter, page_size at a
+    time, and records the filters.
+    """
+
+    def __init__(self, points, page_size=2):
+        self.points = points
+        self.page_size = page_size
+        self.filters = []
+
+    def query_data_points(self, filter):
+        self.filters.append((filter.start, filter.page, filter.resources))
+        matching = [p for p in self.points
+                    if filter.start is None or p.ts >= filter.start]
+        start = int(filter.page or 0)
+        end = start + self.page_size
+        return Data.DataPointsResult(
+            data_points=matching[start:end],
+            next=str(end) if end < len(matching) else None)
+
+
+def test_store_keeps_series():
+    store = DataPointStore()
+    assert store.add_data_points([point('vm-1', 10, 1.5),
+                                  point('vm-1', 20, 2.5),
+                                  point('vm-2', 10, 3.0, cid='mem.usage.VM')]) == 3
+    assert len(store) == 3
+    assert store.cids() == ['cpu.capacity.demand.VM', 'mem.usage.VM']
+    assert store.resources('cpu.capacity.demand.VM') == ['vm-1']
+    ts, val = store.series('cpu.capacity.demand.VM', 'vm-1')
+    assert list(ts) == [10, 20] and list(val) == [1.5, 2.5]
+    assert list(store.series('cpu.capacity.demand.VM', 'vm-3')[0]) == []
+    assert store.last_timestamp() == 20
+    assert store.last_timestamp(rid='vm-2') == 10
+    assert store.last_timestamp(cid='disk.VM') is None
+
+
+def test_store_to_csv(tmp_path):
+    store = DataPointStore()
+    store.add_data_points([point('vm-1', 10, 1.5), point('vm-1', 20, 2.5)])
+    path = store.to_csv(str(tmp_path / 'points.csv'))
+    with open(path) as f:
+        rows = list(csv.reader(f))
+    assert rows == [['cid', 'rid', 'ts', 'val'],
+                    ['cpu.capacity.demand.VM', 'vm-1', '10', '1.5'],
+                    ['cpu.capacity.demand.VM', 'vm-1', '20', '2.5']]
+
+
+def test_iter_data_points_follows_pages():
+    data_client = FakeDataClient([point('vm-1', ts) for ts in range(5)])
+    filter_spec = Data.FilterSpec(cid='cpu.capacity.demand.VM')
+    assert [p.ts for p in iter_data_points(data_client, filter_spec)] == \
+        [0, 1, 2, 3, 4]
+    assert [page for _, page, _ in data_client.filters] == [None, '2', '4']
+    assert filter_spec.page is None
+
+
+def test_collect_only_stores_new_points():
+    data_client = FakeDataClient([point('vm-1', 10), point('vm-2', 10)])
+    collector = DataPointCollector(data_client)
+    assert collector.collect() == 2
+    data_client.points += [point('vm-1', 20), point('vm-2', 20)]
+    assert collector.collect() == 2
+    assert collector.collect() == 0
+    assert len(collector.store) == 4
+    assert data_client.filters[-1][0] == 21
+
+
+def test_collect_keeps_late_points_of_other_resources():
+    data_client = FakeDataClient([point('vm-1', 10), point('vm-1', 20),
+                                  point('vm-2', 10)])
+    collector = DataPointCollector(data_client)
+    assert collector.collect() == 3
+    # vm-2 reports its point of ts 20 after vm-1 reported ts 30
+    data_client.points += [point('vm-1', 30), point('vm-2', 20)]
+    assert collector.collect() == 2
+    assert list(collector.store.series('cpu.capacity.demand.VM',
+                                       'vm-2')[0]) == [10, 20]
+    assert list(collector.store.series('cpu.capacity.demand.VM',
+                                       'vm-1')[0]) == [10, 20, 30]
+
+
+def test_collect_splits_resources_in_batches():
+    data_client = FakeDataClient([])
+    collector = DataPointCollector(data_client, resource_batch=2)
+    resources = [resource_filter('VM', 'vm-{}'.format(i)) for i in range(5)]
+    collector.collect(resources=resources)
+    assert [r for _, _, r in data_client.filters] == [
+        resources[0:2], resources[2:4], resources[4:5]]
+    assert resources[0] == 'type.VM=vm-0'
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+"""
+* *******************************************************
+* Copyright (c) 2024 Broadcom. All Rights Reserved.
+* SPDX-License-Identifier: MIT
+* *******************************************************
+*
+* DISCLAIMER. THIS PROGRAM IS PROVIDED TO YOU "AS IS" WITHOUT
+* WARRANTIES OR CONDITIONS OF ANY KIND, WHETHER ORAL OR WRITTEN,
+* EXPRESS OR IMPLIED. THE AUTHOR SPECIFICALLY DISCLAIMS ANY IMPLIED
+* WARRANTIES OR CONDITIONS OF MERCHANTABILITY, SATISFACTORY QUALITY,
+* NON-INFRINGEMENT AND FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+__author__ = 'Broadcom, Inc.'
+__copyright__ = 'Copyright (c) 2024 Broadcom. All Rights Reserved.'
+
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from samples.vsphere.common.vim.datastore_transfer import (DatastoreTransfer,
+                                                           TransferError,
+                                                           run_all)
+
+DATA = bytes(range(256)) * 4
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, body=b'', headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), chunk_size):
+            yield self.body[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class FakeSession(object):
+    """
+    Serves DATA like the /folder endpoint, with ranged GETs.
+    """
+
+    def __init__(self, data=DATA, last_modified='Mon, 01 Jan 2024 00:00:00 GMT',
+                 ranged=True):
+        self.data = data
+        self.last_modified = last_modified
+        self.ranged = ranged
+        self.requests = []
+
+    def request(self, method, url, params=None, cookies=None, headers=None,
+                **kwargs):
+        self.requests.append((method, (headers or {}).get('Range')))
+        if method == 'HEAD':
+            return FakeResponse(200, headers={
+                'Content-Length': str(len(self.data)),
+                'Accept-Ranges': 'bytes',
+                'Last-Modified': self.last_modified})
+        if method == 'GET':
+            if not self.ranged or not headers:
+                return FakeResponse(200, self.data)
+            start, end = headers['Range'][len('bytes='):].split('-')
+            return FakeResponse(206, self.data[int(start):int(end) + 1], {
+                'Content-Range': 'bytes {}-{}/{}'.format(start, end,
+                                                         len(self.data))})
+        if method == 'DELETE':
+            return FakeResponse(404)
+        raise AssertionError(method)
+
+    def ranges(self):
+        return [r for method, r in self.requests if method == 'GET']
+
+
+def make_transfer(session, part_size=256):
+    datastore_mo = SimpleNamespace(
+        name='ds1', _stub=SimpleNamespace(host='vc', cookie='vmware_soap_session="x"'))
+    transfer = DatastoreTransfer(datastore_mo, SimpleNamespace(name='dc1'),
+                                 workers=2, part_size=part_size,
+                                 chunk_size=100, retries=0)
+    transfer._session = session
+    return transfer
+
+
+def test_get_downloads_all_parts(tmp_path):
+    session = FakeSession()
+    local_path = str(tmp_path / 'disk.vmdk')
+    stats = make_transfer(session).get('vm/disk.vmdk', local_path)
+    with open(local_path, 'rb') as f:
+        assert f.read() == DATA
+    assert stats.bytes == len(DATA)
+    assert sorted(session.ranges()) == ['bytes=0-255', 'bytes=256-511',
+                                        'bytes=512-767', 'bytes=768-1023']
+    assert not os.path.exists(local_path + '.partial')
+    assert not os.path.exists(local_path + '.parts')
+
+
+def write_interrupted(local_path, version, done, data=DATA):
+    partial = bytearray(len(data))
+    for offset in done:
+        partial[offset:offset + 256] = data[offset:offset + 256]
+    with open(local_path + '.partial', 'wb') as f:
+        f.write(partial)
+    with open(local_path + '.parts', 'w') as f:
+        f.write(version + '\n')
+        for offset in done:
+            f.write('{}\n'.format(offset))
+
+
+def test_get_resumes_journaled_parts(tmp_path):
+    session = FakeSession()
+    local_path = str(tmp_path / 'disk.vmdk')
+    write_interrupted(local_path, '# 1024 256 ' + session.last_modified,
+                      [0, 512])
+    stats = make_transfer(session).get('vm/disk.vmdk', local_path)
+    with open(local_path, 'rb') as f:
+        assert f.read() == DATA
+    assert stats.resumed_bytes == 512
+    assert sorted(session.ranges()) == ['bytes=256-511', 'bytes=768-1023']
+
+
+def test_get_restarts_when_remote_file_changed(tmp_path):
+    session = FakeSession()
+    local_path = str(tmp_path / 'disk.vmdk')
+    write_interrupted(local_path, '# 1024 256 Sun, 31 Dec 2023 00:00:00 GMT',
+                      [0, 512], data=b'x' * len(DATA))
+    stats = make_transfer(session).get('vm/disk.vmdk', local_path)
+    with open(local_path, 'rb') as f:
+        assert f.read() == DATA
+    assert stats.resumed_bytes == 0
+    assert len(session.ranges()) == 4
+
+
+def test_get_restarts_when_part_size_changed(tmp_path):
+    session = FakeSession()
+    local_path = str(tmp_path / 'disk.vmdk')
+    write_interrupted(local_path, '# 1024 256 ' + session.last_modified,
+                      [0, 512], data=b'x' * len(DATA))
+    make_transfer(session, part_size=512).get('vm/disk.vmdk', local_path)
+    with open(local_path, 'rb') as f:
+        assert f.read() == DATA
+    assert sorted(session.ranges()) == ['bytes=0-511', 'bytes=512-1023']
+
+
+def test_get_falls_back_when_range_is_ignored(tmp_path):
+    session = FakeSession(ranged=False)
+    local_path = str(tmp_path / 'disk.vmdk')
+    stats = make_transfer(session).get('vm/disk.vmdk', local_path)
+    with open(local_path, 'rb') as f:
+        assert f.read() == DATA
+    assert stats.bytes == len(DATA)
+    assert session.ranges()[-1] is None
+    assert not os.path.exists(local_path + '.parts')
+
+
+def test_open_streams_the_whole_file():
+    session = FakeSession()
+    with make_transfer(session).open('vm/vm.vmx') as r:
+        assert b''.join(r.iter_content(100)) == DATA
+    assert session.requests == [('GET', None)]
+
+
+def test_delete_raises_on_error_status():
+    with pytest.raises(TransferError) as e:
+        make_transfer(FakeSession()).delete('vm/missing.vmdk')
+    assert e.value.status_code == 404
+
+
+def test_run_all_returns_results_in_order():
+    assert run_all(lambda i: i * 2, (i for i in range(5)), 2) == \
+        [0, 2, 4, 6, 8]
+
+
+def test_run_all_raises_every_failure():
+    def check(i):
+        if i % 2:
+            raise ValueError(i)
+        return i
+
+    with pytest.raises(Exception) as e:
+        run_all(check, range(5), 2, 'checks')
+    assert e.value.args[0] == '2 of 5 checks failed'
+    assert [str(error) for error in e.value.args[1]] == ['1', '3']
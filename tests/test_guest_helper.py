@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+"""
+* *******************************************************
+* Copyright (c) 2024 Broadcom. All Rights Reserved.
+* SPDX-License-Identifier: MIT
+* *******************************************************
+*
+* DISCLAIMER. THIS PROGRAM IS PROVIDED TO YOU "AS IS" WITHOUT
+* WARRANTIES OR CONDITIONS OF ANY KIND, WHETHER ORAL OR WRITTEN,
+* EXPRESS OR IMPLIED. THE AUTHOR SPECIFICALLY DISCLAIMS ANY IMPLIED
+* WARRANTIES OR CONDITIONS OF MERCHANTABILITY, SATISFACTORY QUALITY,
+* NON-INFRINGEMENT AND FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+__author__ = 'Broadcom, Inc.'
+__copyright__ = 'Copyright (c) 2024 Broadcom. All Rights Reserved.'
+
+import threading
+import time
+from concurrent import futures
+from types import SimpleNamespace
+
+import pytest
+from com.vmware.vapi.std.errors_client import ServiceUnavailable
+
+from samples.vsphere.vcenter.helper import guest_helper
+from samples.vsphere.vcenter.helper.guest_helper import (INFO_READY,
+                                                         OPERATIONS_READY,
+                                                         POWER_STATE,
+                                                         GuestStatePoller)
+
+
+class FakeGuestClient(object):
+    """
+    vAPI client answering Power.get and Identity.get from a dict of vm
+    states, counting the calls.
+    """
+
+    def __init__(self, states):
+        self.states = states
+        self.calls = []
+        self._lock = threading.Lock()
+        self.vcenter = SimpleNamespace(vm=SimpleNamespace(
+            guest=SimpleNamespace(
+                Power=SimpleNamespace(get=self._power),
+                Identity=SimpleNamespace(get=self._identity))))
+
+    def _record(self, call):
+        with self._lock:
+            self.calls.append(call)
+
+    def _power(self, vm):
+        self._record(('power', vm))
+        state = self.states[vm]
+        return SimpleNamespace(state=state,
+                               operations_ready=state == 'RUNNING')
+
+    def _identity(self, vm):
+        self._record(('identity', vm))
+        if self.states[vm] != 'RUNNING':
+            raise ServiceUnavailable()
+        return SimpleNamespace(name='photon')
+
+
+def test_wait_for_all_polls_each_vm_once_per_round():
+    client = FakeGuestClient({'vm-1': 'NOT_RUNNING', 'vm-2': 'NOT_RUNNING'})
+    threading.Timer(0.3, client.states.update,
+                    [{'vm-1': 'RUNNING', 'vm-2': 'RUNNING'}]).start()
+    with GuestStatePoller(client, interval=0.05, max_interval=0.1) as poller:
+        waits = [threading.Thread(target=poller.wait_for,
+                                  args=('vm-1', POWER_STATE, 'RUNNING', 5))
+                 for _ in range(3)]
+        for wait in waits:
+            wait.start()
+        poller.wait_for_all(['vm-1', 'vm-2'], OPERATIONS_READY, True, 5)
+        for wait in waits:
+            wait.join()
+    rounds = [call for call in client.calls if call[1] == 'vm-1']
+    # One call per round however many waiters, with the interval backing off
+    assert len(rounds) < 15
+
+
+def test_wait_for_info_ready():
+    client = FakeGuestClient({'vm-1': 'NOT_RUNNING'})
+    threading.Timer(0.2, client.states.update, [{'vm-1': 'RUNNING'}]).start()
+    with GuestStatePoller(client, interval=0.05) as poller:
+        poller.wait_for('vm-1', INFO_READY, True, 5)
+    assert ('identity', 'vm-1') in client.calls
+
+
+def test_wait_for_all_names_the_late_vms():
+    client = FakeGuestClient({'vm-1': 'RUNNING', 'vm-2': 'NOT_RUNNING'})
+    with GuestStatePoller(client, interval=0.05) as poller:
+        with pytest.raises(futures.TimeoutError) as e:
+            poller.wait_for_all(['vm-1', 'vm-2'], POWER_STATE, 'RUNNING', 0.3)
+        assert 'vm-2' in str(e.value) and 'vm-1' not in str(e.value)
+        assert poller._vms == {}
+
+
+def test_poll_errors_reach_the_waiters():
+    client = FakeGuestClient({})
+    with GuestStatePoller(client, interval=0.05) as poller:
+        with pytest.raises(KeyError):
+            poller.wait_for('vm-1', POWER_STATE, 'RUNNING', 5)
+
+
+def test_stop_fails_the_waiters():
+    client = FakeGuestClient({'vm-1': 'NOT_RUNNING'})
+    poller = GuestStatePoller(client, interval=0.05).start()
+    future = poller.watch('vm-1', POWER_STATE, 'RUNNING')
+    poller.stop()
+    with pytest.raises(RuntimeError):
+        future.result(1)
+
+
+def test_idle_poller_stops_and_restarts():
+    client = FakeGuestClient({'vm-1': 'RUNNING'})
+    idle = threading.Event()
+    poller = GuestStatePoller(client, interval=0.05, idle_timeout=0.1,
+                              on_idle=lambda p: idle.set())
+    poller.wait_for('vm-1', POWER_STATE, 'RUNNING', 5)
+    assert idle.wait(5)
+    assert poller._thread is None
+    poller.wait_for('vm-1', POWER_STATE, 'RUNNING', 5)
+    poller.stop()
+
+
+def test_shared_pollers_are_dropped_when_idle(monkeypatch):
+    monkeypatch.setattr(guest_helper, 'POLLER_IDLE_TIMEOUT', 0.1)
+    client = FakeGuestClient({'vm-1': 'RUNNING'})
+    poller = guest_helper.get_guest_state_poller(client)
+    assert guest_helper.get_guest_state_poller(client) is poller
+    guest_helper.wait_for_guest_power_state(client, 'vm-1', 'RUNNING', 5)
+    deadline = time.time() + 5
+    while id(client) in guest_helper._pollers and time.time() < deadline:
+        time.sleep(0.05)
+    assert id(client) not in guest_helper._pollers
+    guest_helper.wait_for_guest_power_state(client, 'vm-1', 'RUNNING', 5)
+    guest_helper.shutdown_guest_state_pollers()
+    assert guest_helper._pollers == {}
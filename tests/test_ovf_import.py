@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+"""
+* *******************************************************
+* Copyright (c) 2024 Broadcom. All Rights Reserved.
+* SPDX-License-Identifier: MIT
+* *******************************************************
+*
+* DISCLAIMER. THIS PROGRAM IS PROVIDED TO YOU "AS IS" WITHOUT
+* WARRANTIES OR CONDITIONS OF ANY KIND, WHETHER ORAL OR WRITTEN,
+* EXPRESS OR IMPLIED. THE AUTHOR SPECIFICALLY DISCLAIMS ANY IMPLIED
+* WARRANTIES OR CONDITIONS OF MERCHANTABILITY, SATISFACTORY QUALITY,
+* NON-INFRINGEMENT AND FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+__author__ = 'Broadcom, Inc.'
+__copyright__ = 'Copyright (c) 2024 Broadcom. All Rights Reserved.'
+
+import io
+import tarfile
+
+import pytest
+
+from samples.vsphere.common.vim.ovf_import import OvfPackage
+
+LONG_NAME = 'disk-' + 'x' * 120 + '.vmdk'
+
+
+def write_ova(path, members, tar_format=tarfile.PAX_FORMAT):
+    with tarfile.open(path, 'w', format=tar_format) as tar:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return path
+
+
+@pytest.mark.parametrize('tar_format', [tarfile.PAX_FORMAT,
+                                        tarfile.GNU_FORMAT])
+def test_ova_members_with_long_names(tmp_path, tar_format):
+    path = write_ova(str(tmp_path / 'vm.ova'),
+                     [('vm.ovf', b'<Envelope/>'), (LONG_NAME, b'd' * 1000)],
+                     tar_format)
+    package = OvfPackage(path, None)
+    assert package.descriptor == '<Envelope/>'
+    assert package.size(LONG_NAME) == 1000
+    assert b''.join(package.read(LONG_NAME, offset=10)) == b'd' * 990
+
+
+def test_ova_without_descriptor(tmp_path):
+    path = write_ova(str(tmp_path / 'vm.ova'), [('disk.vmdk', b'd' * 10)])
+    with pytest.raises(Exception) as e:
+        OvfPackage(path, None)
+    assert 'No OVF descriptor found in' in str(e.value)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+"""
+* *******************************************************
+* Copyright (c) 2024 Broadcom. All Rights Reserved.
+* SPDX-License-Identifier: MIT
+* *******************************************************
+*
+* DISCLAIMER. THIS PROGRAM IS PROVIDED TO YOU "AS IS" WITHOUT
+* WARRANTIES OR CONDITIONS OF ANY KIND, WHETHER ORAL OR WRITTEN,
+* EXPRESS OR IMPLIED. THE AUTHOR SPECIFICALLY DISCLAIMS ANY IMPLIED
+* WARRANTIES OR CONDITIONS OF MERCHANTABILITY, SATISFACTORY QUALITY,
+* NON-INFRINGEMENT AND FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+__author__ = 'Broadcom, Inc.'
+__copyright__ = 'Copyright (c) 2024 Broadcom. All Rights Reserved.'
+
+import threading
+import time
+
+import pytest
+
+from samples.vsphere.common.sso import SamlTokenCache, get_assertion_expiry
+
+ASSERTION = ('<saml2:Assertion '
+             'xmlns:saml2="urn:oasis:names:tc:SAML:2.0:assertion" ID="{0}">'
+             '<saml2:Conditions NotOnOrAfter="{1}"/></saml2:Assertion>')
+
+
+def make_assertion(lifetime, token_id):
+    not_on_or_after = time.strftime('%Y-%m-%dT%H:%M:%S.000Z',
+                                    time.gmtime(time.time() + lifetime))
+    return ASSERTION.format(token_id, not_on_or_after)
+
+
+class FakeAuthenticator(object):
+    """
+    Issues assertions valid for lifetime seconds and counts the requests.
+    """
+
+    def __init__(self, lifetime=600, delay=0):
+        self._sts_url = 'https://sts/sts/STSService/vsphere.local'
+        self.lifetime = lifetime
+        self.delay = delay
+        self.issued = []
+
+    def get_bearer_saml_assertion(self, username, password, **kwargs):
+        time.sleep(self.delay)
+        self.issued.append((username, password, kwargs['token_duration']))
+        return make_assertion(self.lifetime, len(self.issued))
+
+
+@pytest.fixture
+def cache():
+    cache = SamlTokenCache()
+    yield cache
+    cache.invalidate()
+
+
+def test_get_assertion_expiry():
+    token = make_assertion(600, 1)
+    assert abs(get_assertion_expiry(token) - (time.time() + 600)) < 2
+
+
+def test_bearer_token_is_reused(cache):
+    authenticator = FakeAuthenticator()
+    first = cache.get_bearer_saml_assertion(authenticator, 'user', 'secret')
+    second = cache.get_bearer_saml_assertion(authenticator, 'user', 'secret')
+    assert first == second
+    assert len(authenticator.issued) == 1
+
+
+def test_key_includes_password_and_duration(cache):
+    authenticator = FakeAuthenticator()
+    first = cache.get_bearer_saml_assertion(authenticator, 'user', 'secret')
+    other = cache.get_bearer_saml_assertion(authenticator, 'user', 'wrong')
+    longer = cache.get_bearer_saml_assertion(authenticator, 'user', 'secret',
+                                             token_duration=3600)
+    assert len(set([first, other, longer])) == 3
+    assert [p for _, p, _ in authenticator.issued] == ['secret', 'wrong',
+                                                       'secret']
+    assert authenticator.issued[2][2] == 3600
+    for key in cache._entries:
+        assert 'secret' not in key and 'wrong' not in key
+
+
+def test_token_about_to_expire_is_not_handed_out(cache):
+    authenticator = FakeAuthenticator(lifetime=20)
+    first = cache.get_bearer_saml_assertion(authenticator, 'user', 'secret')
+    second = cache.get_bearer_saml_assertion(authenticator, 'user', 'secret')
+    assert first != second
+    assert len(authenticator.issued) == 2
+
+
+def test_concurrent_callers_share_one_request(cache):
+    authenticator = FakeAuthenticator(delay=0.2)
+    tokens = []
+
+    def get():
+        tokens.append(cache.get_bearer_saml_assertion(authenticator, 'user',
+                                                      'secret'))
+
+    threads = [threading.Thread(target=get) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(tokens)) == 1
+    assert len(authenticator.issued) == 1
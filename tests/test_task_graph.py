@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+"""
+* *******************************************************
+* Copyright (c) 2024 Broadcom. All Rights Reserved.
+* SPDX-License-Identifier: MIT
+* *******************************************************
+*
+* DISCLAIMER. THIS PROGRAM IS PROVIDED TO YOU "AS IS" WITHOUT
+* WARRANTIES OR CONDITIONS OF ANY KIND, WHETHER ORAL OR WRITTEN,
+* EXPRESS OR IMPLIED. THE AUTHOR SPECIFICALLY DISCLAIMS ANY IMPLIED
+* WARRANTIES OR CONDITIONS OF MERCHANTABILITY, SATISFACTORY QUALITY,
+* NON-INFRINGEMENT AND FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+__author__ = 'Broadcom, Inc.'
+__copyright__ = 'Copyright (c) 2024 Broadcom. All Rights Reserved.'
+
+import threading
+
+import pytest
+
+from samples.vsphere.vcenter.setup.task_graph import TaskGraph, TaskGraphError
+
+
+def test_add_rejects_unknown_and_duplicate_tasks():
+    graph = TaskGraph('test')
+    graph.add('a', lambda: 1)
+    with pytest.raises(ValueError):
+        graph.add('a', lambda: 1)
+    with pytest.raises(ValueError):
+        graph.add('b', lambda: 1, requires=['c'])
+
+
+def test_run_respects_requirements():
+    graph = TaskGraph('test')
+    order = []
+    lock = threading.Lock()
+
+    def task(name):
+        def func():
+            with lock:
+                order.append(name)
+            return name
+        return func
+
+    graph.add('datacenter', task('datacenter'))
+    graph.add('cluster', task('cluster'), requires=['datacenter'])
+    graph.add('host', task('host'), requires=['datacenter'])
+    graph.add('vm', task('vm'), requires=['cluster', 'host'])
+    results = graph.run()
+    assert results == {'datacenter': 'datacenter', 'cluster': 'cluster',
+                       'host': 'host', 'vm': 'vm'}
+    assert order[0] == 'datacenter' and order[-1] == 'vm'
+    assert [t.name for t in graph.critical_path()][0] == 'datacenter'
+    assert graph.critical_path()[-1].name == 'vm'
+
+
+def test_independent_tasks_run_concurrently():
+    graph = TaskGraph('test', max_workers=2)
+    barrier = threading.Barrier(2, timeout=5)
+    graph.add('a', barrier.wait)
+    graph.add('b', barrier.wait)
+    graph.run()
+    assert all(t.status == 'done' for t in graph.tasks.values())
+
+
+def test_failure_skips_dependents_only():
+    graph = TaskGraph('test')
+
+    def fail():
+        raise ValueError('no host')
+
+    graph.add('host', fail)
+    graph.add('datastore', lambda: 'ds', requires=['host'])
+    graph.add('vm', lambda: 'vm', requires=['datastore'])
+    graph.add('network', lambda: 'net')
+    with pytest.raises(TaskGraphError) as e:
+        graph.run()
+    assert [name for name, _ in e.value.errors] == ['host']
+    assert graph.tasks['datastore'].status == 'skipped'
+    assert graph.tasks['vm'].status == 'skipped'
+    assert graph.tasks['network'].status == 'done'
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+
+"""
+* *******************************************************
+* Copyright (c) 2024 Broadcom. All Rights Reserved.
+* SPDX-License-Identifier: MIT
+* *******************************************************
+*
+* DISCLAIMER. THIS PROGRAM IS PROVIDED TO YOU "AS IS" WITHOUT
+* WARRANTIES OR CONDITIONS OF ANY KIND, WHETHER ORAL OR WRITTEN,
+* EXPRESS OR IMPLIED. THE AUTHOR SPECIFICALLY DISCLAIMS ANY IMPLIED
+* WARRANTIES OR CONDITIONS OF MERCHANTABILITY, SATISFACTORY QUALITY,
+* NON-INFRINGEMENT AND FITNESS FOR A PARTICULAR PURPOSE.
+"""
+
+__author__ = 'Broadcom, Inc.'
+__copyright__ = 'Copyright (c) 2024 Broadcom. All Rights Reserved.'
+
+from types import SimpleNamespace
+
+import pytest
+from pyVmomi import vim
+
+from samples.vsphere.common.vim.helpers.vim_utils import (InventorySnapshot,
+                                                          TaskErrors,
+                                                          TaskScheduler,
+                                                          get_obj,
+                                                          wait_for_tasks)
+
+
+class FakeContainerView(vim.view.ContainerView):
+    def __init__(self):
+        vim.view.ContainerView.__init__(self, 'session[1]view-1', None)
+        self.destroyed = False
+
+    def Destroy(self):
+        self.destroyed = True
+
+
+class FakeCollector(object):
+    """
+    Returns the given objects page_size at a time.
+    """
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.calls = 0
+
+    def RetrievePropertiesEx(self, specs, options):
+        self.page_size = options.maxObjects
+        return self._page(0)
+
+    def ContinueRetrievePropertiesEx(self, token):
+        return self._page(int(token))
+
+    def _page(self, start):
+        self.calls += 1
+        end = start + self.page_size
+        return SimpleNamespace(
+            objects=[SimpleNamespace(obj=obj, propSet=[
+                SimpleNamespace(name='name', val=name),
+                SimpleNamespace(name='parent', val=parent)])
+                for obj, name, parent in self.objects[start:end]],
+            token=str(end) if end < len(self.objects) else None)
+
+
+def make_content(objects):
+    view = FakeContainerView()
+    content = SimpleNamespace(
+        rootFolder=vim.Folder('group-d1', None),
+        viewManager=SimpleNamespace(
+            CreateContainerView=lambda root, types, recursive: view),
+        propertyCollector=FakeCollector(objects))
+    return content, view
+
+
+folder = vim.Folder('group-v1', None)
+objects = [(vim.VirtualMachine('vm-1', None), 'web', folder),
+           (vim.VirtualMachine('vm-2', None), 'db', folder),
+           (vim.Datastore('datastore-1', None), 'web', None),
+           (vim.VirtualMachine('vm-3', None), 'app', folder)]
+
+
+def test_snapshot_collects_all_pages():
+    content, view = make_content(objects)
+    snapshot = InventorySnapshot(content, [vim.VirtualMachine, vim.Datastore],
+                                 page_size=2)
+    assert content.propertyCollector.calls == 2
+    assert view.destroyed
+    assert len(snapshot.by_moId) == 4
+    assert snapshot.by_moId['vm-3'].parent == 'group-v1'
+    assert snapshot.by_moId['datastore-1'].parent is None
+
+
+def test_snapshot_get_filters_by_type():
+    content, _ = make_content(objects)
+    snapshot = InventorySnapshot(content, [vim.VirtualMachine, vim.Datastore])
+    assert snapshot.get([vim.Datastore], 'web')._GetMoId() == 'datastore-1'
+    assert snapshot.get([vim.VirtualMachine], 'web')._GetMoId() == 'vm-1'
+    assert snapshot.get([vim.VirtualMachine], 'missing') is None
+    assert snapshot.get_by_moId([vim.VirtualMachine], 'vm-2')._GetMoId() == \
+        'vm-2'
+    assert snapshot.get_by_moId([vim.VirtualMachine], 'datastore-1') is None
+
+
+def test_get_obj_uses_the_given_snapshot():
+    content, _ = make_content(objects)
+    snapshot = InventorySnapshot(content, [vim.VirtualMachine])
+    calls = content.propertyCollector.calls
+    assert get_obj(content, [vim.VirtualMachine], 'db',
+                   snapshot)._GetMoId() == 'vm-2'
+    assert content.propertyCollector.calls == calls
+
+
+class FakeListView(vim.view.ListView):
+    def __init__(self):
+        vim.view.ListView.__init__(self, 'session[1]view-2', None)
+        self.tasks = []
+        self.max_size = 0
+
+    def ModifyListView(self, add=None, remove=None):
+        self.tasks += add or []
+        self.tasks = [t for t in self.tasks if t not in (remove or [])]
+        self.max_size = max(self.max_size, len(self.tasks))
+        return []
+
+    def Destroy(self):
+        self.destroyed = True
+
+
+class FakeTaskCollector(object):
+    """
+    Completes every task in the view on each wait, failing those listed.
+    """
+
+    def __init__(self, view, failing=()):
+        self.view = view
+        self.failing = failing
+        self.waits = 0
+
+    def CreateFilter(self, spec, partial_updates):
+        pass
+
+    def WaitForUpdatesEx(self, version, options):
+        self.waits += 1
+        object_set = []
+        for task in self.view.tasks:
+            moid = task._GetMoId()
+            if moid in self.failing:
+                changes = [('info.state', vim.TaskInfo.State.error),
+                           ('info.error', vim.fault.NotFound())]
+            else:
+                changes = [('info.state', vim.TaskInfo.State.success),
+                           ('info.result', moid)]
+            object_set.append(SimpleNamespace(obj=task, changeSet=[
+                SimpleNamespace(name=n, val=v) for n, v in changes]))
+        return SimpleNamespace(version=str(self.waits), filterSet=[
+            SimpleNamespace(objectSet=object_set)])
+
+    def Destroy(self):
+        self.destroyed = True
+
+
+def make_task_content(failing=()):
+    view = FakeListView()
+    collector = FakeTaskCollector(view, failing)
+    content = SimpleNamespace(
+        propertyCollector=SimpleNamespace(
+            CreatePropertyCollector=lambda: collector),
+        viewManager=SimpleNamespace(CreateListView=lambda: view))
+    return content, view, collector
+
+
+def test_scheduler_limits_tasks_in_flight():
+    content, view, collector = make_task_content()
+    scheduler = TaskScheduler(content, max_in_flight=2)
+    started = []
+
+    def start(i):
+        started.append(i)
+        return vim.Task('task-{}'.format(i), None)
+
+    futures = [scheduler.submit(lambda i=i: start(i)) for i in range(5)]
+    assert scheduler.run() == []
+    assert [f.result() for f in futures] == ['task-{}'.format(i)
+                                             for i in range(5)]
+    assert started == list(range(5))
+    assert view.max_size == 2
+    assert collector.waits == 3
+    assert view.destroyed and collector.destroyed
+
+
+def test_scheduler_collects_every_failure():
+    content, _, _ = make_task_content(failing=('task-1', 'task-3'))
+    scheduler = TaskScheduler(content)
+    futures = [scheduler.submit(vim.Task('task-{}'.format(i), None))
+               for i in range(4)]
+
+    def fail():
+        raise ValueError('not started')
+
+    not_started = scheduler.submit(fail)
+    errors = scheduler.run()
+    assert len(errors) == 3
+    assert futures[0].result() == 'task-0'
+    assert isinstance(futures[1].exception(), vim.fault.NotFound)
+    assert isinstance(not_started.exception(), ValueError)
+
+
+def test_wait_for_tasks_raises_first_failure():
+    content, _, _ = make_task_content(failing=('task-2',))
+    with pytest.raises(vim.fault.NotFound):
+        wait_for_tasks(content, [vim.Task('task-{}'.format(i), None)
+                                 for i in range(3)])
+
+
+def test_task_errors_lists_failures():
+    errors = [ValueError('a'), ValueError('b')]
+    e = TaskErrors(errors)
+    assert e.errors == errors
+    assert str(e) == '2 task(s) failed'